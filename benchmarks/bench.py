@@ -0,0 +1,597 @@
+#!/usr/bin/env python
+"""
+Throughput benchmarks for transform-singer.
+
+Generates synthetic Singer streams (flat records, nested orders with line items and wide
+records), runs them through `Processor.process` in a fresh process and through the
+`transform-singer` entry point, and writes the results as JSON so runs from different versions
+can be compared.
+
+Usage:
+
+python benchmarks/bench.py --records 20000 --output results.json
+python benchmarks/bench.py --compare results.json
+"""
+import argparse
+import contextlib
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from transform_singer.processor import Processor  # noqa: E402
+
+FIRST_NAMES = ["Ann", "Bob", "Cat", "Dan", "Eve", "Fay", "Gus", "Hal"]
+LAST_NAMES = ["Smith", "Jones", "Brown", "Lee", "Garcia", "Miller"]
+STATES = ["active", "inactive", "pending", None]
+
+# Number of properties in the records of the wide stream
+WIDE_PROPERTIES = 250
+# Number of copies of a mapping used to time each mapping type
+TYPE_COPIES = 10
+
+
+def flat_stream(count, rand):
+    config = {
+        "meta": {"source": "benchmark", "currency": "USD"},
+        "mappings": {
+            "users": [
+                {
+                    "stream": "people",
+                    "properties": {
+                        "id": {"type": "record", "key": "id"},
+                        "first_name": {"type": "record", "key": "firstName"},
+                        "name": {
+                            "type": "join",
+                            "pieces": [
+                                {"type": "record", "key": "firstName"},
+                                {"type": "text", "val": " "},
+                                {"type": "record", "key": "lastName"},
+                            ],
+                        },
+                        "email": {
+                            "type": "coalesce",
+                            "objects": [
+                                {"type": "record", "key": "workEmail"},
+                                {"type": "record", "key": "email"},
+                            ],
+                        },
+                        "email_hash": {
+                            "type": "hash",
+                            "object": {"type": "record", "key": "email"},
+                        },
+                        "initial": {
+                            "type": "substr",
+                            "object": {"type": "record", "key": "lastName"},
+                            "length": 1,
+                        },
+                        "balance": {"type": "tofloat", "object": {"type": "record", "key": "balance"}},
+                        "total": {
+                            "type": "sum",
+                            "objects": [
+                                {"type": "record", "key": "balance"},
+                                {"type": "record", "key": "credit"},
+                            ],
+                        },
+                        "is_active": {
+                            "type": "if",
+                            "condition": {
+                                "operator": "eq",
+                                "left": {"type": "record", "key": "status"},
+                                "right": {"type": "text", "val": "active"},
+                            },
+                            "then": {"type": "text", "val": True},
+                            "else": {"type": "text", "val": False},
+                        },
+                        "source": {"type": "config", "key": "source"},
+                        "address.city": {"type": "record", "key": "address.city"},
+                        "address.zip": {"type": "record", "key": "address.zip"},
+                    },
+                }
+            ]
+        },
+    }
+
+    def record(i):
+        first = rand.choice(FIRST_NAMES)
+        last = rand.choice(LAST_NAMES)
+        return {
+            "id": i,
+            "firstName": first,
+            "lastName": last,
+            "email": f"{first}.{last}{i}@example.com".lower(),
+            "workEmail": f"{first}@work.example.com".lower() if i % 3 == 0 else None,
+            "balance": f"{rand.uniform(-100, 1000):.2f}",
+            "credit": rand.randint(0, 500),
+            "status": rand.choice(STATES),
+            "address": {"city": "Springfield", "zip": f"{rand.randint(10000, 99999)}"},
+        }
+
+    return config, "users", (record(i) for i in range(count))
+
+
+def nested_stream(count, rand):
+    config = {
+        "meta": {"source": "benchmark"},
+        "mappings": {
+            "orders": [
+                {
+                    "stream": "order",
+                    "exclude": {
+                        "type": "if",
+                        "condition": {
+                            "operator": "eq",
+                            "left": {"type": "record", "key": "status"},
+                            "right": {"type": "text", "val": "void"},
+                        },
+                        "then": {"type": "text", "val": True},
+                    },
+                    "properties": {
+                        "id": {"type": "record", "key": "id"},
+                        "customer_id": {"type": "record", "key": "customer.id"},
+                        "customer_name": {"type": "record", "key": "customer.name"},
+                        "shipping_city": {"type": "record", "key": "customer.address.shipping.city"},
+                        "total": {"type": "tofloat", "object": {"type": "record", "key": "total"}},
+                        "source": {"type": "config", "key": "source"},
+                    },
+                }
+            ],
+            "orders.items": [
+                {
+                    "stream": "order_item",
+                    "properties": {
+                        "order_id": {"type": "record", "key": "@parent.id"},
+                        "position": {"type": "record", "key": "@index"},
+                        "sku": {"type": "record", "key": "sku"},
+                        "quantity": {"type": "record", "key": "quantity"},
+                        "amount": {
+                            "type": "multiply",
+                            "objects": [
+                                {"type": "record", "key": "quantity"},
+                                {"type": "record", "key": "price"},
+                            ],
+                        },
+                        "discount": {
+                            "type": "difference",
+                            "objects": [
+                                {"type": "record", "key": "price"},
+                                {"type": "record", "key": "sale_price"},
+                            ],
+                        },
+                    },
+                }
+            ],
+            "orders.items.taxes": [
+                {
+                    "stream": "order_item_tax",
+                    "properties": {
+                        "order_id": {"type": "record", "key": "@root.id"},
+                        "sku": {"type": "record", "key": "@parent.sku"},
+                        "name": {"type": "record", "key": "name"},
+                        "rate": {"type": "tofloat", "object": {"type": "record", "key": "rate"}},
+                    },
+                }
+            ],
+        },
+    }
+
+    def item(rand):
+        price = round(rand.uniform(1, 200), 2)
+        return {
+            "sku": f"SKU-{rand.randint(1, 5000)}",
+            "quantity": rand.randint(1, 10),
+            "price": price,
+            "sale_price": round(price * rand.uniform(0.7, 1), 2),
+            "taxes": [
+                {"name": "state", "rate": "0.06"},
+                {"name": "city", "rate": "0.015"},
+            ],
+        }
+
+    def record(i):
+        return {
+            "id": i,
+            "status": "void" if i % 20 == 0 else "paid",
+            "total": f"{rand.uniform(10, 2000):.2f}",
+            "customer": {
+                "id": rand.randint(1, 10000),
+                "name": rand.choice(FIRST_NAMES),
+                "address": {"shipping": {"city": "Springfield", "zip": "12345"}},
+            },
+            "items": [item(rand) for _ in range(rand.randint(1, 8))],
+        }
+
+    return config, "orders", (record(i) for i in range(count))
+
+
+def wide_stream(count, rand):
+    properties = {}
+    for i in range(WIDE_PROPERTIES):
+        if i % 5 == 0:
+            properties[f"metric_{i}"] = {
+                "type": "tofloat",
+                "object": {"type": "record", "key": f"field_{i}"},
+            }
+        else:
+            properties[f"column_{i}"] = {"type": "record", "key": f"field_{i}"}
+
+    config = {
+        "meta": {},
+        "mappings": {"events": [{"stream": "event", "properties": properties}]},
+    }
+
+    def record(i):
+        return {
+            f"field_{j}": (f"{rand.random():.4f}" if j % 5 == 0 else f"value {i}-{j}")
+            for j in range(WIDE_PROPERTIES)
+        }
+
+    return config, "events", (record(i) for i in range(count))
+
+
+SCENARIOS = {
+    "flat": flat_stream,
+    "nested": nested_stream,
+    "wide": wide_stream,
+}
+
+# A mapping of every type, varied by copy so repeated copies aren't shared subexpressions
+MAPPING_TYPES = {
+    "none": lambda i: None,
+    "record": lambda i: {"type": "record", "key": f"field_{i}"},
+    "config": lambda i: {"type": "config", "key": "source"},
+    "text": lambda i: {"type": "text", "val": f"text {i}"},
+    "float": lambda i: {"type": "float", "val": i},
+    "join": lambda i: {
+        "type": "join",
+        "pieces": [{"type": "record", "key": f"field_{i}"}, {"type": "text", "val": "-"}],
+    },
+    "coalesce": lambda i: {
+        "type": "coalesce",
+        "objects": [{"type": "record", "key": "missing"}, {"type": "record", "key": f"field_{i}"}],
+    },
+    "substr": lambda i: {
+        "type": "substr",
+        "object": {"type": "record", "key": f"field_{i}"},
+        "length": 2,
+    },
+    "hash": lambda i: {"type": "hash", "object": {"type": "record", "key": f"field_{i}"}},
+    "tofloat": lambda i: {"type": "tofloat", "object": {"type": "record", "key": f"number_{i}"}},
+    "sum": lambda i: {
+        "type": "sum",
+        "objects": [{"type": "record", "key": f"number_{i}"}, {"type": "float", "val": 1}],
+    },
+    "multiply": lambda i: {
+        "type": "multiply",
+        "objects": [{"type": "record", "key": f"number_{i}"}, {"type": "float", "val": 2}],
+    },
+    "divide": lambda i: {
+        "type": "divide",
+        "objects": [{"type": "record", "key": f"number_{i}"}, {"type": "float", "val": 2}],
+    },
+    "difference": lambda i: {
+        "type": "difference",
+        "objects": [{"type": "record", "key": f"number_{i}"}, {"type": "float", "val": 1}],
+    },
+    "if": lambda i: {
+        "type": "if",
+        "condition": {
+            "operator": "gt",
+            "left": {"type": "tofloat", "object": {"type": "record", "key": f"number_{i}"}},
+            "right": {"type": "float", "val": 50},
+        },
+        "then": {"type": "text", "val": "high"},
+        "else": {"type": "text", "val": "low"},
+    },
+}
+
+
+def messages(scenario, count, seed=0):
+    config, stream, records = SCENARIOS[scenario](count, random.Random(seed))
+    return config, stream, ({"type": "RECORD", "stream": stream, "record": record} for record in records)
+
+
+def peak_rss_kb(usage=None):
+    if resource is None:
+        return None
+
+    usage = usage or resource.getrusage(resource.RUSAGE_SELF)
+    # Linux reports kilobytes, macOS bytes
+    return usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+
+
+def run_process(scenario, count, config_overrides):
+    """
+    Time `Processor.process` over a scenario.  Runs in its own process so the peak RSS is only
+    this scenario's.
+    """
+    config, _, stream_messages = messages(scenario, count)
+    config.update(config_overrides)
+    stream_messages = list(stream_messages)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        processor = Processor(SimpleNamespace(config=config))
+
+        # Warm up any caches before timing
+        for message in stream_messages[:100]:
+            processor.process(message)
+
+        collections = gc.get_stats()[0]["collections"]
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+
+        for message in stream_messages:
+            processor.process(message)
+        processor.flush()
+
+        seconds = time.perf_counter() - start
+        collections = gc.get_stats()[0]["collections"] - collections
+        blocks = sys.getallocatedblocks() - blocks
+
+        # Allocations are traced in a second, shorter pass since tracing slows everything down
+        traced = stream_messages[: max(len(stream_messages) // 10, 1)]
+        tracemalloc.start()
+        for message in traced:
+            processor.process(message)
+        processor.flush()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "records": len(stream_messages),
+        "seconds": seconds,
+        "records_per_second": len(stream_messages) / seconds,
+        "peak_rss_kb": peak_rss_kb(),
+        "gen0_collections": collections,
+        "retained_blocks": blocks,
+        "traced_peak_bytes_per_record": traced_peak / len(traced),
+    }
+
+
+def run_mapping_type(mapping_type, count):
+    # Time one stream mapping TYPE_COPIES properties of a single type
+    build = MAPPING_TYPES[mapping_type]
+    config = {
+        "meta": {"source": "benchmark"},
+        "mappings": {
+            "rows": [
+                {
+                    "stream": "row",
+                    "properties": {f"p{i}": build(i) for i in range(TYPE_COPIES)},
+                }
+            ]
+        },
+    }
+    rand = random.Random(0)
+    records = [
+        {
+            **{f"field_{i}": f"value {n} {i}" for i in range(TYPE_COPIES)},
+            **{f"number_{i}": f"{rand.uniform(0, 100):.2f}" for i in range(TYPE_COPIES)},
+        }
+        for n in range(count)
+    ]
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        processor = Processor(SimpleNamespace(config=config))
+        start = time.perf_counter()
+
+        for record in records:
+            processor.process_record("rows", record)
+
+        return time.perf_counter() - start
+
+
+def run_entry_point(scenario, count, config_overrides, workdir):
+    # Run `transform-singer` end to end over a file of serialized messages
+    config, _, stream_messages = messages(scenario, count)
+    config.update(config_overrides)
+
+    config_path = os.path.join(workdir, f"{scenario}.config.json")
+    input_path = os.path.join(workdir, f"{scenario}.jsonl")
+
+    with open(config_path, "w") as config_file:
+        json.dump(config, config_file)
+
+    with open(input_path, "w") as input_file:
+        for message in stream_messages:
+            input_file.write(json.dumps(message) + "\n")
+
+    command = [
+        sys.executable,
+        "-c",
+        "from transform_singer import main; main()",
+        "--config",
+        config_path,
+    ]
+
+    # The checkout is importable from wherever the benchmark is run, installed or not
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    log_path = os.path.join(workdir, f"{scenario}.log")
+
+    with open(input_path, "rb") as stdin, open(os.devnull, "wb") as devnull, open(
+        log_path, "wb"
+    ) as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdin=stdin, stdout=devnull, stderr=log, env=env)
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode:
+        with open(log_path, errors="replace") as log:
+            tail = "".join(log.readlines()[-20:])
+        raise RuntimeError(
+            f"transform-singer exited with {process.returncode} on {scenario}:\n{tail}"
+        )
+
+    return {
+        "records": count,
+        "seconds": seconds,
+        "records_per_second": count / seconds,
+        "peak_rss_kb": peak_rss_kb(usage),
+        "input_bytes": os.path.getsize(input_path),
+    }
+
+
+def run(args):
+    context = multiprocessing.get_context("spawn")
+    overrides = json.loads(args.config) if args.config else {}
+    results = {
+        "version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "records": args.records,
+        "config": overrides,
+        "scenarios": {},
+        "mapping_types": {},
+    }
+
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for scenario in args.scenarios:
+            print(f"Running {scenario}...", file=sys.stderr)
+            best = None
+
+            for _ in range(args.repeat):
+                result = pool.apply(run_process, (scenario, args.records, overrides))
+                if best is None or result["seconds"] < best["seconds"]:
+                    best = result
+
+            results["scenarios"][scenario] = {"process": best}
+
+        if args.mapping_types:
+            print("Timing mapping types...", file=sys.stderr)
+            seconds = {
+                mapping_type: min(
+                    pool.apply(run_mapping_type, (mapping_type, args.records))
+                    for _ in range(args.repeat)
+                )
+                for mapping_type in MAPPING_TYPES
+            }
+
+            evals = args.records * TYPE_COPIES
+            for mapping_type, elapsed in seconds.items():
+                results["mapping_types"][mapping_type] = {
+                    "seconds": elapsed,
+                    # Cost of the mapping on top of writing out a record of None values
+                    "microseconds_per_eval": max(elapsed - seconds["none"], 0) / evals * 1e6,
+                }
+
+    if args.entry_point:
+        with tempfile.TemporaryDirectory() as workdir:
+            for scenario in args.scenarios:
+                print(f"Running {scenario} through transform-singer...", file=sys.stderr)
+                results["scenarios"][scenario]["entry_point"] = min(
+                    (
+                        run_entry_point(scenario, args.records, overrides, workdir)
+                        for _ in range(args.repeat)
+                    ),
+                    key=lambda result: result["seconds"],
+                )
+
+    return results
+
+
+def compare(baseline, results):
+    # Print the change in throughput from a previous run
+    lines = []
+
+    for scenario, modes in results["scenarios"].items():
+        for mode, result in modes.items():
+            before = baseline.get("scenarios", {}).get(scenario, {}).get(mode)
+            if not before:
+                continue
+
+            change = result["records_per_second"] / before["records_per_second"] - 1
+            lines.append(
+                f"{scenario:<8} {mode:<12} {before['records_per_second']:>12.0f} -> "
+                f"{result['records_per_second']:>12.0f} records/s ({change:+.1%})"
+            )
+
+    for mapping_type, result in results["mapping_types"].items():
+        before = baseline.get("mapping_types", {}).get(mapping_type)
+        if not before:
+            continue
+
+        lines.append(
+            f"{mapping_type:<21} {before['microseconds_per_eval']:>12.3f} -> "
+            f"{result['microseconds_per_eval']:>12.3f} us/eval"
+        )
+
+    return "\n".join(lines)
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+
+        return version("transform-singer")
+    except Exception:
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000, help="Records per scenario")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=sorted(SCENARIOS),
+        default=list(SCENARIOS),
+        help="Scenarios to run",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario, the best is kept")
+    parser.add_argument(
+        "--config", help='JSON of extra config keys, e.g. \'{"output_batch_size": 1000}\''
+    )
+    parser.add_argument(
+        "--no-entry-point",
+        dest="entry_point",
+        action="store_false",
+        help="Skip running transform-singer end to end",
+    )
+    parser.add_argument(
+        "--no-mapping-types",
+        dest="mapping_types",
+        action="store_false",
+        help="Skip timing each mapping type",
+    )
+    parser.add_argument("--output", help="Write the results to this file instead of stdout")
+    parser.add_argument("--compare", help="Results of a previous run to compare against")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            print(compare(json.load(baseline), results), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
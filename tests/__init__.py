@@ -1,2 +1,19 @@
 from .utils import *
-from .processor import *
\ No newline at end of file
+from .processor import *
+from .compiler import *
+from .routing import *
+from .writer import *
+from .codec import *
+from .parallel import *
+from .schema import *
+from .columnar import *
+from .metrics import *
+from .profiler import *
+from .failures import *
+from .pipeline import *
+from .hashing import *
+from .streaming import *
+from .files import *
+from .plan import *
+from .lookup import *
+from .cli import *
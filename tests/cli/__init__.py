@@ -0,0 +1 @@
+from .test_parse_args import *
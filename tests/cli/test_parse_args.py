@@ -0,0 +1,39 @@
+import json
+import os
+import tempfile
+import unittest
+
+from transform_singer import parse_args
+
+
+class TestParseArgs(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as f:
+            json.dump(data, f)
+        return path
+
+    def test_singer_options_are_accepted(self):
+        config = self.write("config.json", {"mappings": {}})
+        state = self.write("state.json", {"bookmarks": {"users": 1}})
+        properties = self.write("properties.json", {"streams": []})
+
+        args = parse_args(["-c", config, "--state", state, "-p", properties, "--discover"])
+
+        self.assertEqual(args.config, {"mappings": {}})
+        self.assertEqual(args.config_path, config)
+        self.assertEqual(args.state, {"bookmarks": {"users": 1}})
+        self.assertEqual(args.state_path, state)
+        self.assertEqual(args.properties, {"streams": []})
+        self.assertTrue(args.discover)
+
+    def test_defaults(self):
+        args = parse_args(["-c", self.write("config.json", {"mappings": {}})])
+
+        self.assertEqual(args.state, {})
+        self.assertIsNone(args.catalog)
+        self.assertEqual(args.workers, 1)
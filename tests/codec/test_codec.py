@@ -0,0 +1,76 @@
+import decimal
+import json
+import unittest
+
+from transform_singer.codec import BACKENDS, BIG_INT, BIG_INT_BYTES, get_codec
+
+
+def available_codecs():
+    codecs = []
+
+    for name, backend in BACKENDS.items():
+        try:
+            codecs.append(backend())
+        except ImportError:
+            pass
+
+    return codecs
+
+
+VALUES = [
+    {"name": "Zoë 😀 日本", "tags": ["a", "b"], "nested": {"empty": {}, "list": []}},
+    {"nul": "foo\u0000bar", "control": "\u0001\u001f\t\n\r\b\f", "quotes": "\"\\/"},
+    {"price": decimal.Decimal("12.50"), "qty": decimal.Decimal("3")},
+    {"int": 123456789012345678, "big": 2 ** 70, "negative": -42, "float": 0.1, "zero": -0.0},
+    {"bool": True, "null": None, "float": 1234.5678},
+]
+
+LINES = [
+    '{"type": "RECORD", "stream": "users", "record": {"name": "Zo\\u00eb", "nul": "a\\u0000b"}}',
+    '{"type":"RECORD","stream":"users","record":{"id":123456789012345678901234567890}}',
+    '{"value": 1.5, "text": "日本"}',
+]
+
+
+class TestCodec(unittest.TestCase):
+    def test_default(self):
+        self.assertIn(get_codec().name, BACKENDS)
+
+    def test_unavailable(self):
+        self.assertEqual(get_codec("nope").name, "json")
+
+    def test_dumps_identical(self):
+        expected = BACKENDS["json"]()
+
+        for codec in available_codecs():
+            for value in VALUES:
+                with self.subTest(codec=codec.name, value=value):
+                    self.assertEqual(codec.dumps(value), expected.dumps(value))
+
+    def test_loads_identical(self):
+        for codec in available_codecs():
+            for line in LINES:
+                with self.subTest(codec=codec.name, line=line):
+                    self.assertEqual(codec.loads(line), json.loads(line))
+                    self.assertEqual(codec.loads(line.encode("utf-8")), json.loads(line))
+
+    def test_loads_invalid(self):
+        for codec in available_codecs():
+            with self.subTest(codec=codec.name):
+                with self.assertRaises(ValueError):
+                    codec.loads("INFO this is a log line")
+
+    def test_non_finite_floats_are_null(self):
+        value = {"nan": float("nan"), "inf": [float("inf"), -float("inf")], "ok": 1.5}
+
+        for codec in available_codecs():
+            with self.subTest(codec=codec.name):
+                self.assertEqual(codec.dumps(value), '{"nan":null,"inf":[null,null],"ok":1.5}')
+
+    def test_big_int_check_skips_strings(self):
+        for line in ('{"id": "123456789012345678901", "n": 1}', '{"note": "a12345678901234567890"}'):
+            self.assertIsNone(BIG_INT.search(line))
+            self.assertIsNone(BIG_INT_BYTES.search(line.encode("utf-8")))
+
+        for line in ('{"id": 123456789012345678901}', '[1,-123456789012345678901]', '{"a":[\n 123456789012345678901]}'):
+            self.assertIsNotNone(BIG_INT.search(line))
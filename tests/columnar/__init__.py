@@ -0,0 +1 @@
+from .test_batch_mode import *
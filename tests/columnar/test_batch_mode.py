@@ -0,0 +1,160 @@
+import unittest
+from unittest.mock import MagicMock
+
+from transform_singer.processor import Processor
+from transform_singer.writer import CollectingWriter
+
+MAPPINGS = {
+    "orders": [
+        {
+            "stream": "order",
+            "exclude": {
+                "type": "if",
+                "condition": {
+                    "operator": "eq",
+                    "left": {"type": "record", "key": "status"},
+                    "right": {"type": "text", "val": "void"},
+                },
+                "then": {"type": "text", "val": True},
+                "else": {"type": "text", "val": False},
+            },
+            "properties": {
+                "id": {"type": "record", "key": "id"},
+                "name": {"type": "record", "key": "contact.name"},
+                "source": {"type": "config", "key": "source"},
+                "total": {
+                    "type": "sum",
+                    "objects": [
+                        {"type": "record", "key": "subtotal"},
+                        {"type": "record", "key": "tax"},
+                    ],
+                },
+                "net": {
+                    "type": "difference",
+                    "objects": [
+                        {"type": "record", "key": "subtotal"},
+                        {"type": "record", "key": "discount"},
+                    ],
+                },
+                "rate": {"type": "tofloat", "object": {"type": "record", "key": "rate"}},
+                "size": {
+                    "type": "if",
+                    "condition": {
+                        "operator": "and",
+                        "conditions": [
+                            {
+                                "operator": "gte",
+                                "left": {"type": "record", "key": "subtotal"},
+                                "right": {"type": "float", "val": 100},
+                            },
+                            {
+                                "operator": "lt",
+                                "left": {"type": "tofloat", "object": {"type": "record", "key": "tax"}},
+                                "right": {"type": "float", "val": 50},
+                            },
+                        ],
+                    },
+                    "then": {"type": "text", "val": "large"},
+                    "else": {"type": "text", "val": "small"},
+                },
+                "customer": {"type": "record", "key": "customer"},
+                "customer.id": {"type": "record", "key": "id"},
+            },
+        },
+        {
+            "stream": "empty",
+            "properties": {
+                "nothing": {"type": "sum", "objects": []},
+            },
+        },
+    ],
+    "orders.lines": [
+        {
+            "stream": "line",
+            "properties": {
+                "order": {"type": "record", "key": "@parent.id"},
+                "sku": {"type": "record", "key": "sku"},
+            },
+        }
+    ],
+}
+
+RECORDS = [
+    {
+        "id": 1,
+        "status": "paid",
+        "contact": {"name": "Ann"},
+        "customer": {"since": 2020},
+        "subtotal": 120,
+        "tax": "9.5",
+        "discount": 20,
+        "rate": "0.2",
+        "lines": [{"sku": "a"}, {"sku": "b"}],
+    },
+    {"id": 2, "status": "void", "customer": {}, "subtotal": 5, "lines": [{"sku": "c"}]},
+    {"id": 3, "contact": None, "customer": {}, "subtotal": None, "tax": "n/a", "rate": "nope"},
+    {"id": 4, "contact": {"name": "Bob\u0000"}, "customer": {"since": 2021}, "subtotal": "75.5", "tax": 1, "rate": [1]},
+    {"id": 5, "contact": "Cat", "customer": {}, "subtotal": 200, "tax": 60, "discount": None},
+]
+
+
+def run(batch_size, records=RECORDS):
+    args = MagicMock()
+    args.config = {
+        "mappings": MAPPINGS,
+        "meta": {"source": "shop"},
+        "columnar_batch_size": batch_size,
+    }
+    processor = Processor(args)
+    processor.writer = CollectingWriter(processor.codec)
+
+    for record in records:
+        processor.process({"type": "RECORD", "stream": "orders", "record": record})
+
+    processor.process({"type": "STATE", "value": {"done": True}})
+    processor.flush()
+
+    return processor, processor.writer.collect()
+
+
+class TestBatchMode(unittest.TestCase):
+    def test_matches_row_mode(self):
+        _, expected = run(None)
+
+        for batch_size in (1, 2, 100):
+            with self.subTest(batch_size=batch_size):
+                processor, output = run(batch_size)
+
+                self.assertIn("orders", processor.batchers)
+                self.assertEqual(output, expected)
+
+    def test_state_comes_after_batched_records(self):
+        _, output = run(100)
+
+        self.assertIsNone(output[-1][0])
+        self.assertIn('"STATE"', output[-1][1])
+
+    def test_children_follow_their_record(self):
+        _, output = run(100)
+
+        streams = [stream for stream, _ in output[:6]]
+        self.assertEqual(streams, ["order", "empty", "line", "line", "empty", "line"])
+
+    def test_unsupported_mappings_run_by_row(self):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "users": [
+                    {
+                        "stream": "people",
+                        "properties": {
+                            "email": {"type": "hash", "object": {"type": "record", "key": "email"}}
+                        },
+                    }
+                ],
+            },
+            "columnar_batch_size": 100,
+        }
+        processor = Processor(args)
+
+        self.assertEqual(processor.batchers, {})
@@ -0,0 +1 @@
+from .test_compile_mapping import *
@@ -0,0 +1,253 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.processor import Processor
+
+
+MAPPINGS = [
+    {"type": "record", "key": "first_name"},
+    {"type": "record", "key": "address.city"},
+    {"type": "record", "key": "missing.key"},
+    {"type": "config", "key": "foo"},
+    {"type": "text", "val": "foo"},
+    {"type": "float", "val": "1.5"},
+    {"type": "float", "val": "nope"},
+    {"type": "join", "pieces": [
+        {"type": "record", "key": "first_name"},
+        {"type": "text", "val": " "},
+        {"type": "record", "key": "missing"},
+    ]},
+    {"type": "coalesce", "objects": [
+        {"type": "record", "key": "missing"},
+        {"type": "record", "key": "zero"},
+        {"type": "record", "key": "first_name"},
+    ]},
+    {"type": "substr", "object": {"type": "record", "key": "first_name"}, "start": 1, "length": 3},
+    {"type": "substr", "object": {"type": "record", "key": "missing"}, "length": 3},
+    {"type": "hash", "object": {"type": "record", "key": "email"}},
+    {"type": "tofloat", "object": {"type": "record", "key": "amount"}},
+    {"type": "tofloat", "object": {"type": "record", "key": "first_name"}},
+    {"type": "sum", "objects": [
+        {"type": "record", "key": "amount"},
+        {"type": "record", "key": "first_name"},
+        {"type": "float", "val": 2},
+    ]},
+    {"type": "sum", "objects": [{"type": "record", "key": "address"}]},
+    {"type": "multiply", "objects": [{"type": "record", "key": "amount"}, {"type": "float", "val": 3}]},
+    {"type": "divide", "objects": [{"type": "record", "key": "amount"}, {"type": "float", "val": 4}]},
+    {"type": "difference", "objects": [{"type": "record", "key": "amount"}, {"type": "float", "val": 4}]},
+    {"type": "if",
+     "condition": {"operator": "and", "conditions": [
+         {"operator": "eq", "left": {"type": "record", "key": "first_name"}, "right": {"type": "text", "val": "Chris"}},
+         {"operator": "gt", "left": {"type": "record", "key": "amount"}, "right": {"type": "float", "val": 1}},
+     ]},
+     "then": {"type": "text", "val": "Christopher"},
+     "else": {"type": "record", "key": "first_name"}},
+    {"type": "if",
+     "condition": {"operator": "or", "conditions": [
+         {"operator": "lt", "left": {"type": "record", "key": "missing"}, "right": {"type": "float", "val": 1}},
+         {"operator": "lte", "left": {"type": "record", "key": "first_name"}, "right": {"type": "float", "val": 1}},
+     ]},
+     "then": {"type": "text", "val": "yes"},
+     "else": {"type": "text", "val": "no"}},
+    {"type": "if", "then": {"type": "text", "val": "yes"}},
+    {"type": "if",
+     "condition": {"operator": "nope", "left": {"type": "text", "val": 1}, "right": {"type": "text", "val": 1}},
+     "then": {"type": "text", "val": "yes"},
+     "else": {"type": "text", "val": "no"}},
+    {"type": "unknown"},
+    {"type": "record"},
+    {"key": "first_name"},
+    {},
+    None,
+]
+
+RECORDS = [
+    {
+        "first_name": "Chris",
+        "email": "chris@example.com",
+        "amount": "12.5",
+        "zero": 0,
+        "address": {"city": "Denver"},
+    },
+    {"first_name": "Ann", "amount": None, "zero": None},
+    {"@item": 5},
+    {},
+]
+
+
+class TestCompileMapping(unittest.TestCase):
+    def setUp(self):
+        args = MagicMock()
+        args.config = {"meta": {"foo": "bar"}, "mappings": {}}
+        self.processor = Processor(args)
+
+    @patch("transform_singer.failures.logger.log_warning")
+    def test_matches_interpreter(self, *loggers):
+        for mapping in MAPPINGS:
+            compiled = self.processor.compiler.compile(mapping)
+
+            for record in RECORDS:
+                with self.subTest(mapping=mapping, record=record):
+                    self.assertEqual(
+                        compiled(record),
+                        self.processor.process_mapping(mapping, record),
+                    )
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_opt_out(self, write_record):
+        args = MagicMock()
+        args.config = {
+            "compile_mappings": False,
+            "mappings": {
+                "facilities": [
+                    {
+                        "stream": "location",
+                        "properties": {
+                            "name": {"type": "record", "key": "name"},
+                        },
+                    }
+                ],
+            },
+        }
+        processor = Processor(args)
+
+        with patch.object(processor, "process_mapping", wraps=processor.process_mapping) as process_mapping:
+            processor.process_record("facilities", {"name": "Foo"})
+
+        process_mapping.assert_called_once_with({"type": "record", "key": "name"}, {"name": "Foo"})
+        write_record.assert_called_once_with("location", {"name": "Foo"})
+
+
+class CountingRecord(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+
+    def get(self, key, default=None):
+        self.reads += 1
+        return super().get(key, default)
+
+
+class TestSharedSubexpressions(unittest.TestCase):
+    @patch("transform_singer.processor.singer.write_record")
+    def test_evaluated_once_per_record(self, write_record):
+        email_hash = {"type": "hash", "object": {"type": "record", "key": "email"}}
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "users": [
+                    {
+                        "stream": "people",
+                        "exclude": {
+                            "type": "if",
+                            "condition": {"operator": "eq", "left": email_hash, "right": {"type": "text", "val": ""}},
+                            "then": {"type": "text", "val": "yes"},
+                        },
+                        "properties": {
+                            "id": email_hash,
+                            "key": {"type": "join", "pieces": [{"type": "text", "val": "user-"}, email_hash]},
+                        },
+                    },
+                    {
+                        "stream": "emails",
+                        "properties": {"id": dict(email_hash)},
+                    },
+                ],
+            }
+        }
+        processor = Processor(args)
+
+        for email in ("a@example.com", "b@example.com"):
+            record = CountingRecord({"email": email})
+            processor.process_record("users", record)
+            self.assertEqual(record.reads, 1)
+
+        self.assertEqual(len(write_record.call_args_list), 4)
+        write_record.assert_any_call(
+            "people",
+            {"id": "b418773a2c51fb9777a1648346fa7394", "key": "user-b418773a2c51fb9777a1648346fa7394"},
+        )
+        self.assertIsNone(processor.compiler.memo)
+
+
+class TestConstantFolding(unittest.TestCase):
+    def setUp(self):
+        args = MagicMock()
+        args.config = {"meta": {"foo": "bar", "rate": "1.5"}, "mappings": {}}
+        self.processor = Processor(args)
+
+    def test_folds_constants(self):
+        compiled = self.processor.compiler.compile(
+            {
+                "type": "join",
+                "pieces": [
+                    {"type": "text", "val": "foo-"},
+                    {"type": "config", "key": "foo"},
+                    {"type": "tofloat", "object": {"type": "config", "key": "rate"}},
+                ],
+            }
+        )
+        self.processor.config["meta"]["foo"] = "changed"
+
+        self.assertEqual(compiled({}), "foo-bar1.5")
+
+    def test_keeps_record_lookups(self):
+        compiled = self.processor.compiler.compile(
+            {
+                "type": "join",
+                "pieces": [
+                    {"type": "config", "key": "foo"},
+                    {"type": "record", "key": "id"},
+                ],
+            }
+        )
+
+        self.assertEqual(compiled({"id": 1}), "bar1")
+        self.assertEqual(compiled({"id": 2}), "bar2")
+
+    @patch("transform_singer.failures.logger.log_warning")
+    def test_failing_constants_still_log(self, log_warning):
+        compiled = self.processor.compiler.compile(
+            {"type": "hash", "object": {"type": "float", "val": 1}}
+        )
+
+        self.assertIsNone(compiled({}))
+        self.assertIsNone(compiled({}))
+        self.assertEqual(log_warning.call_count, 1)
+        self.assertEqual(self.processor.failures.counts[("<hash>", "AttributeError")], [2, 1])
+
+    @patch("transform_singer.failures.logger.log_warning")
+    def test_constants_with_failing_parts_still_log(self, log_warning):
+        for mapping, expected in (
+            (
+                {
+                    "type": "join",
+                    "pieces": [
+                        {"type": "text", "val": "a"},
+                        {"type": "substr", "object": {"type": "float", "val": 1}, "length": 1},
+                    ],
+                },
+                "aNone",
+            ),
+            (
+                {
+                    "type": "coalesce",
+                    "objects": [
+                        {"type": "hash", "object": {"type": "float", "val": 1}},
+                        {"type": "text", "val": "b"},
+                    ],
+                },
+                "b",
+            ),
+        ):
+            with self.subTest(type=mapping["type"]):
+                self.processor.failures.counts = {}
+                compiled = self.processor.compiler.compile(mapping)
+
+                # Nothing is reported while compiling, and every record reports it again
+                self.assertEqual(self.processor.failures.counts, {})
+                self.assertEqual(compiled({}), expected)
+                self.assertEqual(compiled({}), expected)
+                (count,) = self.processor.failures.counts.values()
+                self.assertEqual(count[0], 2)
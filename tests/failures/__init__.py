@@ -0,0 +1 @@
+from .test_failure_log import *
@@ -0,0 +1,118 @@
+import copy
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.processor import Processor
+
+MAPPINGS = {
+    "orders.items": [
+        {
+            "stream": "item",
+            "properties": {
+                "code": {
+                    "type": "hash",
+                    "object": {"type": "record", "key": "sku"},
+                },
+            },
+        }
+    ],
+}
+
+RECORD = {
+    "number": 7,
+    "notes": "x" * 10000,
+    "items": [{"id": 1, "sku": None}, {"id": 2, "sku": None}, {"id": 3, "sku": "c"}],
+}
+
+
+def logged(log_warning, prefix):
+    return [
+        json.loads(call.args[0][len(prefix):])
+        for call in log_warning.call_args_list
+        if call.args[0].startswith(prefix)
+    ]
+
+
+@patch("transform_singer.processor.singer.write_record")
+@patch("transform_singer.failures.logger.log_warning")
+class TestFailureLog(unittest.TestCase):
+    def run_records(self, config, messages):
+        args = MagicMock()
+        args.config = config
+        processor = Processor(args)
+
+        for message in messages:
+            processor.process(message)
+        processor.close()
+
+        return processor
+
+    def test_logs_path_error_and_keys(self, log_warning, write_record):
+        record = {"type": "RECORD", "stream": "orders", "record": RECORD}
+        self.run_records({"mappings": MAPPINGS}, [record])
+
+        failures = logged(log_warning, "Unable to run mapping: ")
+        self.assertEqual(
+            failures,
+            [
+                {
+                    "path": 'mappings["orders.items"][0].properties.code',
+                    "error": "AttributeError",
+                    "stream": "orders.items",
+                    "keys": {"id": 1},
+                }
+            ],
+        )
+
+        summaries = logged(log_warning, "Mapping failures: ")
+        self.assertEqual(
+            summaries,
+            [
+                {
+                    "path": 'mappings["orders.items"][0].properties.code',
+                    "error": "AttributeError",
+                    "count": 1,
+                    "total": 2,
+                }
+            ],
+        )
+
+    def test_key_properties_from_schema(self, log_warning, write_record):
+        messages = [
+            {"type": "SCHEMA", "stream": "orders", "schema": {}, "key_properties": ["number"]},
+            {"type": "RECORD", "stream": "orders", "record": RECORD},
+        ]
+        self.run_records({"mappings": MAPPINGS}, messages)
+
+        failure = logged(log_warning, "Unable to run mapping: ")[0]
+        self.assertEqual(failure["keys"], {"id": 1, "@root.number": 7})
+
+    def test_top_level_streams_with_dots(self, log_warning, write_record):
+        mappings = {
+            "public.orders": copy.deepcopy(MAPPINGS["orders.items"]),
+            "public.orders.items": copy.deepcopy(MAPPINGS["orders.items"]),
+        }
+        messages = [
+            {"type": "SCHEMA", "stream": "public.orders", "schema": {}, "key_properties": ["number"]},
+            {"type": "RECORD", "stream": "public.orders", "record": RECORD},
+        ]
+        self.run_records({"mappings": mappings}, messages)
+
+        failures = logged(log_warning, "Unable to run mapping: ")
+        self.assertEqual(failures[0]["stream"], "public.orders")
+        self.assertEqual(failures[0]["keys"], {"number": 7})
+        self.assertEqual(failures[1]["stream"], "public.orders.items")
+        self.assertEqual(failures[1]["keys"], {"id": 1, "@root.number": 7})
+
+    def test_debug_adds_a_short_excerpt(self, log_warning, write_record):
+        record = {"type": "RECORD", "stream": "orders", "record": RECORD}
+        self.run_records({"mappings": MAPPINGS, "debug": True}, [record])
+
+        failure = logged(log_warning, "Unable to run mapping: ")[0]
+        self.assertEqual(failure["record"], "{'id': 1, 'sku': None}")
+
+        self.run_records({"mappings": {"orders": MAPPINGS["orders.items"]}, "debug": True}, [record])
+        failure = logged(log_warning, "Unable to run mapping: ")[-1]
+        self.assertLessEqual(len(failure["record"]), 500)
+        self.assertNotIn("x" * 100, failure["record"])
@@ -0,0 +1,119 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer import files
+from transform_singer.files import open_input, open_output, read_lines
+from transform_singer.processor import Processor
+from transform_singer.writer import BufferedWriter
+
+MAPPINGS = {
+    "users": [
+        {
+            "stream": "people",
+            "properties": {
+                "name": {"type": "record", "key": "name"},
+                "nul": {"type": "record", "key": "nul"},
+            },
+        }
+    ],
+}
+
+LINES = [
+    json.dumps({"type": "SCHEMA", "stream": "users", "schema": {}, "key_properties": []}),
+    json.dumps({"type": "RECORD", "stream": "users", "record": {"name": "Zoë", "nul": "a\u0000b"}}),
+    json.dumps({"type": "RECORD", "stream": "other", "record": {"name": "skipped"}}),
+    "",
+    "not json\r",
+    json.dumps({"type": "STATE", "value": {"bookmark": 1}}),
+]
+
+
+def transform(lines):
+    output = io.StringIO()
+    args = MagicMock()
+    args.config = {"mappings": MAPPINGS}
+    processor = Processor(args)
+    processor.writer = BufferedWriter(output)
+
+    for line in lines:
+        processor.process_line(line)
+    processor.close()
+
+    return output.getvalue()
+
+
+class TestFiles(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, data, opener=open):
+        path = os.path.join(self.dir.name, name)
+        with opener(path, "wb") as f:
+            f.write(data)
+        return path
+
+    @patch.object(files, "READ_SIZE", 10)
+    def test_read_lines(self):
+        data = "\n".join(LINES).encode("utf-8")
+        expected = [line.strip().encode("utf-8") for line in LINES if line.strip()]
+
+        self.assertEqual(list(read_lines(self.write("plain.jsonl", data))), expected)
+        self.assertEqual(list(read_lines(self.write("empty.jsonl", b""))), [])
+
+        # Compressed files are recognised by their contents, not their names
+        path = self.write("compressed.jsonl", data + b"\n", gzip.open)
+        self.assertEqual(list(read_lines(path)), expected)
+
+        with open_input(path) as f:
+            self.assertEqual(f.read(), data + b"\n")
+
+    def test_pipes(self):
+        data = "\n".join(LINES).encode("utf-8")
+        expected = [line.strip().encode("utf-8") for line in LINES if line.strip()]
+
+        for name, payload in (("plain", data), ("compressed", gzip.compress(data))):
+            with self.subTest(name=name):
+                path = os.path.join(self.dir.name, f"{name}.fifo")
+                os.mkfifo(path)
+                writer = threading.Thread(target=self.write, args=(f"{name}.fifo", payload))
+                writer.start()
+
+                try:
+                    self.assertEqual(list(read_lines(path)), expected)
+                finally:
+                    writer.join()
+
+    def test_files_that_cant_be_mapped(self):
+        data = "\n".join(LINES).encode("utf-8")
+        expected = [line.strip().encode("utf-8") for line in LINES if line.strip()]
+        path = self.write("plain.jsonl", data)
+
+        with patch.object(files.mmap, "mmap", side_effect=OSError("no mmap here")):
+            self.assertEqual(list(read_lines(path)), expected)
+
+    def test_bytes_lines_match_str_lines(self):
+        str_lines = [line.strip() for line in LINES if line.strip()]
+        path = self.write("plain.jsonl", "\n".join(LINES).encode("utf-8"))
+
+        self.assertEqual(transform(read_lines(path)), transform(str_lines))
+        self.assertIn('"nul":"ab"', transform(read_lines(path)))
+
+    def test_open_output(self):
+        plain = os.path.join(self.dir.name, "out.jsonl")
+        compressed = os.path.join(self.dir.name, "out.jsonl.gz")
+
+        for path in (plain, compressed):
+            with open_output(path) as f:
+                f.write("Zoë\n")
+
+        with open(plain, "rb") as f:
+            self.assertEqual(f.read(), "Zoë\n".encode("utf-8"))
+        with gzip.open(compressed, "rb") as f:
+            self.assertEqual(f.read(), "Zoë\n".encode("utf-8"))
@@ -0,0 +1,99 @@
+import hashlib
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.hashing import Hasher
+from transform_singer.processor import Processor
+
+
+class TestHasher(unittest.TestCase):
+    def test_md5_is_the_default(self):
+        hasher = Hasher()
+
+        self.assertEqual(hasher.hash("a@example.com"), "b418773a2c51fb9777a1648346fa7394")
+        self.assertEqual(
+            hasher.hash("a@example.com", "blake2b"),
+            hashlib.blake2b(b"a@example.com").hexdigest(),
+        )
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            Hasher().function("crc0")
+
+    def test_cache_counts_hits_and_misses(self):
+        hasher = Hasher(max_entries=10)
+        digest = hasher.function("sha256")
+
+        for value in ["a", "b", "a", "a", "c", "b"]:
+            self.assertEqual(digest(value), hashlib.sha256(value.encode()).hexdigest())
+
+        self.assertEqual((hasher.hits, hasher.misses), (3, 3))
+
+    def test_cache_evicts_least_recently_used(self):
+        hasher = Hasher(max_entries=2)
+        digest = hasher.function()
+
+        digest("a")
+        digest("b")
+        digest("a")
+        digest("c")
+
+        self.assertEqual([value for _, value in hasher.cache], ["a", "c"])
+
+    def test_cache_memory_cap(self):
+        hasher = Hasher(max_entries=1000, max_bytes=2000)
+        digest = hasher.function()
+
+        for i in range(100):
+            digest(str(i))
+
+        self.assertLessEqual(hasher.bytes, 2000)
+        self.assertGreater(len(hasher.cache), 0)
+        self.assertLess(len(hasher.cache), 100)
+
+    def test_non_strings_still_fail(self):
+        digest = Hasher(max_entries=10).function()
+
+        with self.assertRaises(AttributeError):
+            digest(None)
+        with self.assertRaises(AttributeError):
+            digest([1])
+
+
+@patch("transform_singer.processor.singer.write_record")
+class TestHashMappings(unittest.TestCase):
+    def test_algorithm_and_cache_in_both_engines(self, write_record):
+        for compile_mappings in (True, False):
+            with self.subTest(compile_mappings=compile_mappings):
+                args = MagicMock()
+                args.config = {
+                    "compile_mappings": compile_mappings,
+                    "hash_cache_size": 100,
+                    "mappings": {
+                        "users": [
+                            {
+                                "stream": "people",
+                                "properties": {
+                                    "md5": {"type": "hash", "object": {"type": "record", "key": "email"}},
+                                    "sha1": {
+                                        "type": "hash",
+                                        "algorithm": "sha1",
+                                        "object": {"type": "record", "key": "email"},
+                                    },
+                                },
+                            }
+                        ],
+                    },
+                }
+                processor = Processor(args)
+                processor.process_record("users", {"email": "a@example.com"})
+                processor.process_record("users", {"email": "a@example.com"})
+
+                write_record.assert_called_with(
+                    "people",
+                    {
+                        "md5": "b418773a2c51fb9777a1648346fa7394",
+                        "sha1": hashlib.sha1(b"a@example.com").hexdigest(),
+                    },
+                )
+                self.assertEqual((processor.hasher.hits, processor.hasher.misses), (2, 2))
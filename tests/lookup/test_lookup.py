@@ -0,0 +1,191 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.lookup import LookupTables, lookup_key
+from transform_singer.processor import Processor
+
+STATUS = {"type": "record", "key": "status"}
+COUNTRY = {"type": "record", "key": "country"}
+REGION = {"type": "record", "key": "region"}
+
+
+class TestLookupTables(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_csv_rows(self):
+        path = self.write("codes.csv", "code,label\n1,One\n2,Two\n1,Duplicate\n")
+        tables = LookupTables({})
+
+        table = tables.table({"object": STATUS, "file": path, "key": "code", "value": "label"})
+        self.assertEqual(table, {"1": "One", "2": "Two"})
+        self.assertEqual(table[lookup_key([1])], "One")
+
+        # The same table is only loaded once
+        self.assertIs(
+            tables.table({"object": COUNTRY, "file": path, "key": "code", "value": "label"}), table
+        )
+
+        rows = tables.table({"object": STATUS, "file": path, "key": "code"})
+        self.assertEqual(rows["2"], {"code": "2", "label": "Two"})
+
+    def test_composite_keys(self):
+        path = self.write(
+            "regions.jsonl",
+            '{"country": "US", "region": "CA", "name": "California"}\n\n'
+            '{"country": "CA", "region": "QC", "name": "Quebec"}\n',
+        )
+        tables = LookupTables({"regions": {"US": {"CA": "California"}, "CA": {"QC": "Quebec"}}})
+        expected = {("US", "CA"): "California", ("CA", "QC"): "Quebec"}
+
+        self.assertEqual(
+            tables.table(
+                {"objects": [COUNTRY, REGION], "file": path, "key": ["country", "region"], "value": "name"}
+            ),
+            expected,
+        )
+        self.assertEqual(tables.table({"objects": [COUNTRY, REGION], "meta": "regions"}), expected)
+
+    def test_files_next_to_the_config(self):
+        self.write("codes.csv", "code,label\n1,One\n")
+        tables = LookupTables({}, self.dir.name)
+
+        table = tables.table({"object": STATUS, "file": "codes.csv", "key": "code", "value": "label"})
+        self.assertEqual(table, {"1": "One"})
+
+        args = MagicMock()
+        args.config = {"mappings": {}}
+        args.config_path = os.path.join(self.dir.name, "config.json")
+        self.assertEqual(Processor(args).lookups.base_dir, self.dir.name)
+
+    def test_rows_are_indexed_as_they_are_read(self):
+        path = self.write("codes.jsonl", '{"code": 1, "label": "One"}\nnot json\n')
+        tables = LookupTables({})
+
+        with patch("transform_singer.lookup._index_rows", side_effect=ValueError("stop")) as index:
+            with self.assertRaises(ValueError):
+                tables.table({"object": STATUS, "file": path, "key": "code"})
+
+        # Handed a stream of rows, not a list of all of them
+        self.assertNotIsInstance(index.call_args.args[0], list)
+
+    def test_tables_are_cached_by_mapping(self):
+        tables = LookupTables({"labels": {"A": "Active"}})
+        mapping = {"object": STATUS, "meta": "labels"}
+        table = tables.table(mapping)
+
+        with patch("transform_singer.lookup.json.dumps") as dumps:
+            self.assertIs(tables.table(mapping), table)
+
+        dumps.assert_not_called()
+
+    def test_unloadable_tables_keep_failing(self):
+        tables = LookupTables({"labels": "not a table"})
+
+        for mapping in (
+            {"object": STATUS, "file": os.path.join(self.dir.name, "missing.csv"), "key": "code"},
+            {"object": STATUS, "meta": "labels"},
+            {"object": STATUS, "file": self.write("codes.txt", ""), "key": "code"},
+        ):
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    tables.table(mapping)
+
+
+@patch("transform_singer.processor.singer.write_record")
+class TestLookupMappings(unittest.TestCase):
+    def test_both_engines(self, write_record):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "countries.json")
+            with open(path, "w") as f:
+                json.dump([{"code": "US", "name": "United States"}], f)
+
+            for compile_mappings in (True, False):
+                with self.subTest(compile_mappings=compile_mappings):
+                    args = MagicMock()
+                    args.config = {
+                        "compile_mappings": compile_mappings,
+                        "meta": {"labels": {"A": "Active", "true": "Yes"}},
+                        "mappings": {
+                            "users": [
+                                {
+                                    "stream": "people",
+                                    "properties": {
+                                        "status": {
+                                            "type": "lookup",
+                                            "object": STATUS,
+                                            "meta": "labels",
+                                            "default": {"type": "text", "val": "Unknown"},
+                                        },
+                                        "country": {
+                                            "type": "lookup",
+                                            "object": COUNTRY,
+                                            "file": path,
+                                            "key": "code",
+                                            "value": "name",
+                                        },
+                                        "missing": {"type": "lookup", "object": STATUS, "meta": "nope"},
+                                    },
+                                }
+                            ],
+                        },
+                    }
+                    processor = Processor(args)
+
+                    with patch("transform_singer.failures.logger.log_warning") as log_warning:
+                        processor.process_record("users", {"status": "A", "country": "US"})
+                        processor.process_record("users", {"status": True, "country": "CA"})
+                        processor.process_record("users", {"status": "X"})
+
+                    self.assertEqual(
+                        [call.args for call in write_record.call_args_list],
+                        [
+                            ("people", {"status": "Active", "country": "United States", "missing": None}),
+                            ("people", {"status": "Yes", "country": None, "missing": None}),
+                            ("people", {"status": "Unknown", "country": None, "missing": None}),
+                        ],
+                    )
+                    log_warning.assert_called_once()
+                    self.assertIn("ValueError", log_warning.call_args.args[0])
+                    write_record.reset_mock()
+
+    def test_tables_with_nul_characters_are_scrubbed(self, write_record):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "labels.jsonl")
+            with open(path, "w") as f:
+                f.write(json.dumps({"code": "A", "label": "Act\u0000ive"}) + "\n")
+
+            args = MagicMock()
+            args.config = {
+                "mappings": {
+                    "users": [
+                        {
+                            "stream": "people",
+                            "properties": {
+                                "l": {"type": "lookup", "object": STATUS, "file": path, "key": "code", "value": "label"},
+                                "n": {"type": "record", "key": "name"},
+                            },
+                        }
+                    ],
+                },
+            }
+            processor = Processor(args)
+
+            processor.process_line('{"type": "RECORD", "stream": "users", "record": {"status": "A", "name": "x"}}')
+            processor.process_line('{"type": "RECORD", "stream": "users", "record": {"status": "A", "name": "x\\u0000"}}')
+
+        self.assertTrue(processor.lookups.has_nul)
+        self.assertEqual(
+            [call.args for call in write_record.call_args_list],
+            [("people", {"l": "Active", "n": "x"})] * 2,
+        )
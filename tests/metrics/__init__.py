@@ -0,0 +1 @@
+from .test_metrics import *
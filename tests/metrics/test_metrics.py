@@ -0,0 +1,124 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.processor import Processor
+
+MAPPINGS = {
+    "orders": [
+        {
+            "stream": "order",
+            "exclude": {"type": "record", "key": "void"},
+            "properties": {
+                "id": {"type": "record", "key": "id"},
+                "total": {
+                    "type": "sum",
+                    "objects": [
+                        {"type": "record", "key": "subtotal"},
+                        {"type": "record", "key": "tax"},
+                    ],
+                },
+                "source": {"type": "text", "val": "shop"},
+            },
+        }
+    ],
+    "orders.items": [
+        {
+            "stream": "item",
+            "properties": {"sku": {"type": "record", "key": "sku"}},
+        }
+    ],
+}
+
+RECORDS = [
+    {"id": 1, "subtotal": 10, "tax": 1, "items": [{"sku": "a"}, {"sku": "b"}]},
+    {"id": 2, "void": True, "items": [{"sku": "c"}]},
+    {"id": 3, "subtotal": 5},
+]
+
+
+def metric_points(log_info):
+    points = []
+    for call in log_info.call_args_list:
+        line = call.args[0]
+        if line.startswith("METRIC: "):
+            points.append(json.loads(line[len("METRIC: "):]))
+
+    return points
+
+
+def point(points, metric, **tags):
+    matches = [
+        p for p in points if p["metric"] == metric and all(p["tags"].get(k) == v for k, v in tags.items())
+    ]
+    assert len(matches) == 1, (metric, tags, matches)
+    return matches[0]
+
+
+@patch("transform_singer.processor.singer.write_record")
+class TestMetrics(unittest.TestCase):
+    def run_records(self, config, lines=False):
+        args = MagicMock()
+        args.config = config
+        processor = Processor(args)
+
+        with patch("transform_singer.metrics.logger.log_info") as log_info:
+            for record in RECORDS:
+                message = {"type": "RECORD", "stream": "orders", "record": record}
+                if lines:
+                    processor.process_line(json.dumps(message))
+                else:
+                    processor.process(message)
+            processor.close()
+
+        return processor, metric_points(log_info)
+
+    def test_metrics_are_logged_on_close(self, write_record):
+        configs = {
+            "compiled": {},
+            "interpreted": {"compile_mappings": False},
+            "streamed": {"large_record_bytes": 1},
+            "batched": {"columnar_batch_size": 2},
+        }
+
+        for name, options in configs.items():
+            with self.subTest(name):
+                _, points = self.run_records(
+                    {"mappings": MAPPINGS, "metrics_interval": 60, **options}, lines=True
+                )
+                self.assert_points(points)
+
+    def assert_points(self, points):
+        self.assertEqual(point(points, "record_count", stream="orders", direction="in")["value"], 3)
+        self.assertEqual(point(points, "record_count", stream="orders.items", direction="in")["value"], 3)
+        self.assertEqual(point(points, "record_count", stream="order", direction="out")["value"], 2)
+        self.assertEqual(point(points, "record_count", stream="item", direction="out")["value"], 3)
+
+        exclude = point(points, "exclude_count", stream="order")
+        self.assertEqual((exclude["value"], exclude["tags"]["excluded"]), (3, 1))
+
+        nested = point(points, "nested_record_count", stream="orders.items")
+        self.assertEqual((nested["value"], nested["tags"]["parents"]), (3, 2))
+
+        # 3 excludes, 2 ids, 2 sums of 2 and 3 skus, and the constant text of the 2 orders
+        self.assertEqual(point(points, "mapping_eval_count", mapping_type="record")["value"], 12)
+        self.assertEqual(point(points, "mapping_eval_count", mapping_type="sum")["value"], 2)
+        self.assertEqual(point(points, "mapping_eval_count", mapping_type="text")["value"], 2)
+
+        self.assertEqual(point(points, "process_record_time", stream="orders")["type"], "timer")
+        self.assertEqual(point(points, "mapping_eval_time", mapping_type="sum")["type"], "timer")
+
+    def test_metrics_reset_after_emit(self, write_record):
+        processor, _ = self.run_records({"mappings": MAPPINGS, "metrics_interval": 60})
+
+        with patch("transform_singer.metrics.logger.log_info") as log_info:
+            processor.metrics.emit()
+
+        self.assertEqual(metric_points(log_info), [])
+
+    def test_disabled_by_default(self, write_record):
+        processor, points = self.run_records({"mappings": MAPPINGS})
+
+        self.assertIsNone(processor.metrics)
+        self.assertEqual(points, [])
+        self.assertEqual(len(write_record.call_args_list), 5)
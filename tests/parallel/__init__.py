@@ -0,0 +1 @@
+from .test_parallel_runner import *
@@ -0,0 +1,132 @@
+import io
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.parallel import ParallelRunner
+from transform_singer.processor import Processor
+from transform_singer.writer import BufferedWriter
+
+
+CONFIG = {
+    "mappings": {
+        "users": [
+            {
+                "stream": "people",
+                "properties": {
+                    "name": {"type": "record", "key": "name"},
+                    "next": {"type": "sum", "objects": [
+                        {"type": "record", "key": "id"},
+                        {"type": "float", "val": 1},
+                    ]},
+                },
+            }
+        ],
+        "users.kids": [
+            {
+                "stream": "kids",
+                "properties": {
+                    "kid": {"type": "record", "key": "@item"},
+                    "parent": {"type": "record", "key": "@parent.name"},
+                },
+            }
+        ],
+    }
+}
+
+
+def make_lines():
+    lines = []
+
+    for i in range(50):
+        lines.append(json.dumps({
+            "type": "RECORD",
+            "stream": "users",
+            "record": {"id": i, "name": f"user{i}", "kids": [i, i + 1]},
+        }))
+
+        if i % 7 == 0:
+            lines.append(json.dumps({"type": "STATE", "value": {"id": i}}))
+            lines.append("plain text")
+
+    return lines
+
+
+def make_processor():
+    args = MagicMock()
+    args.config = json.loads(json.dumps(CONFIG))
+    processor = Processor(args)
+    processor.writer = BufferedWriter(io.StringIO(), codec=processor.codec)
+    return processor
+
+
+class TestParallelRunner(unittest.TestCase):
+    def test_matches_serial(self):
+        serial = make_processor()
+        for line in make_lines():
+            serial.process_line(line)
+        serial.close()
+
+        parallel = make_processor()
+        runner = ParallelRunner(parallel, workers=2, chunk_size=3)
+        for line in make_lines():
+            runner.process_line(line)
+        runner.close()
+
+        self.assertEqual(
+            parallel.writer.output.getvalue(), serial.writer.output.getvalue()
+        )
+        self.assertIn('{"type":"STATE","value":{"id":49}}', serial.writer.output.getvalue())
+
+    def test_lazy_pool(self):
+        processor = make_processor()
+        runner = ParallelRunner(processor, workers=2)
+        runner.process_line(json.dumps({"type": "STATE", "value": {}}))
+        self.assertIsNone(runner.pool)
+        runner.close()
+
+        self.assertEqual(
+            processor.writer.output.getvalue(), '{"type":"STATE","value":{}}\n'
+        )
+
+    def test_worker_failures_and_metrics_are_reported(self):
+        args = MagicMock()
+        args.config = json.loads(json.dumps(CONFIG))
+        args.config["metrics_interval"] = 3600
+        args.config["mappings"]["users"][0]["properties"]["bad"] = {
+            "type": "substr",
+            "object": {"type": "record", "key": "missing"},
+            "length": 2,
+        }
+        processor = Processor(args)
+        processor.writer = BufferedWriter(io.StringIO(), codec=processor.codec)
+
+        with patch("transform_singer.failures.logger.log_warning") as log_warning, patch(
+            "transform_singer.metrics.logger.log_info"
+        ) as log_info:
+            runner = ParallelRunner(processor, workers=2, chunk_size=3)
+            for line in make_lines():
+                runner.process_line(line)
+            runner.close()
+
+        warnings = [call.args[0] for call in log_warning.call_args_list]
+        self.assertEqual(len(warnings), 2)
+        self.assertTrue(warnings[0].startswith("Unable to run mapping: "))
+        self.assertIn('"keys": {"id": 0}', warnings[0])
+        self.assertIn('"count": 49, "total": 50', warnings[1])
+
+        metrics = [json.loads(call.args[0][len("METRIC: "):]) for call in log_info.call_args_list]
+        records = {
+            (point["tags"]["stream"], point["tags"]["direction"]): point["value"]
+            for point in metrics
+            if point["metric"] == "record_count"
+        }
+        self.assertEqual(
+            records,
+            {
+                ("users", "in"): 50,
+                ("users.kids", "in"): 100,
+                ("people", "out"): 50,
+                ("kids", "out"): 100,
+            },
+        )
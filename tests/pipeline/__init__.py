@@ -0,0 +1 @@
+from .test_run_pipelined import *
@@ -0,0 +1,85 @@
+import io
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer import pipeline
+from transform_singer.pipeline import read_batches, run_pipelined
+from transform_singer.processor import Processor
+from transform_singer.writer import BufferedWriter, ThreadedWriter
+
+MAPPINGS = {
+    "users": [
+        {
+            "stream": "people",
+            "properties": {"name": {"type": "record", "key": "name"}},
+        }
+    ],
+}
+
+
+def tap_output():
+    lines = []
+    for i in range(1000):
+        lines.append(json.dumps({"type": "RECORD", "stream": "users", "record": {"name": f"Zoë {i}"}}))
+        if i % 100 == 0:
+            lines.append(json.dumps({"type": "STATE", "value": {"bookmark": i}}))
+            lines.append("")
+            lines.append("not json\r")
+
+    return ("\n".join(lines)).encode("utf-8")
+
+
+def processor_with(writer):
+    args = MagicMock()
+    args.config = {"mappings": MAPPINGS}
+    processor = Processor(args)
+    processor.writer = writer
+    return processor
+
+
+class TestRunPipelined(unittest.TestCase):
+    @patch.object(pipeline, "READ_SIZE", 100)
+    def test_same_output_as_serial(self):
+        expected = io.StringIO()
+        processor = processor_with(BufferedWriter(expected, codec=None))
+        for line in io.TextIOWrapper(io.BytesIO(tap_output()), encoding="utf-8"):
+            if line.strip():
+                processor.process_line(line.strip())
+        processor.close()
+
+        output = io.StringIO()
+        processor = processor_with(ThreadedWriter(output, batch_size=7, queue_size=2))
+        try:
+            run_pipelined(processor, io.BytesIO(tap_output()), queue_size=2)
+        finally:
+            processor.close()
+
+        self.assertEqual(output.getvalue(), expected.getvalue())
+        self.assertEqual(len(output.getvalue().splitlines()), 1020)
+
+    def test_read_errors_are_raised(self):
+        stream = MagicMock()
+        stream.read1.side_effect = [b'{"type": "STATE", "value": {}}\n', OSError("closed")]
+        processor = processor_with(BufferedWriter(io.StringIO()))
+
+        with self.assertRaises(OSError):
+            run_pipelined(processor, stream)
+
+    def test_processing_errors_stop_the_reader(self):
+        processor = processor_with(BufferedWriter(io.StringIO()))
+        processor.process_line = MagicMock(side_effect=RuntimeError("boom"))
+
+        with self.assertRaises(RuntimeError):
+            run_pipelined(processor, io.BytesIO(tap_output()), queue_size=1)
+
+
+class TestReadBatches(unittest.TestCase):
+    def test_lines_across_reads(self):
+        data = b"a\n" + b"x" * 25 + b"\n\nbc\nd"
+
+        batches = list(read_batches(io.BytesIO(data), size=10))
+
+        self.assertEqual(b"".join(batches[-1]), b"d")
+        self.assertEqual([line for batch in batches for line in batch], data.split(b"\n"))
+        self.assertEqual(list(read_batches(io.BytesIO(b""))), [[]])
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer import plan
+from transform_singer.plan import build_plan, load_plan
+from transform_singer.processor import Processor
+
+HASHED = {"type": "hash", "object": {"type": "record", "key": "email"}}
+
+MAPPINGS = {
+    "records": [
+        {"stream": "records", "properties": {"a": HASHED, "b": HASHED}},
+    ],
+    "records.items": [
+        {"stream": "items", "properties": {"id": {"type": "record", "key": "@parent.id"}}},
+    ],
+    "broken": [{"properties": {}}],
+}
+
+
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_build_plan(self):
+        result = build_plan(MAPPINGS)
+
+        self.assertEqual(result["routes"], {"records": ("items",)})
+        self.assertEqual(result["contexts"], {"records.items": {"@parent"}})
+        self.assertEqual(result["streamable"], {"records": {"items"}})
+        self.assertEqual(len(result["shared"]["records"]), 2)
+        self.assertEqual(result["shared"]["records.items"], set())
+        self.assertEqual(result["invalid"], {"broken": "entry 0 has no target stream"})
+
+    def test_cached_plans_are_loaded(self):
+        cache_dir = os.path.join(self.dir.name, "plans")
+        expected = load_plan(MAPPINGS, cache_dir)
+
+        with patch.object(plan, "build_plan", wraps=build_plan) as build:
+            self.assertEqual(load_plan(MAPPINGS, cache_dir), expected)
+            build.assert_not_called()
+
+            # Different mappings get their own plan
+            load_plan({"other": []}, cache_dir)
+            build.assert_called_once()
+
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_plans_of_other_code_are_ignored(self):
+        load_plan(MAPPINGS, self.dir.name)
+
+        plan._code_digest.cache_clear()
+        self.addCleanup(plan._code_digest.cache_clear)
+        with patch.object(plan.routing, "__file__", plan.streaming.__file__):
+            with patch.object(plan, "build_plan", wraps=build_plan) as build:
+                load_plan(MAPPINGS, self.dir.name)
+                build.assert_called_once()
+
+        self.assertEqual(len(os.listdir(self.dir.name)), 2)
+
+    def test_unreadable_plans_are_rebuilt(self):
+        load_plan(MAPPINGS, self.dir.name)
+        (name,) = os.listdir(self.dir.name)
+        with open(os.path.join(self.dir.name, name), "w") as f:
+            f.write('{"version": 1')
+
+        self.assertEqual(load_plan(MAPPINGS, self.dir.name), build_plan(MAPPINGS))
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_processor_output_is_the_same(self, write_record):
+        outputs = []
+
+        for cache_dir in (None, self.dir.name, self.dir.name):
+            args = MagicMock()
+            args.config = {"mappings": MAPPINGS, "plan_cache_dir": cache_dir}
+            processor = Processor(args)
+            processor.process_record("records", {"id": 1, "email": "a@example.com", "items": [{}]})
+            outputs.append(write_record.call_args_list)
+            write_record.reset_mock()
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+        self.assertEqual(len(outputs[0]), 2)
@@ -1,2 +1,3 @@
 from .test_process_mapping import *
-from .test_process_record import *
\ No newline at end of file
+from .test_process_record import *
+from .test_evaluation_count import *
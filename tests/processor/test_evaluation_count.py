@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import MagicMock
+
+from transform_singer.processor import Processor
+
+
+class CountingRecord(dict):
+    """
+    Record that counts how many times each key is read by a `record` mapping
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = {}
+
+    def get(self, key, default=None):
+        self.reads[key] = self.reads.get(key, 0) + 1
+        return super().get(key, default)
+
+
+def record_key(key):
+    return {"type": "record", "key": key}
+
+
+COMBINATORS = [
+    {"type": "coalesce", "objects": [record_key("a"), record_key("b"), record_key("c")]},
+    {"type": "join", "pieces": [record_key("a"), record_key("b"), record_key("c")]},
+    {"type": "sum", "objects": [record_key("a"), record_key("b"), record_key("c")]},
+    {"type": "multiply", "objects": [record_key("a"), record_key("b"), record_key("c")]},
+    {"type": "divide", "objects": [record_key("a"), record_key("b"), record_key("c")]},
+    {"type": "difference", "objects": [record_key("a"), record_key("b"), record_key("c")]},
+    {
+        "type": "coalesce",
+        "objects": [
+            {"type": "hash", "object": {"type": "join", "pieces": [record_key("a"), record_key("b")]}},
+            record_key("c"),
+        ],
+    },
+]
+
+
+class TestEvaluationCount(unittest.TestCase):
+    def assertEvaluatedOnce(self, processor, evaluate):
+        for mapping in COMBINATORS:
+            record = CountingRecord({"a": None, "b": "", "c": "3"})
+
+            with self.subTest(mapping=mapping):
+                evaluate(processor, mapping, record)
+                self.assertTrue(record.reads)
+                self.assertTrue(all(count == 1 for count in record.reads.values()), record.reads)
+
+    def test_interpreter(self):
+        args = MagicMock()
+        args.config = {"mappings": {}}
+        self.assertEvaluatedOnce(
+            Processor(args),
+            lambda processor, mapping, record: processor.process_mapping(mapping, record),
+        )
+
+    def test_compiled(self):
+        args = MagicMock()
+        args.config = {"mappings": {}}
+        self.assertEvaluatedOnce(
+            Processor(args),
+            lambda processor, mapping, record: processor.compiler.compile(mapping)(record),
+        )
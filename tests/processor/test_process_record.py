@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import MagicMock, patch
 
 from transform_singer.processor import Processor
+from transform_singer.writer import CollectingWriter
 
 
 class TestProcessMapping(unittest.TestCase):
@@ -211,3 +212,222 @@ class TestProcessMapping(unittest.TestCase):
                 "rootparent": "Grandperson",
             },
         )
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_nested_item_context(self, write_record):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "facilities.children": [
+                    {
+                        "stream": "location",
+                        "properties": {
+                            "name": {"type": "record", "key": "@item.name"},
+                            "index": {"type": "record", "key": "@index"},
+                        },
+                    }
+                ],
+                "facilities.tags": [
+                    {
+                        "stream": "tag",
+                        "properties": {
+                            "tag": {"type": "record", "key": "@item"},
+                            "facility": {"type": "record", "key": "@parent.name"},
+                        },
+                    }
+                ],
+            }
+        }
+        record = {
+            "name": "Jared",
+            "children": [{"name": "Joe"}, {"name": "Bob"}],
+            "tags": ["big"],
+        }
+        processor = Processor(args)
+        processor.process_record("facilities", record)
+
+        write_record.assert_any_call("location", {"name": "Joe", "index": 0})
+        write_record.assert_any_call("location", {"name": "Bob", "index": 1})
+        write_record.assert_any_call("tag", {"tag": "big", "facility": "Jared"})
+
+        # The nested items are read in place and never modified
+        self.assertDictEqual(record["children"][0], {"name": "Joe"})
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_context_only_where_used(self, write_record):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "facilities.rooms": [
+                    {"stream": "room", "properties": {"name": {"type": "record", "key": "name"}}}
+                ],
+                "facilities.rooms.beds": [
+                    {
+                        "stream": "bed",
+                        "properties": {
+                            "facility": {"type": "record", "key": "@parent.@parent.name"},
+                            "room": {"type": "record", "key": "@parent.@index"},
+                        },
+                    }
+                ],
+            }
+        }
+        record = {
+            "name": "Jared",
+            "rooms": [{"name": "A", "beds": [{}]}, {"name": "B", "beds": [{}, {}]}],
+        }
+        processor = Processor(args)
+        processed = []
+        process_record = processor.process_record
+
+        def spy(stream, item, *args):
+            processed.append((stream, item))
+            process_record(stream, item, *args)
+
+        processor.process_record = spy
+        processor.process_record("facilities", record)
+
+        write_record.assert_any_call("bed", {"facility": "Jared", "room": 0})
+        write_record.assert_any_call("bed", {"facility": "Jared", "room": 1})
+        self.assertEqual(len(write_record.call_args_list), 5)
+
+        rooms = [item for stream, item in processed if stream == "facilities.rooms"]
+        beds = [item for stream, item in processed if stream == "facilities.rooms.beds"]
+        self.assertEqual(sorted(rooms[0].context), ["@index", "@parent"])
+        self.assertEqual(sorted(beds[0].context), ["@parent"])
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_no_context_when_unused(self, write_record):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "facilities.rooms": [
+                    {"stream": "room", "properties": {"name": {"type": "record", "key": "name"}}}
+                ],
+            }
+        }
+        record = {"rooms": [{"name": "A"}]}
+        processor = Processor(args)
+        processor.process_record = MagicMock(wraps=processor.process_record)
+        processor.process_nested("facilities", record, record)
+
+        self.assertIs(processor.process_record.call_args.args[1], record["rooms"][0])
+        write_record.assert_called_once_with("room", {"name": "A"})
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_scrub_nul(self, write_record):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "facilities": [
+                    {
+                        "stream": "location",
+                        "properties": {"name": {"type": "record", "key": "name"}},
+                    },
+                    {
+                        "stream": "raw",
+                        "scrub_nul": False,
+                        "properties": {"name": {"type": "record", "key": "name"}},
+                    },
+                ],
+            }
+        }
+        processor = Processor(args)
+        processor.process_line('{"type": "RECORD", "stream": "facilities", "record": {"name": "Fo\\u0000o"}}')
+
+        write_record.assert_any_call("location", {"name": "Foo"})
+        write_record.assert_any_call("raw", {"name": "Fo\u0000o"})
+
+    @patch("transform_singer.processor.replace_deep")
+    @patch("transform_singer.processor.singer.write_record")
+    def test_clean_lines_skip_scrub(self, write_record, replace_deep):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "facilities": [
+                    {
+                        "stream": "location",
+                        "properties": {"name": {"type": "record", "key": "name"}},
+                    }
+                ],
+            }
+        }
+        processor = Processor(args)
+        processor.process_line('{"type": "RECORD", "stream": "facilities", "record": {"name": "Foo"}}')
+
+        replace_deep.assert_not_called()
+        write_record.assert_called_once_with("location", {"name": "Foo"})
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_nested_targets_do_not_modify_record(self, write_record):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "facilities": [
+                    {
+                        "stream": "location",
+                        "properties": {
+                            "address": {"type": "record", "key": "address"},
+                            "address.country": {"type": "text", "val": "US"},
+                        },
+                    }
+                ],
+            }
+        }
+        record = {"address": {"city": "Denver"}}
+        processor = Processor(args)
+        processor.process_record("facilities", record, has_nul=False)
+
+        write_record.assert_called_once_with(
+            "location", {"address": {"city": "Denver", "country": "US"}}
+        )
+        self.assertDictEqual(record, {"address": {"city": "Denver"}})
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_unmapped_lines_are_not_parsed(self, write_record):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "facilities.children": [
+                    {
+                        "stream": "location",
+                        "properties": {"name": {"type": "record", "key": "name"}},
+                    }
+                ],
+            }
+        }
+        processor = Processor(args)
+        processor.codec = MagicMock(wraps=processor.codec)
+
+        processor.process_line('{"type": "RECORD", "stream": "other", "record": {"name": "Foo"}}')
+        processor.codec.loads.assert_not_called()
+
+        processor.process_line('{"type": "RECORD", "stream": "facilities", "record": {"children": [{"name": "Foo"}]}}')
+        processor.codec.loads.assert_called_once()
+        write_record.assert_called_once_with("location", {"name": "Foo"})
+
+    @patch("transform_singer.processor.singer.write_record")
+    def test_malformed_unmapped_lines_are_passed_along(self, write_record):
+        args = MagicMock()
+        args.config = {"mappings": {}}
+        processor = Processor(args)
+        processor.writer = CollectingWriter(processor.codec)
+
+        self.assertFalse(processor.is_unmapped('{"type": "RECORD", "stream": "other", "recorded": 1}'))
+
+        for line in (
+            '{"type": "RECORD", "stream": "other", "record": {"name": "Fo',
+            b'{"type": "RECORD", "stream": "other"} trailing',
+        ):
+            with self.subTest(line=line):
+                self.assertFalse(processor.is_unmapped(line))
+                processor.process_line(line)
+
+        self.assertEqual(
+            [line for _, line in processor.writer.collect()],
+            [
+                '{"type": "RECORD", "stream": "other", "record": {"name": "Fo',
+                '{"type": "RECORD", "stream": "other"} trailing',
+            ],
+        )
+        self.assertTrue(processor.is_unmapped(b'{"type":"RECORD","stream":"other","record":{"a":1}}\n'))
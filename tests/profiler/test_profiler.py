@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.processor import Processor
+from transform_singer.profiler import Profiler
+
+MAPPINGS = {
+    "orders.items": [
+        {
+            "stream": "item",
+            "properties": {
+                "discount": {
+                    "type": "if",
+                    "condition": {
+                        "operator": "gt",
+                        "left": {"type": "record", "key": "qty"},
+                        "right": {"type": "float", "val": 1},
+                    },
+                    "then": {"type": "tofloat", "object": {"type": "record", "key": "discount"}},
+                },
+                "line.sku": {"type": "record", "key": "sku"},
+            },
+        }
+    ],
+}
+
+RECORD = {"items": [{"qty": 2, "discount": "1.5", "sku": "a"}, {"qty": 1, "sku": "b"}]}
+PREFIX = 'mappings["orders.items"][0].properties'
+
+
+@patch("transform_singer.processor.singer.write_record")
+class TestProfiler(unittest.TestCase):
+    def profile(self, config):
+        args = MagicMock()
+        args.config = config
+        profiler = Profiler()
+        processor = Processor(args, profiler=profiler)
+        processor.process_record("orders", RECORD)
+
+        return profiler, {path: stat[0] for path, stat in profiler.stats.items()}
+
+    def test_calls_by_config_path(self, write_record):
+        for compile_mappings in (True, False):
+            with self.subTest(compile_mappings=compile_mappings):
+                _, calls = self.profile({"mappings": MAPPINGS, "compile_mappings": compile_mappings})
+
+                self.assertEqual(calls[f"{PREFIX}.discount"], 2)
+                self.assertEqual(calls[f"{PREFIX}.discount.condition"], 2)
+                self.assertEqual(calls[f"{PREFIX}.discount.condition.left"], 2)
+                self.assertEqual(calls[f"{PREFIX}.discount.then"], 1)
+                self.assertEqual(calls[f"{PREFIX}.discount.then.object"], 1)
+                self.assertEqual(calls[f'{PREFIX}["line.sku"]'], 2)
+
+    def test_collapsed_stacks(self, write_record):
+        profiler, _ = self.profile({"mappings": MAPPINGS})
+        stacks = [line.rsplit(" ", 1)[0] for line in profiler.collapsed()]
+
+        self.assertIn(f"{PREFIX}.discount;then;object", stacks)
+        self.assertIn(f"{PREFIX}.discount;condition;left", stacks)
+
+    def test_report_is_ranked_by_own_time(self, write_record):
+        profiler, _ = self.profile({"mappings": MAPPINGS})
+        own = [stat[2] for _, stat in sorted(profiler.stats.items(), key=lambda i: -i[1][2])]
+        report = profiler.report()
+
+        self.assertEqual(len(report), len(own) + 1)
+        self.assertEqual([float(line.split()[2]) for line in report[1:]], [round(t, 4) for t in own])
@@ -0,0 +1 @@
+from .test_build_routes import *
@@ -0,0 +1,92 @@
+import unittest
+
+from transform_singer.routing import build_contexts, build_routes
+
+
+class TestBuildRoutes(unittest.TestCase):
+    def test_top_level_only(self):
+        self.assertDictEqual(build_routes({"records": []}), {})
+
+    def test_nested(self):
+        routes = build_routes(
+            {
+                "records": [],
+                "records.transaction.items": [],
+                "records.transaction.coupons": [],
+                "records.customer": [],
+            }
+        )
+        self.assertDictEqual(
+            routes,
+            {
+                "records": ("transaction", "customer"),
+                "records.transaction": ("items", "coupons"),
+            },
+        )
+
+    def test_unmapped_parent(self):
+        routes = build_routes({"facilities.children.grandchildren": []})
+        self.assertDictEqual(
+            routes,
+            {
+                "facilities": ("children",),
+                "facilities.children": ("grandchildren",),
+            },
+        )
+
+
+class TestBuildContexts(unittest.TestCase):
+    def test_no_context(self):
+        contexts = build_contexts(
+            {
+                "records": [{"stream": "r", "properties": {"id": {"type": "record", "key": "@parent.id"}}}],
+                "records.items": [{"stream": "i", "properties": {"id": {"type": "record", "key": "id"}}}],
+            }
+        )
+        self.assertDictEqual(contexts, {})
+
+    def test_keys_in_properties_conditions_and_excludes(self):
+        contexts = build_contexts(
+            {
+                "records.items": [
+                    {
+                        "stream": "items",
+                        "exclude": {"type": "record", "key": "@index"},
+                        "properties": {
+                            "id": {
+                                "type": "if",
+                                "condition": {
+                                    "operator": "eq",
+                                    "left": {"type": "record", "key": "@root.id"},
+                                    "right": {"type": "text", "val": 1},
+                                },
+                                "then": {"type": "record", "key": "@item.name"},
+                            },
+                        },
+                    }
+                ],
+            }
+        )
+        self.assertDictEqual(contexts, {"records.items": {"@index", "@root", "@item"}})
+
+    def test_parent_chain(self):
+        contexts = build_contexts(
+            {
+                "records.transaction.items": [
+                    {
+                        "stream": "items",
+                        "properties": {
+                            "id": {"type": "record", "key": "@parent.@parent.id"},
+                            "position": {"type": "record", "key": "@parent.@index"},
+                        },
+                    }
+                ],
+            }
+        )
+        self.assertDictEqual(
+            contexts,
+            {
+                "records.transaction.items": {"@parent"},
+                "records.transaction": {"@parent", "@index"},
+            },
+        )
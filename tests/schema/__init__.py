@@ -0,0 +1 @@
+from .test_derive_schemas import *
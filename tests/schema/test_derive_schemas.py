@@ -0,0 +1,214 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.processor import Processor
+from transform_singer.schema import derive_schemas
+
+
+SOURCE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "name": {"type": ["null", "string"]},
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"sku": {"type": "string"}, "qty": {"type": "integer"}},
+            },
+        },
+    },
+}
+
+MAPPINGS = {
+    "orders": [
+        {
+            "stream": "order",
+            "properties": {
+                "order_id": {"type": "record", "key": "id"},
+                "label": {"type": "join", "pieces": [{"type": "record", "key": "name"}]},
+                "total": {"type": "sum", "objects": [{"type": "record", "key": "id"}]},
+                "source": {"type": "config", "key": "source"},
+                "meta.name": {"type": "record", "key": "name"},
+                "tags[]": {"type": "text", "val": "new"},
+                "either": {
+                    "type": "coalesce",
+                    "objects": [{"type": "record", "key": "name"}, {"type": "text", "val": "none"}],
+                },
+                "unknown": {"type": "record", "key": "missing"},
+            },
+        }
+    ],
+    "orders.items": [
+        {
+            "stream": "line_item",
+            "properties": {
+                "sku": {"type": "record", "key": "sku"},
+                "order_id": {"type": "record", "key": "@parent.id"},
+                "position": {"type": "record", "key": "@index"},
+            },
+        }
+    ],
+}
+
+
+class TestDeriveSchemas(unittest.TestCase):
+    def test_derive(self):
+        schemas = derive_schemas(MAPPINGS, "orders", SOURCE_SCHEMA, ["id"], {"source": "shop"})
+
+        self.assertEqual(
+            schemas["order"],
+            (
+                {
+                    "type": "object",
+                    "properties": {
+                        "order_id": {"type": ["null", "integer"]},
+                        "label": {"type": ["null", "string"]},
+                        "total": {"type": ["null", "number"]},
+                        "source": {"type": ["null", "string"]},
+                        "meta": {
+                            "type": ["null", "object"],
+                            "properties": {"name": {"type": ["null", "string"]}},
+                        },
+                        "tags": {"type": ["null", "array"], "items": {"type": ["null", "string"]}},
+                        "either": {"type": ["null", "string"]},
+                        "unknown": {},
+                    },
+                },
+                ["order_id"],
+            ),
+        )
+        self.assertEqual(
+            schemas["line_item"],
+            (
+                {
+                    "type": "object",
+                    "properties": {
+                        "sku": {"type": ["null", "string"]},
+                        "order_id": {"type": ["null", "integer"]},
+                        "position": {"type": ["null", "integer"]},
+                    },
+                },
+                [],
+            ),
+        )
+
+    def test_other_streams(self):
+        self.assertEqual(derive_schemas(MAPPINGS, "customers", SOURCE_SCHEMA, [], {}), {})
+
+    def test_entries_for_the_same_target_are_combined(self):
+        mappings = {
+            "orders": [
+                {"stream": "event", "properties": {"id": {"type": "record", "key": "id"}}},
+                {"stream": "event", "properties": {"id": {"type": "record", "key": "name"}}},
+            ],
+            "orders.items": [
+                {"stream": "event", "properties": {"sku": {"type": "record", "key": "sku"}}}
+            ],
+        }
+
+        schema, key_properties = derive_schemas(mappings, "orders", SOURCE_SCHEMA, ["id"], {})["event"]
+
+        self.assertEqual(
+            schema,
+            {
+                "type": "object",
+                "properties": {
+                    "id": {"type": ["null", "integer", "string"]},
+                    "sku": {"type": ["null", "string"]},
+                },
+            },
+        )
+        self.assertEqual(key_properties, [])
+
+    def test_substr_takes_the_type_of_its_object(self):
+        mappings = {
+            "orders": [
+                {
+                    "stream": "order",
+                    "properties": {
+                        "short": {"type": "substr", "object": {"type": "record", "key": "name"}, "length": 2},
+                        "first": {"type": "substr", "object": {"type": "record", "key": "items"}, "length": 1},
+                        "other": {"type": "substr", "object": {"type": "record", "key": "missing"}, "length": 1},
+                    },
+                }
+            ]
+        }
+
+        properties = derive_schemas(mappings, "orders", SOURCE_SCHEMA, [], {})["order"][0]["properties"]
+
+        self.assertEqual(properties["short"], {"type": ["null", "string"]})
+        self.assertEqual(
+            properties["first"],
+            {"type": ["null", "array"], "items": SOURCE_SCHEMA["properties"]["items"]["items"]},
+        )
+        self.assertEqual(properties["other"], {})
+
+
+class TestProcessSchema(unittest.TestCase):
+    @patch("transform_singer.processor.singer.write_schema")
+    @patch("transform_singer.processor.singer.write_record")
+    def test_written_once_before_records(self, write_record, write_schema):
+        manager = MagicMock()
+        manager.attach_mock(write_record, "write_record")
+        manager.attach_mock(write_schema, "write_schema")
+
+        args = MagicMock()
+        args.config = {"mappings": MAPPINGS}
+        processor = Processor(args)
+        schema_message = {
+            "type": "SCHEMA",
+            "stream": "orders",
+            "schema": SOURCE_SCHEMA,
+            "key_properties": ["id"],
+        }
+        record_message = {"type": "RECORD", "stream": "orders", "record": {"id": 1, "name": "A"}}
+
+        with patch("transform_singer.processor.derive_schemas", wraps=derive_schemas) as derive:
+            processor.process(schema_message)
+            processor.process(record_message)
+            processor.process(schema_message)
+            processor.process(record_message)
+
+        derive.assert_called_once()
+        self.assertEqual(write_schema.call_count, 1)
+        self.assertEqual(manager.mock_calls[0][0], "write_schema")
+        self.assertEqual(manager.mock_calls[0][1][0], "order")
+        self.assertEqual(manager.mock_calls[0][1][2], ["order_id"])
+        self.assertEqual(write_record.call_count, 2)
+
+    @patch("transform_singer.processor.singer.write_schema")
+    @patch("transform_singer.processor.singer.write_record")
+    def test_targets_of_several_sources_are_combined(self, write_record, write_schema):
+        args = MagicMock()
+        args.config = {
+            "mappings": {
+                "orders": [{"stream": "event", "properties": {"id": {"type": "record", "key": "id"}}}],
+                "refunds": [{"stream": "event", "properties": {"note": {"type": "record", "key": "name"}}}],
+            }
+        }
+        processor = Processor(args)
+
+        for stream in ("orders", "refunds"):
+            processor.process({"type": "SCHEMA", "stream": stream, "schema": SOURCE_SCHEMA, "key_properties": ["id"]})
+        processor.process({"type": "RECORD", "stream": "refunds", "record": {"id": 1, "name": "A"}})
+
+        write_schema.assert_called_once()
+        self.assertEqual(
+            write_schema.call_args[0][1]["properties"],
+            {"id": {"type": ["null", "integer"]}, "note": {"type": ["null", "string"]}},
+        )
+        self.assertEqual(write_schema.call_args[0][2], [])
+
+    @patch("transform_singer.processor.singer.write_schema")
+    @patch("transform_singer.processor.singer.write_record")
+    def test_write_schemas_off(self, write_record, write_schema):
+        args = MagicMock()
+        args.config = {"mappings": MAPPINGS, "write_schemas": False}
+        processor = Processor(args)
+
+        processor.process({"type": "SCHEMA", "stream": "orders", "schema": SOURCE_SCHEMA, "key_properties": ["id"]})
+        processor.process({"type": "RECORD", "stream": "orders", "record": {"id": 1, "name": "A"}})
+
+        write_schema.assert_not_called()
+        self.assertEqual(write_record.call_count, 1)
@@ -0,0 +1 @@
+from .test_large_records import *
@@ -0,0 +1,151 @@
+import json
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer import streaming
+from transform_singer.processor import Processor
+from transform_singer.streaming import parent_keys, parse_large_record, streamable_levels
+from transform_singer.writer import CollectingWriter
+
+MAPPINGS = {
+    "orders": [
+        {
+            "stream": "order",
+            "properties": {
+                "id": {"type": "record", "key": "id"},
+                "note": {"type": "record", "key": "note"},
+            },
+        }
+    ],
+    "orders.items": [
+        {
+            "stream": "item",
+            "properties": {
+                "order": {"type": "record", "key": "@parent.id"},
+                "position": {"type": "record", "key": "@index"},
+                "sku": {"type": "record", "key": "sku"},
+            },
+        }
+    ],
+    "orders.items.taxes": [
+        {"stream": "tax", "properties": {"rate": {"type": "record", "key": "rate"}}}
+    ],
+    "orders.tags": [{"stream": "tag", "properties": {"tag": {"type": "record", "key": "@item"}}}],
+}
+
+
+def order(items):
+    return {
+        "type": "RECORD",
+        "stream": "orders",
+        "record": {
+            "id": 7,
+            "items": [{"sku": f"sku-{i}", "taxes": [{"rate": i / 100}]} for i in range(items)],
+            "note": "café \u0000",
+            "tags": ["a", 1, None],
+            "empty": [],
+        },
+    }
+
+
+def run(config, lines):
+    args = MagicMock()
+    args.config = config
+    processor = Processor(args)
+    processor.writer = CollectingWriter(processor.codec)
+
+    for line in lines:
+        processor.process_line(line)
+    processor.flush()
+
+    return processor.writer.collect()
+
+
+class TestLargeRecords(unittest.TestCase):
+    def test_same_output_as_loading_the_line(self):
+        lines = [
+            json.dumps(order(50)),
+            json.dumps({"type": "STATE", "value": {"a": 1}}),
+            json.dumps(order(0), indent=2).replace("\n", " "),
+        ]
+
+        expected = run({"mappings": MAPPINGS}, lines)
+        streamed = run({"mappings": MAPPINGS, "large_record_bytes": 10}, lines)
+
+        self.assertEqual(streamed, expected)
+        self.assertEqual(len(streamed), 1 + 50 * 2 + 3 + 1 + 1 + 3)
+
+    def test_items_are_decoded_once(self):
+        lines = [json.dumps(order(50))]
+        expected = run({"mappings": MAPPINGS}, lines)
+        raw_decode = streaming._decoder.raw_decode
+        decoded = []
+
+        def counting(line, idx=0):
+            value, end = raw_decode(line, idx)
+            if isinstance(value, dict) and "sku" in value:
+                decoded.append(value["sku"])
+            return value, end
+
+        with patch.object(streaming._decoder, "raw_decode", counting):
+            streamed = run({"mappings": MAPPINGS, "large_record_bytes": 10}, lines)
+
+        self.assertEqual(streamed, expected)
+        self.assertEqual(len(decoded), 50)
+
+    def test_keys_after_the_list_are_waited_for(self):
+        message = order(5)
+        record = message["record"]
+        # The nested mappings read "id", which now comes after the lists
+        message["record"] = {"items": record["items"], "tags": record["tags"], "id": 7}
+        lines = [json.dumps(message)]
+
+        self.assertEqual(
+            run({"mappings": MAPPINGS, "large_record_bytes": 10}, lines),
+            run({"mappings": MAPPINGS}, lines),
+        )
+
+    def test_parent_keys(self):
+        self.assertEqual(parent_keys(MAPPINGS, "orders"), {"id"})
+        self.assertEqual(parent_keys(MAPPINGS, "items"), set())
+
+        mappings = {"orders.items": [{"stream": "i", "properties": {"o": {"type": "record", "key": "@root"}}}]}
+        self.assertIsNone(parent_keys(mappings, "orders"))
+
+    def test_invalid_lines_fall_back(self):
+        lines = [json.dumps(order(3))[:-1], "not json"]
+
+        self.assertEqual(
+            run({"mappings": MAPPINGS, "large_record_bytes": 1}, lines),
+            run({"mappings": MAPPINGS}, lines),
+        )
+
+    def test_items_are_parsed_one_at_a_time(self):
+        line = json.dumps(order(2000))
+        tracemalloc.start()
+        message, arrays = parse_large_record(line, {"items"})
+        count = 0
+        for item in arrays["items"]:
+            count += 1
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(count, 2000)
+        self.assertEqual(len(arrays["items"]), 2000)
+        self.assertNotIn("items", message["record"])
+        # Far less than the parsed list of items would take
+        self.assertLess(peak, len(line))
+
+    def test_streamable_levels(self):
+        mappings = {
+            "orders": [{"stream": "o", "properties": {"n": {"type": "record", "key": "lines[0].sku"}}}],
+            "orders.lines": [{"stream": "l", "properties": {"id": {"type": "record", "key": "id"}}}],
+            "orders.items": [{"stream": "i", "properties": {"id": {"type": "record", "key": "id"}}}],
+            "orders.tags": [
+                {"stream": "t", "properties": {"n": {"type": "record", "key": "@parent.tags[0]"}}}
+            ],
+        }
+        routes = {"orders": ("lines", "items", "tags")}
+
+        self.assertEqual(streamable_levels(mappings, routes), {"orders": {"items"}})
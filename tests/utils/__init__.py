@@ -1,2 +1,5 @@
 from .test_nested_get import *
 from .test_nested_set import *
+from .test_nested_record import *
+from .test_key_paths import *
+from .test_replace_deep import *
@@ -0,0 +1,33 @@
+import unittest
+
+from transform_singer.utils import parse_path, path_getter, path_setter
+
+
+class TestKeyPaths(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            parse_path("foo.bar[2].baz[]"),
+            (("foo", None), ("bar", 2), ("baz", "")),
+        )
+
+    def test_getter(self):
+        get = path_getter("foo.bar.biz")
+        self.assertTrue(get({"foo": {"bar": {"biz": True}}}))
+        self.assertIsNone(get({"foo": {"bar": {}}}))
+        self.assertIsNone(get({}))
+
+    def test_getter_is_cached(self):
+        self.assertIs(path_getter("foo.bar"), path_getter("foo.bar"))
+
+    def test_setter(self):
+        set_value = path_setter("entity_data.foo[1].fiz")
+        obj = set_value({}, "baz")
+        self.assertDictEqual(obj, {"entity_data": {"foo": [None, {"fiz": "baz"}]}})
+        obj = set_value(obj, "bar")
+        self.assertDictEqual(obj, {"entity_data": {"foo": [None, {"fiz": "bar"}]}})
+
+    def test_setter_append(self):
+        set_value = path_setter("foo[].fiz")
+        obj = set_value({}, "baz")
+        obj = set_value(obj, "bar")
+        self.assertDictEqual(obj, {"foo": [{"fiz": "baz"}, {"fiz": "bar"}]})
@@ -0,0 +1,24 @@
+import unittest
+
+from transform_singer.utils import NestedRecord, nested_get
+
+
+class TestNestedRecord(unittest.TestCase):
+    def test_layers_context(self):
+        parent = {"name": "Jared"}
+        item = {"name": "Mary", "@index": "original"}
+        record = NestedRecord(item, {"@parent": parent, "@index": 0})
+
+        self.assertEqual(record["name"], "Mary")
+        self.assertEqual(record["@index"], 0)
+        self.assertEqual(nested_get(record, "@parent.name"), "Jared")
+        self.assertIsNone(record.get("missing"))
+        self.assertEqual(len(record), 3)
+        self.assertEqual(set(record), {"name", "@index", "@parent"})
+
+    def test_does_not_copy(self):
+        item = {"address": {"city": "Denver"}}
+        record = NestedRecord(item, {})
+
+        self.assertIs(record["address"], item["address"])
+        self.assertNotIn("@parent", item)
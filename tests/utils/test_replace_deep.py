@@ -0,0 +1,25 @@
+import unittest
+
+from transform_singer.utils import replace_deep
+
+
+class TestReplaceDeep(unittest.TestCase):
+    def test_replaces(self):
+        data = {"a": ["x\u0000", {"b": "\u0000y"}], "c": 1}
+        self.assertEqual(
+            replace_deep(data, "\u0000", ""), {"a": ["x", {"b": "y"}], "c": 1}
+        )
+        self.assertEqual(data["a"][0], "x\u0000")
+
+    def test_unchanged_is_not_copied(self):
+        data = {"a": ["x", {"b": "y"}], "c": None}
+        self.assertIs(replace_deep(data, "\u0000", ""), data)
+
+    def test_copies_only_changed_branches(self):
+        clean = {"b": "y"}
+        data = {"a": clean, "c": ["\u0000"]}
+        replaced = replace_deep(data, "\u0000", "")
+
+        self.assertIsNot(replaced, data)
+        self.assertIs(replaced["a"], clean)
+        self.assertEqual(replaced["c"], [""])
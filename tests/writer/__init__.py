@@ -0,0 +1 @@
+from .test_buffered_writer import *
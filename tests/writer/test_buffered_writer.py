@@ -0,0 +1,119 @@
+import io
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from transform_singer.processor import Processor
+from transform_singer.writer import BufferedWriter, ThreadedWriter
+
+
+class TestBufferedWriter(unittest.TestCase):
+    def test_flushes_on_batch_size(self):
+        output = io.StringIO()
+        writer = BufferedWriter(output, batch_size=2, flush_interval=60)
+
+        writer.write_record("users", {"id": 1})
+        self.assertEqual(output.getvalue(), "")
+
+        writer.write_record("users", {"id": 2})
+        lines = output.getvalue().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [
+                {"type": "RECORD", "stream": "users", "record": {"id": 1}},
+                {"type": "RECORD", "stream": "users", "record": {"id": 2}},
+            ],
+        )
+
+    def test_flushes_on_interval(self):
+        output = io.StringIO()
+        writer = BufferedWriter(output, batch_size=100, flush_interval=0)
+
+        writer.write_record("users", {"id": 1})
+        self.assertEqual(len(output.getvalue().splitlines()), 1)
+
+    def test_flushes_with_state(self):
+        output = io.StringIO()
+        writer = BufferedWriter(output, batch_size=100, flush_interval=60)
+
+        writer.write_record("users", {"id": 1})
+        writer.write_state({"bookmark": 1})
+
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([line["type"] for line in lines], ["RECORD", "STATE"])
+
+    def test_compact_output(self):
+        output = io.StringIO()
+        writer = BufferedWriter(output, batch_size=1)
+        writer.write_record("users", {"name": "Zoë", "tags": [1, 2.5, None]})
+
+        self.assertEqual(
+            output.getvalue(),
+            '{"type":"RECORD","stream":"users","record":{"name":"Zoë","tags":[1,2.5,null]}}\n',
+        )
+
+    def test_matches_singer_format(self):
+        # Compact instead of singer-python's spacing, but the same messages
+        record = {"name": "Zoë", "tags": [1, 2.5, None], "big": 2 ** 70}
+        output = io.StringIO()
+        writer = BufferedWriter(output, batch_size=1)
+        writer.write_record("users", record)
+
+        with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            import singer
+            singer.write_record("users", record)
+
+        self.assertEqual(json.loads(output.getvalue()), json.loads(stdout.getvalue()))
+        self.assertEqual(output.getvalue().count("\n"), stdout.getvalue().count("\n"))
+
+    def test_processor_option(self):
+        args = MagicMock()
+        args.config = {
+            "output_batch_size": 10,
+            "mappings": {
+                "facilities": [
+                    {
+                        "stream": "location",
+                        "properties": {"name": {"type": "record", "key": "name"}},
+                    }
+                ],
+            },
+        }
+        processor = Processor(args)
+        processor.writer.output = io.StringIO()
+
+        processor.process({"type": "RECORD", "stream": "facilities", "record": {"name": "Foo"}})
+        self.assertEqual(processor.writer.output.getvalue(), "")
+
+        processor.flush()
+        self.assertEqual(
+            json.loads(processor.writer.output.getvalue()),
+            {"type": "RECORD", "stream": "location", "record": {"name": "Foo"}},
+        )
+
+
+class TestThreadedWriter(unittest.TestCase):
+    def test_writes_in_order_on_close(self):
+        output = io.StringIO()
+        writer = ThreadedWriter(output, batch_size=3, flush_interval=60)
+
+        for i in range(10):
+            writer.write_record("users", {"id": i})
+        writer.write_line("text")
+        writer.write_state({"bookmark": 9})
+        writer.close()
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual([json.loads(line)["record"]["id"] for line in lines[:10]], list(range(10)))
+        self.assertEqual(lines[10], "text")
+        self.assertEqual(json.loads(lines[11]), {"type": "STATE", "value": {"bookmark": 9}})
+
+    def test_output_errors_are_raised(self):
+        output = MagicMock()
+        output.write.side_effect = BrokenPipeError()
+        writer = ThreadedWriter(output, batch_size=1)
+
+        writer.write_record("users", {"id": 1})
+
+        with self.assertRaises(BrokenPipeError):
+            writer.close()
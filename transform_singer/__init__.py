@@ -1,40 +1,170 @@
+import argparse
 import io
-import json
 import sys
 
 import singer
 from transform_singer.processor import Processor
+from transform_singer.writer import BufferedWriter, ThreadedWriter
+
+# The modules behind the command line options (multiprocessing, threads, file handling and
+# profiling) are imported when the options are used, so short runs don't pay for them.
 
 LOGGER = singer.get_logger()
 REQUIRED_CONFIG_KEYS = ['mappings']
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '-c', '--config',
+        help='Config file',
+        required=True)
+
+    # The standard Singer options, accepted and loaded like singer-python does so existing
+    # invocations keep working
+    parser.add_argument(
+        '-s', '--state',
+        help='State file')
+
+    parser.add_argument(
+        '-p', '--properties',
+        help='Property selections: DEPRECATED, Please use --catalog instead')
+
+    parser.add_argument(
+        '--catalog',
+        help='Catalog file')
+
+    parser.add_argument(
+        '-d', '--discover',
+        action='store_true',
+        help='Do schema discovery')
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes used to transform records')
+
+    parser.add_argument(
+        '--pipelined',
+        action='store_true',
+        help='Read input and write output on separate threads')
+
+    parser.add_argument(
+        '--input',
+        help='Read tap output from a file instead of stdin, gzip and zstd files are decompressed')
+
+    parser.add_argument(
+        '--output',
+        help='Write output to a file instead of stdout, compressed when it ends in .gz or .zst')
+
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='transform-singer-profile',
+        help='Time every mapping and write PROFILE.txt and PROFILE.collapsed at exit')
+
+    args = parser.parse_args(argv)
+    setattr(args, 'config_path', args.config)
+    args.config = singer.utils.load_json(args.config)
+
+    if args.state:
+        setattr(args, 'state_path', args.state)
+        args.state = singer.utils.load_json(args.state)
+    else:
+        args.state = {}
+    if args.properties:
+        setattr(args, 'properties_path', args.properties)
+        args.properties = singer.utils.load_json(args.properties)
+    if args.catalog:
+        setattr(args, 'catalog_path', args.catalog)
+        args.catalog = singer.catalog.Catalog.load(args.catalog)
+    singer.utils.check_config(args.config, REQUIRED_CONFIG_KEYS)
+
+    return args
+
+
 @singer.utils.handle_top_exception(LOGGER)
 def main():
     # Parse command line arguments
-    args = singer.utils.parse_args(REQUIRED_CONFIG_KEYS)
+    args = parse_args()
+
+    profiler = None
+    if args.profile:
+        if args.workers > 1:
+            LOGGER.warning('Profiling only runs with a single worker')
+            args.workers = 1
+
+        from transform_singer.profiler import Profiler
+
+        profiler = Profiler()
+
+    processor = Processor(args, profiler=profiler)
+
+    output = None
+    if args.output:
+        from transform_singer.files import open_output
 
-    processor = Processor(args)
+        output = open_output(args.output)
 
-    input_messages = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
-    for message in input_messages:
-        message = message.strip()
+    if args.pipelined:
+        # Serialize and write output on its own thread
+        processor.writer = ThreadedWriter(
+            output=output,
+            batch_size=processor.config.get('output_batch_size') or 1000,
+            flush_interval=processor.config.get('output_flush_interval', 1),
+            codec=processor.codec,
+        )
+    elif output is not None:
+        # Files are written in batches even without output_batch_size
+        processor.writer = BufferedWriter(
+            output=output,
+            batch_size=processor.config.get('output_batch_size') or 1000,
+            flush_interval=processor.config.get('output_flush_interval', 1),
+            codec=processor.codec,
+        )
 
-        if not message:
-            continue
+    if args.workers > 1:
+        # Transform records in a pool of processes
+        from transform_singer.parallel import ParallelRunner
 
+        processor = ParallelRunner(processor, args.workers)
+
+    try:
+        if args.pipelined:
+            from transform_singer.pipeline import run_pipelined
+
+            if args.input:
+                from transform_singer.files import open_input
+
+                with open_input(args.input) as stream:
+                    run_pipelined(processor, stream)
+            else:
+                run_pipelined(processor, sys.stdin.buffer)
+        elif args.input:
+            from transform_singer.files import read_lines
+
+            for message in read_lines(args.input):
+                processor.process_line(message)
+        else:
+            input_messages = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+            for message in input_messages:
+                message = message.strip()
+
+                if not message:
+                    continue
+
+                processor.process_line(message)
+    finally:
         try:
-            message = json.loads(message)
-            processor.process(message)
-        except ValueError:
-            bits = message.split(' ', 1)
-
-            try:
-                # Check if we have a JSON log message
-                message = json.loads(bits[1])
-                processor.process_log(message)
-            except (ValueError, IndexError):
-                print(message, flush=True)
+            processor.close()
+        finally:
+            if output is not None:
+                output.close()
+
+        if profiler is not None:
+            profiler.write(args.profile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+import decimal
+import json
+import math
+import re
+
+from singer import logger
+
+# orjson and simdjson quietly turn integers that don't fit in 64 bits into floats, so lines
+# that might hold one are parsed by the standard library instead.  Numbers in JSON always come
+# after a colon, bracket or comma, which leaves out digits in the middle of strings.
+BIG_INT = re.compile(r"[:\[,]\s*-?[0-9]{20}")
+BIG_INT_BYTES = re.compile(BIG_INT.pattern.encode("utf-8"))
+
+
+class JSONCodec:
+    """
+    A pair of `loads`/`dumps` functions from one of the available JSON libraries.
+
+    `loads` accepts str or bytes.  `dumps` returns a compact UTF-8 string and serializes the same
+    way with every backend, so switching backends doesn't change the output.  NaN and Infinity
+    are written as null (singer-python writes them as the non-standard `NaN` and `Infinity`).
+    The one difference is the exponent notation of very large or very small floats, e.g. `1e+16`
+    vs `1e16`, which parse back to the same value.
+    """
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+
+def get_codec(name=None):
+    """
+    Return the codec for the named backend ("orjson", "ujson", "simdjson" or "json").
+    Without a name the fastest installed backend is used.
+
+    Example:
+
+    codec = get_codec()
+    codec.loads('{"foo": "bar"}')  # returns {"foo": "bar"}
+    codec.dumps({"foo": "bar"})  # returns '{"foo":"bar"}'
+    """
+    requested = name and name != "auto"
+    names = [name] if requested else ["orjson", "ujson", "simdjson"]
+
+    for backend in names:
+        try:
+            codec = BACKENDS[backend]()
+        except (KeyError, ImportError):
+            if requested:
+                logger.log_warning(f"JSON backend {name} is not available, falling back")
+            continue
+
+        return codec
+
+    return _json()
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), default=_default, allow_nan=False
+)
+
+
+def _json_dumps(obj):
+    try:
+        return _encoder.encode(obj)
+    except ValueError:
+        # NaN or Infinity, written as null like orjson does
+        return _encoder.encode(_finite(obj))
+
+
+def _finite(obj):
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+
+    return obj
+
+
+def _fallback_loads(fast_loads):
+    def loads(data):
+        if (BIG_INT if isinstance(data, str) else BIG_INT_BYTES).search(data):
+            return json.loads(data)
+
+        try:
+            return fast_loads(data)
+        except (ValueError, OverflowError):
+            # Let the standard library decide, it also accepts NaN and Infinity
+            return json.loads(data)
+
+    return loads
+
+
+def _fallback_dumps(fast_dumps):
+    def dumps(obj):
+        try:
+            return fast_dumps(obj)
+        except (TypeError, ValueError, OverflowError):
+            # Integers over 64 bits, or NaN and Infinity
+            return _json_dumps(obj)
+
+    return dumps
+
+
+def _json():
+    return JSONCodec("json", json.loads, _json_dumps)
+
+
+def _orjson():
+    import orjson
+
+    return JSONCodec(
+        "orjson",
+        _fallback_loads(orjson.loads),
+        _fallback_dumps(lambda obj: orjson.dumps(obj, default=_default).decode("utf-8")),
+    )
+
+
+def _ujson():
+    import ujson
+
+    options = {"ensure_ascii": False, "escape_forward_slashes": False, "default": _default}
+    try:
+        # Raise on NaN and Infinity instead of writing them out, older versions always raise
+        ujson.dumps(float("nan"), allow_nan=False)
+    except TypeError:
+        pass
+    except (ValueError, OverflowError):
+        options["allow_nan"] = False
+
+    return JSONCodec(
+        "ujson",
+        _fallback_loads(ujson.loads),
+        _fallback_dumps(lambda obj: ujson.dumps(obj, **options)),
+    )
+
+
+def _simdjson():
+    import simdjson
+
+    # simdjson only parses, so output goes through the standard library
+    return JSONCodec("simdjson", _fallback_loads(simdjson.loads), _json_dumps)
+
+
+BACKENDS = {
+    "json": _json,
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "simdjson": _simdjson,
+}
@@ -0,0 +1,406 @@
+import copy
+import operator
+
+import numpy
+from transform_singer.utils import nested_get, path_getter
+
+# Mapping types the batch engine knows how to run, everything else runs record by record
+SUPPORTED_TYPES = (
+    "record",
+    "text",
+    "config",
+    "float",
+    "tofloat",
+    "sum",
+    "multiply",
+    "divide",
+    "difference",
+    "if",
+)
+COMPARISONS = {
+    "lt": (numpy.less, operator.lt),
+    "lte": (numpy.less_equal, operator.le),
+    "gt": (numpy.greater, operator.gt),
+    "gte": (numpy.greater_equal, operator.ge),
+}
+
+
+class Unsupported(Exception):
+    pass
+
+
+class NumberColumn:
+    """
+    A column of numbers.  `none` marks the rows that are None and `ints` marks the rows that
+    never got a float, e.g. a `sum` of nothing is the int 0 and not 0.0.
+    """
+
+    __slots__ = ("values", "none", "ints")
+
+    def __init__(self, values, none, ints):
+        self.values = values
+        self.none = none
+        self.ints = ints
+
+    def tolist(self):
+        values = self.values.tolist()
+
+        if self.none.any() or self.ints.any():
+            for i in numpy.flatnonzero(self.none | self.ints).tolist():
+                values[i] = None if self.none[i] else int(values[i])
+
+        return values
+
+
+class BatchCompiler:
+    """
+    Compiles the mapping entries of a stream into a function that maps a whole batch of
+    records at once.  Values are pulled out of the records into columns and the arithmetic and
+    conditions run as NumPy operations on those columns.  The results are the same as the row
+    engine, down to None, `or 0` and int vs float results.
+
+    Only `record`, `text`, `config`, `float`, `tofloat`, `sum`, `multiply`, `divide`,
+    `difference` and `if` mappings are supported; `compile_stream` raises `Unsupported` for
+    anything else.
+
+    With `metrics` every mapping counts an evaluation for each row it ran for, leaving out the
+    rows an `exclude` skipped.  Unlike the row engine both branches of an `if` run (and count)
+    for every row.
+
+    Example:
+
+    map_batch = BatchCompiler(meta, failures).compile_stream(entries)
+    for excluded, columns in map_batch(records):
+        ...
+    """
+
+    def __init__(self, meta, failures, metrics=None):
+        self.meta = meta
+        # The processor's `FailureLog` and `Metrics`
+        self.failures = failures
+        self.metrics = metrics
+        # Rows the mappings being run count as evaluated, see `map_batch`
+        self.rows = 0
+
+    def compile_stream(self, entries):
+        compiled = []
+
+        for entry in entries:
+            exclude = self.compile(entry["exclude"]) if "exclude" in entry else None
+            properties = []
+
+            for target, conf in entry["properties"].items():
+                # Other targets are set inside of this value, so it can't be shared with the record
+                copied = any(
+                    other.startswith(target + ".") or other.startswith(target + "[")
+                    for other in entry["properties"]
+                )
+                properties.append((self.compile(conf), copied))
+
+            compiled.append((exclude, properties))
+
+        compiler = self
+
+        def map_batch(records):
+            # Returns the excluded rows and the property columns of every entry
+            results = []
+
+            for exclude, properties in compiled:
+                excluded = None
+                compiler.rows = len(records)
+                if exclude is not None:
+                    excluded = [bool(value) for value in _values(exclude(records))]
+                    compiler.rows -= sum(excluded)
+
+                columns = []
+                for column, copied in properties:
+                    values = _values(column(records))
+                    columns.append([copy.deepcopy(value) for value in values] if copied else values)
+
+                results.append((excluded, columns))
+
+            return results
+
+        return map_batch
+
+    def compile(self, mapping):
+        if not mapping:
+            return lambda records: [None] * len(records)
+
+        mapping_type = mapping["type"]
+        if mapping_type not in SUPPORTED_TYPES:
+            raise Unsupported(mapping_type)
+
+        column = getattr(self, f"_compile_{mapping_type}")(mapping)
+
+        if self.metrics is not None:
+            column = self.metrics.timed_batch(mapping_type, column, lambda: self.rows)
+
+        return column
+
+    def compile_condition(self, obj):
+        """
+        Compile a condition into a function that returns a boolean array of the rows that passed
+        and a boolean array of the rows where the condition raised.
+        """
+        name = obj["operator"]
+
+        if name in ("and", "or"):
+            conditions = [self.compile_condition(condition) for condition in obj["conditions"]]
+            return _combine(conditions, name == "and")
+
+        left = self.compile(obj.get("left"))
+        right = self.compile(obj.get("right"))
+
+        if name == "eq":
+            return lambda records: _equal(left(records), right(records))
+
+        compare = COMPARISONS.get(name)
+
+        def condition(records):
+            left_column = left(records)
+            right_column = right(records)
+
+            if compare is None:
+                n = len(records)
+                return numpy.zeros(n, dtype=bool), numpy.zeros(n, dtype=bool)
+
+            return _compare(*compare, left_column, right_column)
+
+        return condition
+
+    def _compile_record(self, mapping):
+        get = path_getter(mapping["key"])
+        failures = self.failures
+
+        def column(records):
+            try:
+                return [get(record) for record in records]
+            except Exception:
+                pass
+
+            values = []
+            for record in records:
+                try:
+                    values.append(get(record))
+                except Exception as e:
+                    failures.report(mapping, record, type(e))
+                    values.append(None)
+
+            return values
+
+        return column
+
+    def _compile_config(self, mapping):
+        value = nested_get(self.meta, mapping["key"])
+        return lambda records: [value] * len(records)
+
+    def _compile_text(self, mapping):
+        value = mapping["val"]
+        return lambda records: [value] * len(records)
+
+    def _compile_float(self, mapping):
+        value = mapping["val"]
+
+        try:
+            value = float(value or 0)
+        except Exception:
+            return lambda records: [None] * len(records)
+
+        def column(records):
+            n = len(records)
+            return NumberColumn(
+                numpy.full(n, value), numpy.zeros(n, dtype=bool), numpy.zeros(n, dtype=bool)
+            )
+
+        return column
+
+    def _compile_tofloat(self, mapping):
+        obj = self.compile(mapping["object"])
+
+        def column(records):
+            values, skip, error = _to_numbers(obj(records))
+            # tofloat gives None for anything that can't be made a float
+            none = skip | error
+            return NumberColumn(values, none, numpy.zeros(len(values), dtype=bool))
+
+        return column
+
+    def _compile_sum(self, mapping):
+        return self._compile_arithmetic(mapping, 0, lambda total, value: total + value, False)
+
+    def _compile_multiply(self, mapping):
+        return self._compile_arithmetic(mapping, 1, lambda total, value: total * value, False)
+
+    def _compile_divide(self, mapping):
+        # NOTE: like the row engine this multiplies the other "objects"
+        return self._compile_arithmetic(mapping, 0, lambda total, value: total * value, True)
+
+    def _compile_difference(self, mapping):
+        return self._compile_arithmetic(mapping, 0, lambda total, value: total - value, True)
+
+    def _compile_arithmetic(self, mapping, start, operation, first_replaces):
+        objects = [self.compile(obj) for obj in mapping["objects"]]
+
+        def column(records):
+            n = len(records)
+            total = numpy.full(n, float(start))
+            ints = numpy.ones(n, dtype=bool)
+            errors = numpy.zeros(n, dtype=bool)
+
+            for position, obj in enumerate(objects):
+                values, skip, error = _to_numbers(obj(records))
+                errors |= error
+                use = ~skip & ~error
+
+                if first_replaces and position == 0:
+                    total = numpy.where(use, values, total)
+                else:
+                    total = numpy.where(use, operation(total, values), total)
+
+                ints &= ~use
+
+            _log_failures(self.failures, mapping, records, errors)
+            return NumberColumn(total, errors, ints & ~errors)
+
+        return column
+
+    def _compile_if(self, mapping):
+        condition = self.compile_condition(mapping["condition"])
+        then = self.compile(mapping.get("then"))
+        otherwise = self.compile(mapping.get("else"))
+
+        def column(records):
+            passed, errors = condition(records)
+            then_column = then(records)
+            else_column = otherwise(records)
+            _log_failures(self.failures, mapping, records, errors)
+
+            if isinstance(then_column, NumberColumn) and isinstance(else_column, NumberColumn):
+                return NumberColumn(
+                    numpy.where(passed, then_column.values, else_column.values),
+                    numpy.where(passed, then_column.none, else_column.none) | errors,
+                    numpy.where(passed, then_column.ints, else_column.ints) & ~errors,
+                )
+
+            return [
+                None if error else (then_value if passes else else_value)
+                for passes, error, then_value, else_value in zip(
+                    passed.tolist(), errors.tolist(), _values(then_column), _values(else_column)
+                )
+            ]
+
+        return column
+
+
+def _values(column):
+    if isinstance(column, NumberColumn):
+        return column.tolist()
+
+    return column
+
+
+def _to_numbers(column):
+    """
+    Run `float(value or 0)` over a column.  Returns the values, the rows that raised a
+    ValueError (which arithmetic skips) and the rows that raised anything else.
+    """
+    n = len(column) if not isinstance(column, NumberColumn) else len(column.values)
+
+    if isinstance(column, NumberColumn):
+        return (
+            numpy.where(column.none, 0.0, column.values),
+            numpy.zeros(n, dtype=bool),
+            numpy.zeros(n, dtype=bool),
+        )
+
+    try:
+        return (
+            numpy.array([float(value or 0) for value in column], dtype=float),
+            numpy.zeros(n, dtype=bool),
+            numpy.zeros(n, dtype=bool),
+        )
+    except Exception:
+        pass
+
+    values = numpy.zeros(n)
+    skip = numpy.zeros(n, dtype=bool)
+    error = numpy.zeros(n, dtype=bool)
+
+    for i, value in enumerate(column):
+        try:
+            values[i] = float(value or 0)
+        except ValueError:
+            skip[i] = True
+        except Exception:
+            error[i] = True
+
+    return values, skip, error
+
+
+def _equal(left, right):
+    if isinstance(left, NumberColumn) and isinstance(right, NumberColumn):
+        passed = (left.none & right.none) | (
+            ~left.none & ~right.none & (left.values == right.values)
+        )
+        return passed, numpy.zeros(len(passed), dtype=bool)
+
+    passed = []
+    errors = []
+    for left_value, right_value in zip(_values(left), _values(right)):
+        try:
+            passed.append(bool(left_value == right_value))
+            errors.append(False)
+        except Exception:
+            passed.append(False)
+            errors.append(True)
+
+    return numpy.array(passed, dtype=bool), numpy.array(errors, dtype=bool)
+
+
+def _compare(compare_columns, compare, left, right):
+    if isinstance(left, NumberColumn) and isinstance(right, NumberColumn):
+        passed = ~left.none & ~right.none & compare_columns(left.values, right.values)
+        return passed, numpy.zeros(len(passed), dtype=bool)
+
+    passed = []
+    errors = []
+    for left_value, right_value in zip(_values(left), _values(right)):
+        if left_value is None or right_value is None:
+            passed.append(False)
+            errors.append(False)
+            continue
+
+        try:
+            passed.append(bool(compare(left_value, right_value)))
+            errors.append(False)
+        except Exception:
+            passed.append(False)
+            errors.append(True)
+
+    return numpy.array(passed, dtype=bool), numpy.array(errors, dtype=bool)
+
+
+def _combine(conditions, is_and):
+    # `all()`/`any()` over the conditions, including where they stop evaluating
+    def condition(records):
+        n = len(records)
+        passed = numpy.full(n, is_and)
+        errors = numpy.zeros(n, dtype=bool)
+
+        for sub_condition in conditions:
+            sub_passed, sub_errors = sub_condition(records)
+            evaluated = ~errors & (passed if is_and else ~passed)
+            errors = errors | (evaluated & sub_errors)
+            passed = numpy.where(evaluated, sub_passed, passed)
+
+        return passed & ~errors, errors
+
+    return condition
+
+
+def _log_failures(failures, mapping, records, errors):
+    # The exceptions aren't kept for whole columns, these are almost always a TypeError
+    if errors.any():
+        for i in numpy.flatnonzero(errors).tolist():
+            failures.report(mapping, records[i], "TypeError")
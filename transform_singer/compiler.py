@@ -0,0 +1,467 @@
+import copy
+import json
+from transform_singer.lookup import lookup_key, lookup_objects
+from transform_singer.utils import nested_set, path_getter, path_setter
+
+
+class MappingCompiler:
+    """
+    Turns mapping configs into plain Python callables once, so records don't have to
+    re-walk the mapping dicts and the `type` dispatch for every property.
+
+    Every compiled mapping is a function that takes a record and returns the same value
+    `Processor.process_mapping` would return for it.
+
+    Example:
+
+    compiler = MappingCompiler(processor)
+    fn = compiler.compile({"type": "record", "key": "foo"})
+    fn({"foo": "bar"})  # returns "bar"
+    """
+
+    def __init__(self, processor, interpret=False):
+        self.processor = processor
+        # When interpreting we hand every mapping back to `Processor.process_mapping`.
+        self.interpret = interpret
+        # Structure keys of the mappings that show up more than once in the stream being compiled
+        self.shared = set()
+        # Values of shared mappings for the record being processed, see `Processor.process_record`
+        self.memo = None
+        # Number of compiled mappings that depend on the record, used to spot constant mappings
+        self.dynamic = 0
+        # Set while a constant mapping is tried out, so failures inside it are raised, not logged
+        self.folding = False
+
+    def compile_streams(self, mappings, plan=None):
+        """
+        Compile all of the `config["mappings"]` entries.  Returns a dictionary of source stream
+        to the list of compiled entries.  Streams that can't be compiled are left out and will be
+        compiled (and fail) when a record for them shows up, just like they always have.
+
+        With a plan (see `build_plan`) its shared sub-expressions are used instead of finding
+        them again, and streams it found malformed aren't tried.
+        """
+        streams = {}
+
+        for stream, entries in mappings.items():
+            if plan is not None and stream in plan["invalid"]:
+                continue
+
+            try:
+                shared = plan["shared"].get(stream) if plan is not None else None
+                streams[stream] = self.compile_stream(entries, shared)
+            except Exception:
+                pass
+
+        return streams
+
+    def compile_stream(self, entries, shared=None):
+        """
+        Compile the entries of one source stream into tuples of
+        (target stream, exclude function or None, [(target property setter, function)], scrub_nul)
+        """
+        compiled = []
+
+        # Find the sub-expressions that are repeated within this stream so each of them is only
+        # evaluated once per record.
+        self.shared = shared_structures(entries) if shared is None else shared
+
+        for entry in entries:
+            exclude = self.compile(entry["exclude"]) if "exclude" in entry else None
+            properties = []
+
+            for target, conf in entry["properties"].items():
+                process = self.compile(conf)
+
+                if any(
+                    other.startswith(target + ".") or other.startswith(target + "[")
+                    for other in entry["properties"]
+                ):
+                    # Other targets are set inside of this value, so it can't be shared with the record
+                    process = _copied(process)
+
+                properties.append((_setter(target), process))
+
+            # Unicode null characters are scrubbed unless the entry turns it off with "scrub_nul": false
+            scrub_nul = entry.get("scrub_nul", True) is not False
+            compiled.append((entry["stream"], exclude, properties, scrub_nul))
+
+        self.shared = set()
+        return compiled
+
+    def compile(self, mapping):
+        """
+        Compile a single mapping into a function of the record.
+        """
+        if self.interpret:
+            return self._interpreted(mapping)
+
+        if not mapping:
+            return _none
+
+        try:
+            builder = getattr(self, f"_compile_{mapping['type']}", None)
+            dynamic = self.dynamic
+            # Unknown mapping types have always returned None
+            fn = builder(mapping) if builder is not None else _none
+        except Exception:
+            # The mapping is malformed.  Let the interpreter fail on it at runtime so
+            # we behave exactly like we always have.
+            return self._interpreted(mapping)
+
+        # Evaluations are counted the same as when the mapping is interpreted, constant or not
+        metrics = getattr(self.processor, "metrics", None)
+
+        if self.dynamic == dynamic:
+            # Nothing in this mapping reads the record, so work the value out once.
+            # Mappings that fail, or have a part that fails, are left to fail (and log) for
+            # every record like before.
+            self.folding = True
+            try:
+                value = fn(None)
+            except Exception:
+                pass
+            else:
+                fn = lambda record: value
+                return metrics.timed(mapping["type"], fn) if metrics is not None else fn
+            finally:
+                self.folding = False
+
+        fn = self._profiled(mapping, fn)
+
+        failures = self.processor.failures
+        compiler = self
+
+        def guarded(record):
+            try:
+                return fn(record)
+            except:
+                if compiler.folding:
+                    raise
+                failures.report(mapping, record)
+
+        compiled = guarded
+
+        if self.shared and mapping["type"] not in CONSTANT_TYPES:
+            key = _structure_key(mapping)
+            if key in self.shared:
+                compiled = self._memoized(key, guarded)
+
+        if metrics is not None:
+            # Outside of the memo, so shared mappings count every time they're used
+            compiled = metrics.timed(mapping["type"], compiled)
+
+        return compiled
+
+    def _memoized(self, key, fn):
+        compiler = self
+
+        def memoized(record):
+            memo = compiler.memo
+            if memo is None:
+                return fn(record)
+
+            value = memo.get(key, _MISSING)
+            if value is _MISSING:
+                value = memo[key] = fn(record)
+
+            return value
+
+        return memoized
+
+    def compile_condition(self, obj):
+        """
+        Compile a condition into a function of the record that returns a boolean.  Like
+        `Processor._process_condition` errors are raised up to the mapping that owns the condition.
+        """
+        try:
+            return self._profiled(obj, self._build_condition(obj))
+        except Exception:
+            self.dynamic += 1
+            processor = self.processor
+            return lambda record: processor._process_condition(obj, record)
+
+    def _profiled(self, obj, fn):
+        profiler = getattr(self.processor, "profiler", None)
+        path = profiler.path(obj) if profiler is not None else None
+
+        if path is None:
+            return fn
+
+        return profiler.wrap(path, fn)
+
+    def _interpreted(self, mapping):
+        self.dynamic += 1
+        processor = self.processor
+        return lambda record: processor.process_mapping(mapping, record)
+
+    def _build_condition(self, obj):
+        operator = obj["operator"]
+
+        if operator == "and":
+            conditions = [self.compile_condition(condition) for condition in obj["conditions"]]
+            return lambda record: all(condition(record) for condition in conditions)
+
+        if operator == "or":
+            conditions = [self.compile_condition(condition) for condition in obj["conditions"]]
+            return lambda record: any(condition(record) for condition in conditions)
+
+        left = self.compile(obj.get("left"))
+        right = self.compile(obj.get("right"))
+
+        if operator == "eq":
+            return lambda record: left(record) == right(record)
+
+        compare = _COMPARISONS.get(operator)
+
+        def condition(record):
+            left_value = left(record)
+            right_value = right(record)
+
+            if left_value is None or right_value is None or compare is None:
+                return False
+
+            return compare(left_value, right_value)
+
+        return condition
+
+    def _compile_record(self, mapping):
+        # Grab a potentially nested value from the record object
+        self.dynamic += 1
+        return path_getter(mapping["key"])
+
+    def _compile_config(self, mapping):
+        # Grab a potentially nested value from the config meta object
+        get = path_getter(mapping["key"])
+        meta = self.processor.config["meta"]
+        return lambda record: get(meta)
+
+    def _compile_text(self, mapping):
+        val = mapping["val"]
+        return lambda record: val
+
+    def _compile_float(self, mapping):
+        val = mapping["val"]
+
+        def fn(record):
+            try:
+                return float(val or 0)
+            except:
+                return None
+
+        return fn
+
+    def _compile_join(self, mapping):
+        pieces = [self.compile(piece) for piece in mapping["pieces"]]
+        return lambda record: "".join([str(piece(record)) for piece in pieces])
+
+    def _compile_coalesce(self, mapping):
+        objects = [self.compile(obj) for obj in mapping["objects"]]
+
+        def fn(record):
+            # Find the first processed value this exists and use that.
+            for obj in objects:
+                value = obj(record)
+                if value or value == 0:
+                    return value
+
+        return fn
+
+    def _compile_substr(self, mapping):
+        obj = self.compile(mapping["object"])
+        start = mapping.get("start", 0)
+        length = mapping["length"]
+        return lambda record: obj(record)[start:length]
+
+    def _compile_hash(self, mapping):
+        obj = self.compile(mapping["object"])
+        digest = self.processor.hasher.function(mapping.get("algorithm"))
+        return lambda record: digest(obj(record))
+
+    def _compile_lookup(self, mapping):
+        table = self.processor.lookups.table(mapping)
+        objects = [self.compile(obj) for obj in lookup_objects(mapping)]
+        default = self.compile(mapping.get("default"))
+
+        if len(objects) == 1:
+            obj = objects[0]
+            key_of = lambda record: lookup_key([obj(record)])
+        else:
+            key_of = lambda record: lookup_key([obj(record) for obj in objects])
+
+        def fn(record):
+            value = table.get(key_of(record), _MISSING)
+            if value is _MISSING:
+                return default(record)
+
+            return value
+
+        return fn
+
+    def _compile_tofloat(self, mapping):
+        obj = self.compile(mapping["object"])
+
+        def fn(record):
+            try:
+                return float(obj(record) or 0)
+            except:
+                return None
+
+        return fn
+
+    def _compile_sum(self, mapping):
+        objects = [self.compile(obj) for obj in mapping["objects"]]
+
+        def fn(record):
+            sum = 0
+
+            for obj in objects:
+                try:
+                    sum += float(obj(record) or 0)
+                except ValueError:
+                    pass
+
+            return sum
+
+        return fn
+
+    def _compile_multiply(self, mapping):
+        objects = [self.compile(obj) for obj in mapping["objects"]]
+
+        def fn(record):
+            product = 1
+
+            for obj in objects:
+                try:
+                    product *= float(obj(record) or 0)
+                except ValueError:
+                    pass
+
+            return product
+
+        return fn
+
+    def _compile_divide(self, mapping):
+        objects = [self.compile(obj) for obj in mapping["objects"]]
+
+        def fn(record):
+            # NOTE: this mirrors `Processor.process_mapping`, which multiplies the other "objects".
+            is_first = True
+            quotient = 0
+
+            for obj in objects:
+                try:
+                    if is_first:
+                        quotient = float(obj(record) or 0)
+                    else:
+                        quotient *= float(obj(record) or 0)
+                except ValueError:
+                    pass
+
+                is_first = False
+
+            return quotient
+
+        return fn
+
+    def _compile_difference(self, mapping):
+        objects = [self.compile(obj) for obj in mapping["objects"]]
+
+        def fn(record):
+            is_first = True
+            diff = 0
+
+            for obj in objects:
+                try:
+                    if is_first:
+                        diff = float(obj(record) or 0)
+                    else:
+                        diff -= float(obj(record) or 0)
+                except ValueError:
+                    pass
+
+                is_first = False
+
+            return diff
+
+        return fn
+
+    def _compile_if(self, mapping):
+        condition = self.compile_condition(mapping.get("condition"))
+        then = self.compile(mapping.get("then"))
+        otherwise = self.compile(mapping.get("else"))
+
+        def fn(record):
+            if condition(record):
+                return then(record)
+
+            return otherwise(record)
+
+        return fn
+
+
+def _none(record):
+    return None
+
+
+def _copied(fn):
+    def copied(record):
+        return copy.deepcopy(fn(record))
+
+    return copied
+
+
+def _setter(target):
+    try:
+        return path_setter(target)
+    except Exception:
+        # Let `nested_set` raise for bad targets when a value is actually set
+        return lambda record, value: nested_set(record, target, value)
+
+
+def shared_structures(entries):
+    """
+    Return the structure keys of the mappings that show up more than once in a stream's entries.
+    """
+    counts = {}
+    for entry in entries:
+        _count_structures(entry, counts)
+
+    return {key for key, count in counts.items() if count > 1}
+
+
+def _structure_key(mapping):
+    # Structurally identical mappings get the same key
+    try:
+        return json.dumps(mapping, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+
+def _count_structures(obj, counts):
+    # Count how often each mapping shows up anywhere in `obj`
+    if isinstance(obj, dict):
+        if "type" in obj:
+            key = _structure_key(obj)
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+
+        for value in obj.values():
+            _count_structures(value, counts)
+    elif isinstance(obj, list):
+        for value in obj:
+            _count_structures(value, counts)
+
+
+_MISSING = object()
+
+# Mappings that are cheaper to evaluate than to look up in the memo
+CONSTANT_TYPES = ("text", "float", "config")
+
+
+_COMPARISONS = {
+    "lt": lambda left, right: left < right,
+    "lte": lambda left, right: left <= right,
+    "gt": lambda left, right: left > right,
+    "gte": lambda left, right: left >= right,
+}
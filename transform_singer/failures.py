@@ -0,0 +1,169 @@
+import json
+import reprlib
+import sys
+import time
+from collections.abc import Mapping
+
+from singer import logger
+
+from transform_singer.utils import NestedRecord, mapping_paths
+
+# Longest record excerpt logged in debug mode
+EXCERPT_LENGTH = 500
+
+_excerpt = reprlib.Repr()
+_excerpt.maxlevel = 3
+_excerpt.maxdict = 10
+_excerpt.maxlist = 10
+_excerpt.maxstring = 80
+_excerpt.maxother = 80
+
+
+class FailureLog:
+    """
+    Logs mappings that fail without writing out the whole record (and the records it is
+    nested in).  The first failure of each mapping path and exception type is logged with the
+    stream and the key fields of the record, later ones are counted and logged as a summary at
+    most once every `interval` seconds.  Record excerpts are only added in `debug` mode.
+
+    Key fields are the key properties from the stream's SCHEMA message, or `key_fields` when
+    there isn't one.  Nested records also get the key fields of their root record, which is set
+    as `root` (None for top-level records) with its stream as `root_stream`.
+
+    Example:
+
+    failures = FailureLog(config["mappings"])
+    failures.stream = "users.addresses"
+    failures.root_stream = "users"
+    failures.root = user
+    try:
+        ...
+    except Exception:
+        failures.report(mapping, record)
+    """
+
+    def __init__(self, mappings, interval=60, debug=False, key_fields=("id",)):
+        self.paths = mapping_paths(mappings)
+        self.interval = float(interval)
+        self.debug = debug
+        self.key_fields = list(key_fields)
+        # Key properties of the source streams, from their SCHEMA messages
+        self.key_properties = {}
+        # Stream of the record being mapped, and the top-level record it's nested in
+        self.stream = None
+        self.root = None
+        self.root_stream = None
+        # [total, not logged yet] by (path, exception type)
+        self.counts = {}
+        self.last_summary = time.monotonic()
+        # Hand failures over with `take` instead of logging them, for worker processes
+        self.deferred = False
+        self.details = {}
+
+    def report(self, mapping, record, error=None):
+        """
+        Report a failed mapping.  Called from an `except` block the exception type is taken from
+        the exception being handled.
+        """
+        error = error or sys.exc_info()[0]
+        error = error.__name__ if isinstance(error, type) else error
+        path = self.paths.get(id(mapping)) or _describe(mapping)
+
+        count = self.counts.get((path, error))
+        if count is None:
+            self.counts[(path, error)] = [1, 0]
+            self._log_failure(path, error, record)
+        else:
+            count[0] += 1
+            count[1] += 1
+
+        if not self.deferred and time.monotonic() - self.last_summary >= self.interval:
+            self.summarize()
+
+    def take(self):
+        """
+        Return the failures reported since the last call as (path, exception type, count,
+        details of the first one) and forget them.  See `merge`.
+        """
+        failures = [
+            (path, error, count[0], self.details.get((path, error)))
+            for (path, error), count in self.counts.items()
+        ]
+        self.counts = {}
+        self.details = {}
+        return failures
+
+    def merge(self, failures):
+        # Add failures taken from another process' log, logging the ones that are new here
+        for path, error, total, details in failures:
+            count = self.counts.get((path, error))
+            if count is None:
+                self.counts[(path, error)] = [total, total - 1]
+                logger.log_warning(f"Unable to run mapping: {json.dumps(details, default=str)}")
+            else:
+                count[0] += total
+                count[1] += total
+
+        if time.monotonic() - self.last_summary >= self.interval:
+            self.summarize()
+
+    def summarize(self):
+        # Log the failures that were only counted since the last summary
+        self.last_summary = time.monotonic()
+
+        for (path, error), count in self.counts.items():
+            if count[1]:
+                details = {"path": path, "error": error, "count": count[1], "total": count[0]}
+                logger.log_warning(f"Mapping failures: {json.dumps(details)}")
+                count[1] = 0
+
+    def _log_failure(self, path, error, record):
+        details = {"path": path, "error": error, "stream": self.stream}
+        details["keys"] = self._keys(record)
+
+        if self.debug:
+            item = record.item if isinstance(record, NestedRecord) else record
+            details["record"] = _excerpt.repr(item)[:EXCERPT_LENGTH]
+
+        if self.deferred:
+            self.details[(path, error)] = details
+            return
+
+        logger.log_warning(f"Unable to run mapping: {json.dumps(details, default=str)}")
+
+    def _keys(self, record):
+        if not isinstance(record, Mapping):
+            return {}
+
+        stream = self.stream or ""
+        keys = _key_values(record, self.key_properties.get(stream) or self.key_fields)
+
+        if isinstance(self.root, Mapping):
+            root_fields = self.key_properties.get(self.root_stream) or self.key_fields
+            for field, value in _key_values(self.root, root_fields).items():
+                keys[f"@root.{field}"] = value
+
+        return keys
+
+
+def _key_values(record, fields):
+    keys = {}
+
+    for field in fields:
+        value = record.get(field)
+        if isinstance(value, str):
+            keys[field] = value[:80]
+        elif isinstance(value, (int, float, bool)):
+            keys[field] = value
+        elif value is not None:
+            keys[field] = type(value).__name__
+
+    return keys
+
+
+def _describe(mapping):
+    # Mappings that aren't in the config, e.g. in tests
+    if isinstance(mapping, Mapping):
+        return f"<{mapping.get('type') or mapping.get('operator')}>"
+
+    return f"<{type(mapping).__name__}>"
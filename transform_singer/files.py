@@ -0,0 +1,115 @@
+import gzip
+import io
+import mmap
+import os
+import stat
+
+from transform_singer.pipeline import read_batches
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Bytes read from compressed input at a time
+READ_SIZE = 1 << 20
+# Size of the output file buffer
+WRITE_BUFFER = 1 << 20
+
+
+def open_input(path):
+    """
+    Open a file of tap output as a binary stream, decompressing gzip and zstd files (detected
+    by their magic number, not their name).  zstd needs the zstandard package.  Pipes and
+    other files that can't seek work too.
+    """
+    f = open(path, "rb")
+
+    try:
+        # Peek instead of reading and seeking back, pipes can't seek
+        magic = f.peek(4)[:4]
+
+        if magic.startswith(GZIP_MAGIC):
+            return gzip.GzipFile(fileobj=f, mode="rb")
+        if magic.startswith(ZSTD_MAGIC):
+            return _zstandard().ZstdDecompressor().stream_reader(f, closefd=True)
+    except BaseException:
+        f.close()
+        raise
+
+    return f
+
+
+def read_lines(path):
+    """
+    Yield the non-blank lines of a file of tap output as stripped UTF-8 bytes, ready for
+    `Processor.process_line`.  Uncompressed regular files are memory-mapped and split in place
+    instead of being read and decoded into strings, anything else is read a chunk at a time.
+
+    Example:
+
+    for line in read_lines("tap-output.jsonl.gz"):
+        processor.process_line(line)
+    """
+    with open_input(path) as f:
+        if isinstance(f, io.BufferedReader) and stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+            yield from _mapped_lines(f)
+        else:
+            yield from _stream_lines(f)
+
+
+def open_output(path):
+    """
+    Open a file for the transformed output as text with a large buffer.  Names ending in .gz
+    or .zst are compressed.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", newline="\n")
+
+    if path.endswith(".zst"):
+        compressor = _zstandard().ZstdCompressor()
+        raw = compressor.stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(
+            io.BufferedWriter(raw, WRITE_BUFFER), encoding="utf-8", newline="\n"
+        )
+
+    return open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER, newline="\n")
+
+
+def _mapped_lines(f):
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # Empty files, and files on some filesystems, can't be mapped
+        yield from _stream_lines(f)
+        return
+
+    with mapped:
+        find = mapped.find
+        start = 0
+        size = len(mapped)
+
+        while start < size:
+            end = find(b"\n", start)
+            if end == -1:
+                end = size
+
+            line = mapped[start:end].strip()
+            if line:
+                yield line
+
+            start = end + 1
+
+
+def _stream_lines(f):
+    for batch in read_batches(f, READ_SIZE):
+        for line in batch:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading and writing zstd files requires the zstandard package")
+
+    return zstandard
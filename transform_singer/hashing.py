@@ -0,0 +1,121 @@
+import collections
+import hashlib
+import sys
+
+from singer import logger
+
+# Rough size of an entry in the cache besides its key and digest strings
+ENTRY_OVERHEAD = 150
+
+
+def _hashlib(name):
+    constructor = getattr(hashlib, name)
+    return lambda value: constructor(value.encode("utf-8")).hexdigest()
+
+
+def _xxhash():
+    import xxhash
+
+    return lambda value: xxhash.xxh3_64_hexdigest(value.encode("utf-8"))
+
+
+DIGESTS = {
+    "md5": lambda: _hashlib("md5"),
+    "sha1": lambda: _hashlib("sha1"),
+    "sha256": lambda: _hashlib("sha256"),
+    "blake2b": lambda: _hashlib("blake2b"),
+    "xxhash": _xxhash,
+}
+
+
+class Hasher:
+    """
+    Hex digests of strings for `hash` mappings, with an optional LRU cache of the digests that
+    holds at most `max_entries` strings and roughly `max_bytes` of memory.  Caching is off when
+    `max_entries` is 0.
+
+    Mappings pick their digest with "algorithm": "md5" (the default), "sha1", "sha256", "blake2b"
+    or "xxhash" (XXH3 64 bit, when the xxhash package is installed).
+
+    Example:
+
+    hasher = Hasher(max_entries=10000)
+    digest = hasher.function("md5")
+    digest("a@example.com")  # returns "b418773a2c51fb9777a1648346fa7394"
+    """
+
+    def __init__(self, max_entries=0, max_bytes=64 * 1024 * 1024):
+        self.max_entries = int(max_entries or 0)
+        self.max_bytes = int(max_bytes)
+        self.cache = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.digests = {}
+        self.functions = {}
+
+    def digest(self, algorithm=None):
+        # The uncached digest function, raises ValueError for unknown or missing algorithms
+        algorithm = algorithm or "md5"
+
+        if algorithm not in self.digests:
+            try:
+                self.digests[algorithm] = DIGESTS[algorithm]()
+            except (KeyError, ImportError, AttributeError):
+                raise ValueError(f"Hash algorithm {algorithm} is not available")
+
+        return self.digests[algorithm]
+
+    def function(self, algorithm=None):
+        """
+        Return a function that hashes a string with the algorithm, going through the cache
+        when it's on.
+        """
+        digest = self.digest(algorithm)
+
+        if not self.max_entries:
+            return digest
+
+        algorithm = algorithm or "md5"
+        cache = self.cache
+
+        def cached(value):
+            key = (algorithm, value)
+
+            try:
+                result = cache[key]
+            except (KeyError, TypeError):
+                result = digest(value)
+                self.misses += 1
+                self._add(key, result)
+            else:
+                cache.move_to_end(key)
+                self.hits += 1
+
+            return result
+
+        return cached
+
+    def hash(self, value, algorithm=None):
+        function = self.functions.get(algorithm)
+
+        if function is None:
+            function = self.functions[algorithm] = self.function(algorithm)
+
+        return function(value)
+
+    def _add(self, key, result):
+        size = sys.getsizeof(key[1]) + sys.getsizeof(result) + ENTRY_OVERHEAD
+        self.cache[key] = result
+        self.bytes += size
+
+        while self.cache and (len(self.cache) > self.max_entries or self.bytes > self.max_bytes):
+            (_, value), digest = self.cache.popitem(last=False)
+            self.bytes -= sys.getsizeof(value) + sys.getsizeof(digest) + ENTRY_OVERHEAD
+
+    def log_stats(self):
+        if self.max_entries:
+            logger.log_info(
+                f"Hash cache: {self.hits} hits, {self.misses} misses, "
+                f"{len(self.cache)} entries, {self.bytes} bytes"
+            )
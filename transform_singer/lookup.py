@@ -0,0 +1,178 @@
+import csv
+import json
+import os
+
+from transform_singer.utils import nested_get
+
+
+class LookupTables:
+    """
+    The reference tables of `lookup` mappings, each loaded into a dictionary once and shared by
+    every mapping that reads the same table, key and value.
+
+    A table is a file ("file": CSV, JSON lines or JSON, by extension) or a dictionary in the
+    config meta ("meta": its key).  Relative file paths are resolved against `base_dir`, the
+    directory of the config file.  Rows (of CSV and JSON lines files, or a JSON file holding a
+    list) are indexed by their "key" column, a list of columns for composite keys, and map to
+    their "value" column or to the whole row without one.  The first row with a key wins.  CSV
+    and JSON lines files are indexed as they are read, so only the rows that are kept are held
+    in memory, but without a "value" that's every row with a new key.  Dictionaries map their
+    keys to their values, with a level of nesting for each part of a composite key.
+
+    Keys are compared as strings, so "1" in a CSV file matches 1 in a record.
+
+    Example:
+
+    tables = LookupTables({"labels": {"A": "Active", "C": "Closed"}})
+    mapping = {"type": "lookup", "object": {"type": "record", "key": "status"}, "meta": "labels"}
+    tables.table(mapping)[lookup_key(["A"])]  # returns "Active"
+    """
+
+    def __init__(self, meta, base_dir=None):
+        self.meta = meta
+        self.base_dir = base_dir or ""
+        # Loaded tables, or the error loading them, by what they were loaded from
+        self.tables = {}
+        # The same by lookup mapping, so interpreted mappings find theirs with a dictionary lookup
+        self.mappings = {}
+        # Whether a loaded table has unicode null characters, which then have to be scrubbed
+        # from every record like the ones in the config
+        self.has_nul = False
+
+    def table(self, mapping):
+        # Raises ValueError when the table can't be loaded, every time it's asked for
+        cached = self.mappings.get(id(mapping))
+
+        if cached is not None and cached[0] is mapping:
+            table = cached[1]
+        else:
+            table = self._table(mapping)
+            # The mapping is kept so its id isn't reused by another one
+            self.mappings[id(mapping)] = (mapping, table)
+
+        if isinstance(table, str):
+            raise ValueError(table)
+
+        return table
+
+    def _table(self, mapping):
+        width = len(lookup_objects(mapping))
+        spec = json.dumps(
+            [mapping.get("file"), mapping.get("meta"), mapping.get("key"), mapping.get("value"), width]
+        )
+
+        table = self.tables.get(spec)
+        if table is None:
+            try:
+                table = self._load(mapping, width)
+                self.has_nul = self.has_nul or _contains_nul(table)
+            except Exception as e:
+                table = f"Unable to load lookup table {mapping.get('file') or mapping.get('meta')}: {e}"
+
+            self.tables[spec] = table
+
+        return table
+
+    def _load(self, mapping, width):
+        if "file" in mapping:
+            return _read(os.path.join(self.base_dir, mapping["file"]), mapping, width)
+
+        return _index(nested_get(self.meta, mapping["meta"]), mapping, width)
+
+
+def lookup_objects(mapping):
+    # The mappings a lookup's key is made of
+    return mapping["objects"] if "objects" in mapping else [mapping["object"]]
+
+
+def lookup_key(values):
+    """
+    Return the index key of the values of a lookup's "object" (or "objects" for composite keys).
+    """
+    if len(values) == 1:
+        return _key_part(values[0])
+
+    return tuple(_key_part(value) for value in values)
+
+
+def _key_part(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    return str(value)
+
+
+def _contains_nul(table):
+    for key in table:
+        for part in key if isinstance(key, tuple) else (key,):
+            if part is not None and "\u0000" in part:
+                return True
+
+    try:
+        return "\\u0000" in json.dumps(list(table.values()))
+    except (TypeError, ValueError):
+        return True
+
+
+def _read(path, mapping, width):
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path, encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            return _index_rows(csv.DictReader(f), mapping["key"], width, mapping.get("value"))
+        if extension in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in f if line.strip())
+            return _index_rows(rows, mapping["key"], width, mapping.get("value"))
+        if extension == ".json":
+            return _index(json.load(f), mapping, width)
+
+    raise ValueError(f"unknown file type {extension}")
+
+
+def _index(data, mapping, width):
+    if isinstance(data, dict):
+        return _index_dict(data, width, mapping.get("value"))
+    if isinstance(data, list):
+        return _index_rows(data, mapping["key"], width, mapping.get("value"))
+
+    raise ValueError("expected an object or a list of rows")
+
+
+def _index_rows(rows, columns, width, value):
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    if len(columns) != width:
+        raise ValueError(f"expected {width} key columns, got {len(columns)}")
+
+    index = {}
+
+    for row in rows:
+        key = lookup_key([row.get(column) for column in columns])
+
+        if key is None or (width > 1 and None in key):
+            continue
+
+        if key not in index:
+            index[key] = row.get(value) if value else row
+
+    return index
+
+
+def _index_dict(data, width, value, parts=()):
+    index = {}
+
+    for key, item in data.items():
+        key = parts + (_key_part(key),)
+
+        if len(key) < width:
+            if isinstance(item, dict):
+                index.update(_index_dict(item, width, value, key))
+            continue
+
+        if value and isinstance(item, dict):
+            item = item.get(value)
+
+        index[key if width > 1 else key[0]] = item
+
+    return index
@@ -0,0 +1,165 @@
+import collections
+import json
+import time
+
+from singer import logger
+
+
+class Metrics:
+    """
+    Counts and timings of what the processor is doing, logged every `interval` seconds as
+    Singer METRIC lines.  Every line reports what happened since the one before it.
+
+    - `record_count` of records in per source stream and out per target stream
+    - `process_record_time` spent mapping the records of each source stream
+    - `mapping_eval_count`/`mapping_eval_time` per mapping type, including the mappings inside of it
+    - `exclude_count` of records each target stream's "exclude" was run on and how many it skipped
+    - `nested_record_count` of records found in each nested stream and how many records held them
+
+    Example:
+
+    metrics = Metrics(interval=60)
+    metrics.records_in["users"] += 1
+    metrics.emit_due()
+    """
+
+    def __init__(self, interval):
+        self.interval = float(interval)
+        self.last_emit = time.monotonic()
+        self.records_in = collections.defaultdict(int)
+        self.records_out = collections.defaultdict(int)
+        self.stream_time = collections.defaultdict(float)
+        self.evals = collections.defaultdict(int)
+        self.eval_time = collections.defaultdict(float)
+        self.exclude_evals = collections.defaultdict(int)
+        self.exclude_hits = collections.defaultdict(int)
+        self.nested_parents = collections.defaultdict(int)
+        self.nested_records = collections.defaultdict(int)
+
+    def timed(self, mapping_type, fn):
+        # Wrap a compiled mapping to count and time its evaluations
+        evals = self.evals
+        eval_time = self.eval_time
+        clock = time.perf_counter
+
+        def timed(record):
+            start = clock()
+            try:
+                return fn(record)
+            finally:
+                evals[mapping_type] += 1
+                eval_time[mapping_type] += clock() - start
+
+        return timed
+
+    def timed_batch(self, mapping_type, fn, rows):
+        # Like `timed` for the batch engine's columns, a batch counts as `rows()` evaluations
+        evals = self.evals
+        eval_time = self.eval_time
+        clock = time.perf_counter
+
+        def timed(records):
+            start = clock()
+            try:
+                return fn(records)
+            finally:
+                evals[mapping_type] += rows()
+                eval_time[mapping_type] += clock() - start
+
+        return timed
+
+    def wrap_method(self, fn):
+        # Count and time the mappings `Processor.process_mapping` interprets, like `timed`
+        evals = self.evals
+        eval_time = self.eval_time
+        clock = time.perf_counter
+
+        def timed(mapping, record):
+            if not mapping:
+                return fn(mapping, record)
+
+            mapping_type = mapping.get("type")
+            start = clock()
+            try:
+                return fn(mapping, record)
+            finally:
+                evals[mapping_type] += 1
+                eval_time[mapping_type] += clock() - start
+
+        return timed
+
+    def excluded(self, stream, excluded):
+        self.exclude_evals[stream] += 1
+        if excluded:
+            self.exclude_hits[stream] += 1
+
+    def emit_due(self):
+        if time.monotonic() - self.last_emit >= self.interval:
+            self.emit()
+
+    def emit(self):
+        self.last_emit = time.monotonic()
+
+        for stream, value in self.records_in.items():
+            self._log("counter", "record_count", value, stream=stream, direction="in")
+        for stream, value in self.records_out.items():
+            self._log("counter", "record_count", value, stream=stream, direction="out")
+        for stream, value in self.stream_time.items():
+            self._log("timer", "process_record_time", value, stream=stream)
+        for mapping_type, value in self.evals.items():
+            self._log("counter", "mapping_eval_count", value, mapping_type=mapping_type)
+        for mapping_type, value in self.eval_time.items():
+            self._log("timer", "mapping_eval_time", value, mapping_type=mapping_type)
+        for stream, value in self.exclude_evals.items():
+            self._log(
+                "counter",
+                "exclude_count",
+                value,
+                stream=stream,
+                excluded=self.exclude_hits.get(stream, 0),
+            )
+        for stream, value in self.nested_records.items():
+            self._log(
+                "counter",
+                "nested_record_count",
+                value,
+                stream=stream,
+                parents=self.nested_parents.get(stream, 0),
+            )
+
+        for values in self._counters().values():
+            values.clear()
+
+    def take(self):
+        # Return the counters since the last call and start over, see `merge`
+        counters = {name: dict(values) for name, values in self._counters().items()}
+
+        for values in self._counters().values():
+            values.clear()
+
+        return counters
+
+    def merge(self, counters):
+        # Add counters taken from another process' metrics
+        mine = self._counters()
+
+        for name, values in counters.items():
+            for key, value in values.items():
+                mine[name][key] += value
+
+    def _counters(self):
+        return {
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "stream_time": self.stream_time,
+            "evals": self.evals,
+            "eval_time": self.eval_time,
+            "exclude_evals": self.exclude_evals,
+            "exclude_hits": self.exclude_hits,
+            "nested_parents": self.nested_parents,
+            "nested_records": self.nested_records,
+        }
+
+    def _log(self, metric_type, metric, value, **tags):
+        point = {"type": metric_type, "metric": metric, "value": value, "tags": tags}
+        logger.log_info(f"METRIC: {json.dumps(point)}")
@@ -0,0 +1,170 @@
+import collections
+from types import SimpleNamespace
+
+from transform_singer.writer import BufferedWriter, CollectingWriter
+
+# Singer taps write the message type first, so this is enough to spot RECORD messages
+# without parsing them.  Records written any other way are simply processed in order
+# by the main process.
+RECORD_PREFIXES = ('{"type": "RECORD"', '{"type":"RECORD"')
+RECORD_PREFIXES_BYTES = tuple(prefix.encode("utf-8") for prefix in RECORD_PREFIXES)
+
+# Number of RECORD lines handed to a worker at a time
+CHUNK_SIZE = 500
+
+_worker_processor = None
+
+
+class ParallelRunner:
+    """
+    Parses and transforms RECORD lines in chunks across a pool of worker processes.
+
+    Every other line is handled by the main processor, and results are written out in the
+    order they came in so the output, including where STATE messages land, matches serial mode.
+    The pool is only started once the first chunk of records is ready.
+
+    Example:
+
+    runner = ParallelRunner(processor, workers=4)
+    for line in lines:
+        runner.process_line(line)
+    runner.close()
+    """
+
+    def __init__(self, processor, workers, chunk_size=CHUNK_SIZE):
+        self.processor = processor
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.pool = None
+        self.chunk = []
+        # Chunks that are being transformed and lines waiting on them, in input order
+        self.pending = collections.deque()
+
+        if not isinstance(processor.writer, BufferedWriter):
+            # Workers hand back serialized lines, so the output needs to share their codec
+            processor.writer = BufferedWriter(codec=processor.codec)
+
+    def process_line(self, line):
+        if line.startswith(RECORD_PREFIXES if isinstance(line, str) else RECORD_PREFIXES_BYTES):
+            if self.processor.is_unmapped(line):
+                return
+
+            self.chunk.append(line)
+
+            if len(self.chunk) >= self.chunk_size:
+                self.submit()
+        else:
+            self.submit()
+            self.pending.append((False, line))
+
+        self.drain()
+
+    def submit(self):
+        if not self.chunk:
+            return
+
+        if self.pool is None:
+            import multiprocessing
+
+            self.pool = multiprocessing.Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.processor.config, self.processor.config_path),
+            )
+
+        # Failures are logged with the key properties from the SCHEMA messages seen so far
+        key_properties = self.processor.failures.key_properties
+        self.pending.append(
+            (True, self.pool.apply_async(_process_chunk, (self.chunk, key_properties)))
+        )
+        self.chunk = []
+
+    def drain(self, wait=False):
+        # Write out everything that is ready, blocking on the oldest chunk when we are too far
+        # ahead of the workers or when we were asked to wait.
+        while self.pending:
+            is_chunk, item = self.pending[0]
+            if is_chunk:
+                if not (wait or item.ready() or len(self.pending) > self.workers * 2):
+                    return
+
+                lines, stats = item.get()
+                self._merge(stats)
+
+                for stream, line in lines:
+                    if stream in self.processor.pending_schemas:
+                        self.processor.write_pending_schema(stream)
+
+                    self.processor.writer.write_line(line)
+            else:
+                self.processor.process_line(item)
+
+            self.pending.popleft()
+
+    def _merge(self, stats):
+        # Count what the workers did as if it happened here, so it's reported on close
+        processor = self.processor
+        failures, (hits, misses), metrics = stats
+
+        processor.failures.merge(failures)
+        processor.hasher.hits += hits
+        processor.hasher.misses += misses
+
+        if processor.metrics is not None and metrics is not None:
+            processor.metrics.merge(metrics)
+
+    def flush(self):
+        # Hand over the records we have so far and write out whatever is done
+        self.submit()
+        self.drain()
+        self.processor.flush()
+
+    def close(self):
+        try:
+            self.submit()
+            self.drain(wait=True)
+        except BaseException:
+            if self.pool is not None:
+                self.pool.terminate()
+            raise
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+            self.processor.close()
+
+
+def _init_worker(config, config_path):
+    global _worker_processor
+
+    from transform_singer.processor import Processor
+
+    _worker_processor = Processor(SimpleNamespace(config=config, config_path=config_path))
+    _worker_processor.writer = CollectingWriter(_worker_processor.codec)
+
+    # Failures and metrics are handed back with every chunk and reported by the main process
+    _worker_processor.failures.deferred = True
+    if _worker_processor.metrics is not None:
+        _worker_processor.metrics.interval = float("inf")
+
+
+def _process_chunk(lines, key_properties):
+    processor = _worker_processor
+    processor.failures.key_properties = key_properties
+
+    for line in lines:
+        processor.process_line(line)
+
+    processor.flush_batch()
+
+    hasher = processor.hasher
+    stats = (
+        processor.failures.take(),
+        (hasher.hits, hasher.misses),
+        processor.metrics.take() if processor.metrics is not None else None,
+    )
+    hasher.hits = hasher.misses = 0
+
+    return processor.writer.collect(), stats
@@ -0,0 +1,131 @@
+import queue
+import threading
+
+# Bytes read from the input at a time
+READ_SIZE = 1 << 16
+# Batches of lines that can wait on the processor before the reader blocks
+QUEUE_SIZE = 16
+
+_EOF = object()
+
+
+def run_pipelined(processor, stream, queue_size=QUEUE_SIZE):
+    """
+    Process the lines of a binary stream with reading and line splitting on a separate thread.
+    Combined with a `ThreadedWriter` the processor only transforms records while the input and
+    output are handled around it.
+
+    Lines are handed over in order through a bounded queue, so a slow processor holds the
+    reader back.  Whenever the processor catches up with the input it flushes, so output isn't
+    held back waiting on the tap.  Closing the processor is up to the caller.
+
+    Example:
+
+    processor.writer = ThreadedWriter(codec=processor.codec)
+    try:
+        run_pipelined(processor, sys.stdin.buffer)
+    finally:
+        processor.close()
+    """
+    lines = queue.Queue(queue_size)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=_read_lines, args=(stream, lines, stop), name="reader", daemon=True
+    )
+    reader.start()
+
+    try:
+        while True:
+            try:
+                batch = lines.get_nowait()
+            except queue.Empty:
+                # Waiting on the tap, write out what we have in the meantime
+                processor.flush()
+                batch = lines.get()
+
+            if batch is _EOF:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+
+            for line in batch:
+                processor.process_line(line)
+    finally:
+        # Let the reader go if we stopped early, it can't be interrupted while it's reading
+        stop.set()
+
+
+def read_batches(stream, size=None):
+    """
+    Read a binary stream `size` bytes at a time and yield the lines (without their newline)
+    that each read completes, as a list that can be empty.  The pieces of a line that spans
+    several reads are only joined once its newline shows up, so long lines cost the same as
+    short ones.
+    """
+    read = getattr(stream, "read1", stream.read)
+    size = size or READ_SIZE
+    pieces = []
+
+    while True:
+        chunk = read(size)
+
+        if not chunk:
+            yield [b"".join(pieces)] if pieces else []
+            return
+
+        lines = []
+        start = 0
+        end = chunk.find(b"\n")
+
+        while end != -1:
+            if pieces:
+                pieces.append(chunk[start:end])
+                lines.append(b"".join(pieces))
+                pieces = []
+            else:
+                lines.append(chunk[start:end])
+
+            start = end + 1
+            end = chunk.find(b"\n", start)
+
+        if start < len(chunk):
+            pieces.append(chunk[start:])
+
+        yield lines
+
+
+def _read_lines(stream, lines, stop):
+    try:
+        for batch in read_batches(stream):
+            if stop.is_set():
+                return
+
+            batch = _decode(batch)
+            if batch:
+                _put(lines, stop, batch)
+
+        _put(lines, stop, _EOF)
+    except BaseException as e:
+        _put(lines, stop, e)
+
+
+def _decode(batch):
+    # Same as reading the lines as UTF-8 text and skipping the blank ones
+    lines = []
+
+    for line in batch:
+        line = line.decode("utf-8").strip()
+        if line:
+            lines.append(line)
+
+    return lines
+
+
+def _put(lines, stop, item):
+    # Wait for room in the queue unless the processor has stopped
+    while not stop.is_set():
+        try:
+            lines.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from functools import lru_cache
+
+from singer import logger
+
+from transform_singer import compiler, routing, streaming
+from transform_singer.compiler import shared_structures
+from transform_singer.routing import build_contexts, build_routes
+from transform_singer.streaming import streamable_levels
+
+# Bump whenever what's in a plan changes so old cached plans are ignored.  Changes to how it's
+# worked out are caught by the hash of the code, see `_code_digest`.
+PLAN_VERSION = 1
+
+
+def build_plan(mappings):
+    """
+    Work out everything about `config["mappings"]` that doesn't depend on the records: the
+    nested levels below every stream (see `build_routes`), the context keys nested records need
+    (see `build_contexts`), the nested lists that can be streamed (see `streamable_levels`), the
+    sub-expressions repeated within each stream and the streams whose entries are malformed.
+
+    Example:
+
+    plan = build_plan(config["mappings"])
+    plan["routes"]  # {"records": ("items",)}
+    """
+    routes = build_routes(mappings)
+    invalid = {}
+    shared = {}
+
+    for stream, entries in mappings.items():
+        problem = _validate(entries)
+        if problem is not None:
+            invalid[stream] = problem
+            continue
+
+        shared[stream] = shared_structures(entries)
+
+    return {
+        "routes": routes,
+        "contexts": build_contexts(mappings),
+        "streamable": streamable_levels(mappings, routes),
+        "shared": shared,
+        "invalid": invalid,
+    }
+
+
+def load_plan(mappings, cache_dir=None):
+    """
+    Return the plan for the mappings, see `build_plan`.  With a `cache_dir` plans are saved
+    there by a hash of the mappings and of the code that works plans out, and loaded instead of
+    being worked out again the next time the same mappings are used.  Cache files that can't be read or written are skipped.
+    """
+    if not cache_dir:
+        return build_plan(mappings)
+
+    try:
+        path = os.path.join(cache_dir, f"plan-{_digest(mappings)}.json")
+    except (TypeError, ValueError):
+        return build_plan(mappings)
+
+    try:
+        with open(path) as f:
+            return _decode(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    plan = build_plan(mappings)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write(path, _encode(plan))
+    except (OSError, TypeError, ValueError) as e:
+        logger.log_warning(f"Unable to cache the mapping plan in {cache_dir}: {e}")
+
+    return plan
+
+
+def _validate(entries):
+    # Describe what's wrong with a stream's entries, or None when they look right
+    if not isinstance(entries, list):
+        return "entries are not a list"
+
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            return f"entry {i} is not an object"
+        if "stream" not in entry:
+            return f"entry {i} has no target stream"
+        if not isinstance(entry.get("properties"), dict):
+            return f"entry {i} has no properties"
+
+    return None
+
+
+def _digest(mappings):
+    key = json.dumps(
+        {"version": PLAN_VERSION, "code": _code_digest(), "mappings": mappings}, sort_keys=True
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _code_digest():
+    # Hash the modules a plan is worked out with, so upgrading them never loads a stale plan
+    digest = hashlib.sha256()
+
+    for module in (sys.modules[__name__], compiler, routing, streaming):
+        try:
+            with open(module.__file__, "rb") as f:
+                digest.update(f.read())
+        except (OSError, TypeError):
+            # Without the source the plan can't be tied to this code, so it's never reused
+            digest.update(os.urandom(16))
+
+    return digest.hexdigest()
+
+
+def _encode(plan):
+    return {
+        "version": PLAN_VERSION,
+        "routes": {stream: list(levels) for stream, levels in plan["routes"].items()},
+        "contexts": {stream: sorted(keys) for stream, keys in plan["contexts"].items()},
+        "streamable": {stream: sorted(levels) for stream, levels in plan["streamable"].items()},
+        "shared": {stream: sorted(keys) for stream, keys in plan["shared"].items()},
+        "invalid": plan["invalid"],
+    }
+
+
+def _decode(cached):
+    if cached["version"] != PLAN_VERSION:
+        raise ValueError("Plan from another version")
+
+    return {
+        "routes": {stream: tuple(levels) for stream, levels in cached["routes"].items()},
+        "contexts": {stream: set(keys) for stream, keys in cached["contexts"].items()},
+        "streamable": {stream: set(levels) for stream, levels in cached["streamable"].items()},
+        "shared": {stream: set(keys) for stream, keys in cached["shared"].items()},
+        "invalid": dict(cached["invalid"]),
+    }
+
+
+def _write(path, data):
+    # Write to a temporary file first so concurrent runs never read half a plan
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -1,15 +1,36 @@
 import singer
-import copy
 from singer import logger
 import json
-import hashlib
-from transform_singer.utils import nested_get, nested_set, replace_deep
+import os
+import re
+import time
+from transform_singer.codec import get_codec
+from transform_singer.compiler import MappingCompiler
+from transform_singer.failures import FailureLog
+from transform_singer.hashing import Hasher
+from transform_singer.lookup import LookupTables, lookup_key, lookup_objects
+from transform_singer.plan import load_plan
+from transform_singer.schema import derive_schemas, merge_schemas
+from transform_singer.streaming import StreamedArray, parent_keys, parse_large_record
+from transform_singer.writer import BufferedWriter, CollectingWriter, SingerWriter, SpoolWriter
+from transform_singer.utils import NestedRecord, nested_get, replace_deep
+
+
+# Pulls the stream out of RECORD lines written the way Singer taps write them, without parsing
+# the whole line.  Lines that don't match are just parsed.
+RECORD_STREAM = re.compile(r'\{\s*"type"\s*:\s*"RECORD"\s*,\s*"stream"\s*:\s*"([^"\\]*)"')
+RECORD_STREAM_BYTES = re.compile(RECORD_STREAM.pattern.encode("utf-8"))
+# What has to follow the stream, and end the line, for a RECORD to be skipped without parsing it
+RECORD_BODY = re.compile(r'\s*,\s*"record"\s*:\s*\{')
+RECORD_BODY_BYTES = re.compile(RECORD_BODY.pattern.encode("utf-8"))
+RECORD_END = re.compile(r"\}\s*$")
+RECORD_END_BYTES = re.compile(RECORD_END.pattern.encode("utf-8"))
 
 
 class Processor:
     config = None
 
-    def __init__(self, args):
+    def __init__(self, args, profiler=None):
         self.config = args.config or {}
 
         if not self.config.get('meta'):
@@ -25,16 +46,176 @@ class Processor:
             # Unable to parse/load tap_config json.... so we just ignore it
             pass
 
-    def process_schema(self, message):
-        # This function isn't implemented yet.
-        # It would be used for filtering out only certain fields for processing
-        # TODO convert schema based on mappings
-        for key in self.config["mappings"].keys():
-            # Loop through all of our mappings to see if we find a mapping that is a subset of the current mapping
-            if key.startswith(message["stream"] + "."):
-                # Convert this schema
+        # Log METRIC lines every "metrics_interval" seconds when it's configured
+        self.metrics = None
+        if self.config.get("metrics_interval"):
+            from transform_singer.metrics import Metrics
+
+            self.metrics = Metrics(self.config["metrics_interval"])
+            self.process_mapping = self.metrics.wrap_method(self.process_mapping)
+
+        # Time every mapping by its path in the config, see `Profiler`
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.index(self.config.get("mappings") or {})
+            self.process_mapping = profiler.wrap_method(self.process_mapping)
+            self._process_condition = profiler.wrap_method(self._process_condition)
+
+        # Mappings that fail are logged by their path in the config instead of with the whole record
+        self.failures = FailureLog(
+            self.config.get("mappings") or {},
+            interval=self.config.get("error_log_interval", 60),
+            debug=bool(self.config.get("debug")),
+            key_fields=self.config.get("error_key_fields") or ["id"],
+        )
+
+        # Digests of `hash` mappings, cached when "hash_cache_size" is set
+        self.hasher = Hasher(
+            self.config.get("hash_cache_size"),
+            self.config.get("hash_cache_max_bytes", 64 * 1024 * 1024),
+        )
+
+        # Reference tables of `lookup` mappings, loaded when the mappings are compiled.  Their
+        # files are found next to the config file.
+        config_path = getattr(args, "config_path", None)
+        self.config_path = config_path if isinstance(config_path, str) else None
+        self.lookups = LookupTables(
+            self.config["meta"], os.path.dirname(self.config_path) if self.config_path else None
+        )
+
+        # Work out the structure of the mappings, or load it from "plan_cache_dir" when the
+        # same mappings have been seen before
+        plan = load_plan(self.config.get("mappings") or {}, self.config.get("plan_cache_dir"))
+        for stream, problem in plan["invalid"].items():
+            logger.log_warning(f"Mappings for {stream} are malformed: {problem}")
+
+        # Compile the mappings up front so records don't have to re-interpret the config.
+        # Setting "compile_mappings" to false runs every record through `process_mapping` instead.
+        self.compiler = MappingCompiler(
+            self, interpret=self.config.get("compile_mappings") is False
+        )
+        self.streams = self.compiler.compile_streams(self.config.get("mappings") or {}, plan)
+        self.routes = plan["routes"]
+        # Context keys (@parent, @root, ...) each nested stream's mappings use
+        self.contexts = plan["contexts"]
+
+        # Lines longer than "large_record_bytes" have their nested lists parsed one item at a time
+        self.large_record_bytes = self.config.get("large_record_bytes")
+        self.streamable = {}
+        if self.large_record_bytes:
+            self.streamable = plan["streamable"]
+        # Keys a top-level record needs before its lists can be mapped as they're parsed
+        self.spool_keys = {}
+        # Where records go instead of the writer while a list is mapped that way
+        self.spool = None
+
+        # Streams that are mapped a batch of records at a time, see `flush_batch`
+        self.batchers = {}
+        self.batch = []
+        self.batch_stream = None
+        self.batch_size = self.config.get("columnar_batch_size")
+        if self.batch_size:
+            self._compile_batchers()
+
+        # Fingerprints of the last SCHEMA message of each source stream, and the target schemas
+        # derived from it
+        self.source_schemas = {}
+        self.derived_schemas = {}
+        # Derived target schemas, and the ones that still have to be written before their next record
+        self.target_schemas = {}
+        self.pending_schemas = {}
+
+        # Mapped values only need unicode null characters scrubbed when the record has one,
+        # unless the config itself (or a lookup table, see `LookupTables`) has them.
+        try:
+            self.config_has_nul = "\\u0000" in json.dumps(self.config)
+        except (TypeError, ValueError):
+            self.config_has_nul = True
+
+        # Pick the JSON library used for parsing input and for buffered output
+        self.codec = get_codec(self.config.get("json_backend"))
+        logger.log_info(f"Using {self.codec.name} for JSON")
+
+        # Buffer the output and write it out in batches when "output_batch_size" is configured
+        if self.config.get("output_batch_size"):
+            self.writer = BufferedWriter(
+                batch_size=self.config["output_batch_size"],
+                flush_interval=self.config.get("output_flush_interval", 1),
+                codec=self.codec,
+            )
+        else:
+            self.writer = SingerWriter()
+
+    def _compile_batchers(self):
+        try:
+            from transform_singer.columnar import BatchCompiler
+        except ImportError:
+            logger.log_warning("numpy is not installed, mapping records one at a time")
+            return
+
+        compiler = BatchCompiler(self.config["meta"], self.failures, self.metrics)
+
+        for stream, entries in self.config["mappings"].items():
+            if stream not in self.streams or "." in stream:
+                continue
+
+            try:
+                self.batchers[stream] = compiler.compile_stream(entries)
+            except Exception:
+                # Streams with mappings the batch engine doesn't support run record by record
                 pass
 
+        logger.log_info(f"Mapping streams in batches: {sorted(self.batchers)}")
+
+    def process_schema(self, message):
+        """
+        Derive the schemas of the target streams mapped from this stream (and the streams nested
+        inside of it).  Each target schema is written right before the first record of its stream.
+        Target streams mapped from more than one source stream get the schemas of all of them
+        combined.  Nothing is written when the config has "write_schemas": false.
+        """
+        stream = message["stream"]
+        self.failures.key_properties[stream] = message.get("key_properties") or []
+
+        if self.config.get("write_schemas") is False:
+            return
+
+        fingerprint = json.dumps(
+            [message.get("schema"), message.get("key_properties")], sort_keys=True
+        )
+
+        if self.source_schemas.get(stream) == fingerprint:
+            # Taps repeat their schemas, nothing changed since the last one
+            return
+
+        self.source_schemas[stream] = fingerprint
+        schemas = derive_schemas(
+            self.config["mappings"],
+            stream,
+            message.get("schema") or {},
+            message.get("key_properties") or [],
+            self.config["meta"],
+        )
+
+        self.derived_schemas[stream] = schemas
+
+        for target_stream in schemas:
+            schema = merge_schemas(
+                [
+                    derived[target_stream]
+                    for derived in self.derived_schemas.values()
+                    if target_stream in derived
+                ]
+            )
+
+            if self.target_schemas.get(target_stream) != schema:
+                self.target_schemas[target_stream] = schema
+                self.pending_schemas[target_stream] = schema
+
+    def write_pending_schema(self, stream):
+        schema, key_properties = self.pending_schemas.pop(stream)
+        self.writer.write_schema(stream, schema, key_properties)
+
     def _process_condition(self, obj, record):
         """
         Example:
@@ -111,14 +292,13 @@ class Processor:
                 )
             elif mapping["type"] == "coalesce":
                 # Find the first processed value this exists and use that.
-                return next(
-                    (
-                        self.process_mapping(mapping, record)
-                        for mapping in mapping["objects"]
-                        if self.process_mapping(mapping, record) or self.process_mapping(mapping, record) == 0
-                    ),
-                    None,
-                )
+                for obj in mapping["objects"]:
+                    value = self.process_mapping(obj, record)
+
+                    if value or value == 0:
+                        return value
+
+                return None
             elif mapping["type"] == "substr":
                 # Return the first `length` number of characters of a string
                 return self.process_mapping(mapping["object"], record)[
@@ -126,9 +306,21 @@ class Processor:
                 ]
             elif mapping["type"] == "hash":
                 # Return a hashed string
-                return hashlib.md5(
-                    self.process_mapping(mapping["object"], record).encode("utf-8")
-                ).hexdigest()
+                return self.hasher.hash(
+                    self.process_mapping(mapping["object"], record), mapping.get("algorithm")
+                )
+            elif mapping["type"] == "lookup":
+                # Translate the value of "object" (or the values of "objects") with a table,
+                # falling back to "default" for values that aren't in it
+                table = self.lookups.table(mapping)
+                key = lookup_key(
+                    [self.process_mapping(obj, record) for obj in lookup_objects(mapping)]
+                )
+
+                if key in table:
+                    return table[key]
+
+                return self.process_mapping(mapping.get("default"), record)
             elif mapping["type"] == "tofloat":
                 try:
                     return float(self.process_mapping(mapping["object"], record) or 0)
@@ -227,84 +419,232 @@ class Processor:
                 # Condition didn't pass, send the "else" value
                 return self.process_mapping(mapping.get("else"), record)
         except:
-            logger.log_info(f"Unable to run mapping {mapping} for record: {record}")
+            self.failures.report(mapping, record)
 
-    def process_record(self, stream, record, root=None):
-        root = root if root else record
+    def process_record(self, stream, record, root=None, has_nul=True, streamed=None):
+        if not root:
+            # A top-level record, failures of the records nested in it are logged with its keys
+            self.failures.root_stream = stream
+            root = record
+
+        scrub = has_nul or self.config_has_nul or self.lookups.has_nul
         if stream in self.config["mappings"]:
-            for mapping in self.config["mappings"][stream]:
+            self.failures.stream = stream
+            self.failures.root = root if root is not record else None
+            metrics = self.metrics
+            if metrics is not None:
+                metrics.records_in[stream] += 1
+                start = time.perf_counter()
+
+            entries = self.streams.get(stream)
+
+            if entries is None:
+                # This stream couldn't be compiled ahead of time so compile it now.
+                entries = self.compiler.compile_stream(self.config["mappings"][stream])
+
+            # Repeated sub-expressions are evaluated once per record and kept here
+            self.compiler.memo = {}
+            for target_stream, exclude, properties, scrub_nul in entries:
                 # Loop through the mappings of this stream and process the record.
                 mapped_record = {}
 
-                if "exclude" in mapping and bool(
-                    self.process_mapping(mapping["exclude"], record)
-                ):
-                    # Skip this record because of the config
-                    continue
+                if exclude is not None:
+                    excluded = bool(exclude(record))
+
+                    if metrics is not None:
+                        metrics.excluded(target_stream, excluded)
+
+                    if excluded:
+                        # Skip this record because of the config
+                        continue
 
-                for target, conf in mapping["properties"].items():
+                for set_value, process in properties:
                     # Loop through each mapping item and set the the value on the record
-                    value = self.process_mapping(conf, record)
+                    value = process(record)
 
                     if value == '':
                         # Ignore empty strings... but not NULL?
                         continue
 
-                    # Recursively replace any unicode null characters with empty string
-                    value = replace_deep(value, '\u0000', '')
+                    if scrub and scrub_nul:
+                        # Recursively replace any unicode null characters with empty string
+                        value = replace_deep(value, '\u0000', '')
 
-                    mapped_record = nested_set(
-                        mapped_record, target, value
-                    )
+                    mapped_record = set_value(mapped_record, value)
 
                 # Add the record to the queue for posting to API later
-                singer.write_record(mapping["stream"], mapped_record)
-
-        nested_sources = set(
-            [
-                key
-                for key in self.config["mappings"].keys()
-                if key.startswith(stream + ".")
-            ]
-        )
+                self.write_record(target_stream, mapped_record)
+
+            self.compiler.memo = None
+
+            if metrics is not None:
+                metrics.stream_time[stream] += time.perf_counter() - start
 
-        # Extract unique next levels to avoid processing the same nested object multiple times
+        self.process_nested(stream, record, root, has_nul, streamed)
+
+    def process_nested(self, stream, record, root, has_nul=True, streamed=None):
+        # Find the unique next levels that have mappings nested below this stream.
         # For example, both "records.transaction.items" and "records.transaction.coupons"
         # should only cause "records.transaction" to be processed once
-        next_levels = set()
-        for key in nested_sources:
-            next_level = key[len(stream + ".") :].split(".")[0]
-            next_levels.add(next_level)
+        next_levels = self.routes.get(stream, ())
 
         for next_level in next_levels:
             next_stream = f"{stream}.{next_level}"
-            items = nested_get(record, next_level)
+            if streamed and next_level in streamed:
+                items = streamed[next_level]
+            else:
+                items = nested_get(record, next_level)
+            # Only attach the context the mappings of the nested stream use
+            keys = self.contexts.get(next_stream, ())
+
+            count = 0
+
+            if isinstance(items, SpoolWriter):
+                # Already mapped (and counted) while the line was parsed, see `process_large_line`
+                self.write_spooled(items)
+            elif isinstance(items, (list, StreamedArray)):
+                count = self.process_items(next_stream, items, record, root, has_nul)
+            elif items:
+                if isinstance(items, dict):
+                    context = _context(keys, record, root, None)
+                    item = NestedRecord(items, context) if context else items
+                else:
+                    item = items
+                    logger.log_info(f"Error trying to set parent/root {item}")
+                self.process_record(next_stream, item, root, has_nul)
+                count = 1
+
+            self.count_nested(next_stream, count)
+
+    def process_items(self, stream, items, record, root, has_nul=True):
+        # Process the items of a nested list as records of `stream`, returns how many there were
+        keys = self.contexts.get(stream, ())
+        count = 0
+
+        for i, value in enumerate(items):
+            if type(value) is not dict:
+                item = _context(keys, record, root, i)
+                item["@item"] = value
+            elif not keys:
+                item = value
+            else:
+                # Layer the context over the original item instead of copying it
+                context = _context(keys, record, root, i)
+                item = NestedRecord(value, context)
+                if "@item" in keys:
+                    context["@item"] = item
+
+            self.process_record(stream, item, root, has_nul)
+            count += 1
+
+        return count
+
+    def count_nested(self, stream, count):
+        # Counted after the fact, streamed lists are only counted by going through them
+        if self.metrics is not None and count:
+            self.metrics.nested_parents[stream] += 1
+            self.metrics.nested_records[stream] += count
+
+    def write_record(self, stream, record):
+        if self.spool is not None:
+            # Mapped from a line that's still being parsed, written out after the record it's in
+            self.spool.write_record(stream, record)
+            return
+
+        if stream in self.pending_schemas:
+            self.write_pending_schema(stream)
+
+        if self.metrics is not None:
+            self.metrics.records_out[stream] += 1
+
+        self.writer.write_record(stream, record)
+
+    def batch_record(self, stream, record, has_nul=True):
+        # Hold on to the record until there is a full batch of this stream
+        if stream != self.batch_stream:
+            self.flush_batch()
+            self.batch_stream = stream
+
+        self.batch.append((record, has_nul))
+
+        if len(self.batch) >= self.batch_size:
+            self.flush_batch()
+
+    def flush_batch(self):
+        """
+        Map the batched records as columns and write them out in their original order,
+        along with the streams nested inside of each of them.
+        """
+        if not self.batch:
+            return
 
-            if isinstance(items, list):
-                for i in range(len(items)):
-                    if type(items[i]) is not dict:
-                        item = {"@item": items[i]}
-                    else:
-                        item = copy.deepcopy(items[i])
-                        item["@item"] = item
+        stream = self.batch_stream
+        batch = self.batch
+        self.batch = []
 
-                    item["@parent"] = record
-                    item["@root"] = root
-                    item["@index"] = i
+        self.failures.stream = stream
+        self.failures.root = None
+        if self.metrics is not None:
+            self.metrics.records_in[stream] += len(batch)
+            start = time.perf_counter()
 
-                    self.process_record(next_stream, item, root)
-            elif items:
-                item = copy.deepcopy(items)
-                try:
-                    item["@parent"] = record
-                    item["@root"] = root
-                except:
-                    logger.log_info(f"Error trying to set parent/root {item}")
-                self.process_record(next_stream, item, root)
+        results = self.batchers[stream]([record for record, _ in batch])
+        entries = self.streams[stream]
+
+        if self.metrics is not None:
+            self.metrics.stream_time[stream] += time.perf_counter() - start
+
+        for i, (record, has_nul) in enumerate(batch):
+            scrub = has_nul or self.config_has_nul or self.lookups.has_nul
+
+            for (target_stream, _, properties, scrub_nul), (excluded, columns) in zip(
+                entries, results
+            ):
+                if excluded is not None:
+                    if self.metrics is not None:
+                        self.metrics.excluded(target_stream, excluded[i])
+
+                    if excluded[i]:
+                        # Skip this record because of the config
+                        continue
+
+                mapped_record = {}
+
+                for (set_value, _), column in zip(properties, columns):
+                    value = column[i]
+
+                    if value == '':
+                        # Ignore empty strings... but not NULL?
+                        continue
+
+                    if scrub and scrub_nul:
+                        # Recursively replace any unicode null characters with empty string
+                        value = replace_deep(value, '\u0000', '')
+
+                    mapped_record = set_value(mapped_record, value)
+
+                self.write_record(target_stream, mapped_record)
+
+            self.process_nested(stream, record, record, has_nul)
 
     def process_state(self, message):
         # Forward state along
-        singer.write_state(message["value"])
+        self.writer.write_state(message["value"])
+
+    def flush(self):
+        # Write out anything that is still buffered
+        self.flush_batch()
+        self.writer.flush()
+
+    def close(self):
+        # Called once the input is done
+        self.flush()
+        self.writer.close()
+        self.failures.summarize()
+        self.hasher.log_stats()
+
+        if self.metrics is not None:
+            self.metrics.emit()
 
     def process_log(self, message):
         if message.get('event') == 'START':
@@ -314,10 +654,182 @@ class Processor:
 
         logger.log_info(json.dumps(message))
 
-    def process(self, message):
+    def is_unmapped(self, line):
+        # Check if the line is a RECORD for a stream that has no mappings at any level.  Lines
+        # that don't look like a whole RECORD message go the regular way, so malformed ones are
+        # still passed along.
+        if isinstance(line, bytes):
+            match = RECORD_STREAM_BYTES.match(line)
+            body, end = RECORD_BODY_BYTES, RECORD_END_BYTES
+        else:
+            match = RECORD_STREAM.match(line)
+            body, end = RECORD_BODY, RECORD_END
+
+        if (
+            match is None
+            or body.match(line, match.end()) is None
+            or end.search(line, max(len(line) - 64, 0)) is None
+        ):
+            return False
+
+        stream = match.group(1)
+        if isinstance(stream, bytes):
+            stream = stream.decode("utf-8")
+
+        return stream not in self.config["mappings"] and stream not in self.routes
+
+    def process_large_line(self, line):
+        """
+        Process a RECORD line with its nested lists parsed and mapped one item at a time, instead
+        of loading the whole line at once.  Returns False when the line has to be processed the
+        regular way.
+
+        Lists are mapped as they are parsed, and their records held in a `SpoolWriter` until the
+        record they are in has been written, unless their streams read keys of the record that
+        come after them in the line.  Those lists are gone through again once the line is parsed.
+        """
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+
+        match = RECORD_STREAM.match(line)
+        levels = self.streamable.get(match.group(1)) if match else None
+
+        if not levels:
+            return False
+
+        stream = match.group(1)
+        has_nul = _has_nul(line)
+
+        def map_array(key, record, items):
+            return self.spool_items(stream, key, record, items, has_nul)
+
+        try:
+            message, arrays = parse_large_record(line, levels, map_array)
+        except ValueError:
+            return False
+
+        if not arrays or not isinstance(message.get("record"), dict):
+            self.process(message, has_nul=has_nul)
+            return True
+
+        if self.metrics is not None:
+            self.metrics.emit_due()
+
+        # Records of the same stream that are waiting in a batch go first
+        self.flush_batch()
+        self.process_record(message["stream"], message["record"], has_nul=has_nul, streamed=arrays)
+        return True
+
+    def spool_items(self, stream, key, record, items, has_nul=True):
+        # Map the list under `key` of a top-level record that's still being parsed into a spool,
+        # or return None when its streams need keys of the record that haven't been parsed yet
+        if stream not in self.spool_keys:
+            needed = parent_keys(self.config["mappings"], stream)
+            if needed is not None:
+                # Failures of the nested records are logged with the keys of the top-level one
+                needed |= set(self.failures.key_properties.get(stream) or self.failures.key_fields)
+            self.spool_keys[stream] = needed
+
+        needed = self.spool_keys[stream]
+        if needed is None or not needed.issubset(record):
+            return None
+
+        next_stream = f"{stream}.{key}"
+        self.spool = SpoolWriter(self.codec, self.large_record_bytes)
+
+        try:
+            count = self.process_items(next_stream, items, record, record, has_nul)
+            spool = self.spool
+        finally:
+            self.spool = None
+
+        self.count_nested(next_stream, count)
+        return spool
+
+    def write_spooled(self, spool):
+        # Write out the records mapped while their line was parsed, in order
+        writer = self.writer
+        serialized = isinstance(writer, (BufferedWriter, CollectingWriter))
+
+        for stream, line in spool.records():
+            if stream in self.pending_schemas:
+                self.write_pending_schema(stream)
+
+            if self.metrics is not None:
+                self.metrics.records_out[stream] += 1
+
+            if serialized:
+                writer.write_record_line(stream, line)
+            else:
+                writer.write_record(stream, self.codec.loads(line)["record"])
+
+    def process_line(self, line):
+        # Process one line of tap output, as a string or UTF-8 bytes
+        if self.is_unmapped(line):
+            # Nothing would be done with this record, so don't bother parsing it
+            return
+
+        if (
+            self.large_record_bytes
+            and len(line) > self.large_record_bytes
+            and self.process_large_line(line)
+        ):
+            return
+
+        try:
+            message = self.codec.loads(line)
+            # Records can only have unicode null characters when they are in the line
+            self.process(message, has_nul=_has_nul(line))
+        except ValueError:
+            self.process_text(line if isinstance(line, str) else line.decode("utf-8"))
+
+    def process_text(self, line):
+        bits = line.split(' ', 1)
+
+        try:
+            # Check if we have a JSON log message
+            message = self.codec.loads(bits[1])
+            self.process_log(message)
+        except (ValueError, IndexError):
+            # Pass anything else along as is
+            self.flush_batch()
+            self.writer.write_line(line)
+
+    def process(self, message, has_nul=True):
+        if self.metrics is not None:
+            self.metrics.emit_due()
+
+        if message["type"] == "RECORD" and message["stream"] in self.batchers:
+            self.batch_record(message["stream"], message["record"], has_nul)
+            return
+
+        # Anything else has to come after the batched records
+        self.flush_batch()
+
         if message["type"] == "SCHEMA":
             self.process_schema(message)
         elif message["type"] == "RECORD":
-            self.process_record(message["stream"], message["record"])
+            self.process_record(message["stream"], message["record"], has_nul=has_nul)
         elif message["type"] == "STATE":
             self.process_state(message)
+
+
+def _has_nul(line):
+    if isinstance(line, bytes):
+        return b"\\u0000" in line or b"\x00" in line
+
+    return "\\u0000" in line or "\x00" in line
+
+
+def _context(keys, record, root, index):
+    # The context keys of a nested record, single nested objects don't get an @index
+    context = {}
+
+    if "@parent" in keys:
+        context["@parent"] = record
+    if "@root" in keys:
+        context["@root"] = root
+    if "@index" in keys and index is not None:
+        context["@index"] = index
+
+    return context
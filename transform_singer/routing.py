@@ -0,0 +1,106 @@
+def build_routes(mappings):
+    """
+    Build an index of stream path to the nested levels that have mappings below it.
+    This lets records find their nested sub-streams with a dictionary lookup instead of
+    scanning every mapping key.
+
+    Example:
+
+    build_routes({
+        "records": [...],
+        "records.transaction.items": [...],
+        "records.transaction.coupons": [...],
+    })
+    Returns:
+    {
+        "records": ("transaction",),
+        "records.transaction": ("items", "coupons"),
+    }
+    """
+    routes = {}
+
+    for key in mappings:
+        levels = key.split(".")
+
+        for i in range(1, len(levels)):
+            stream = ".".join(levels[:i])
+            next_levels = routes.setdefault(stream, [])
+
+            # Only keep unique next levels to avoid processing the same nested object multiple times
+            if levels[i] not in next_levels:
+                next_levels.append(levels[i])
+
+    return {stream: tuple(next_levels) for stream, next_levels in routes.items()}
+
+
+# Keys nested records can use to reach the records around them
+CONTEXT_KEYS = ("@parent", "@root", "@index", "@item")
+
+
+def build_contexts(mappings):
+    """
+    Work out which context keys the records of every nested stream need, from the `record`
+    mappings that use them.  A key path can walk up through several streams, e.g.
+    "@parent.@parent.id" in "records.transaction.items" needs "@parent" on the records of both
+    "records.transaction.items" and "records.transaction".  Streams that aren't listed need none.
+
+    Example:
+
+    build_contexts({
+        "records.transaction.items": [
+            {"stream": "items", "properties": {"id": {"type": "record", "key": "@parent.@parent.id"}}}
+        ],
+    })
+    Returns:
+    {
+        "records.transaction.items": {"@parent"},
+        "records.transaction": {"@parent"},
+    }
+    """
+    contexts = {}
+
+    for stream, entries in mappings.items():
+        for key in record_keys(entries):
+            _walk_context(contexts, stream, key)
+
+    return contexts
+
+
+def record_keys(entries):
+    """
+    Return the keys of every `record` mapping in a stream's entries, including the ones in
+    conditions and excludes.
+    """
+    keys = []
+    _record_keys(entries, keys)
+    return keys
+
+
+def _record_keys(value, keys):
+    if isinstance(value, dict):
+        if value.get("type") == "record" and isinstance(value.get("key"), str):
+            keys.append(value["key"])
+
+        for child in value.values():
+            _record_keys(child, keys)
+    elif isinstance(value, list):
+        for child in value:
+            _record_keys(child, keys)
+
+
+def _walk_context(contexts, stream, key):
+    for segment in key.split("."):
+        segment = segment.split("[", 1)[0]
+
+        if segment not in CONTEXT_KEYS or "." not in stream:
+            # Into the record itself, or up to a top-level record which has no context
+            return
+
+        contexts.setdefault(stream, set()).add(segment)
+
+        if segment == "@parent":
+            stream = stream.rsplit(".", 1)[0]
+        elif segment == "@root":
+            stream = stream.split(".", 1)[0]
+        elif segment == "@index":
+            return
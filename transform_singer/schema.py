@@ -0,0 +1,287 @@
+import copy
+
+from transform_singer.utils import nested_get, parse_path
+
+# Mappings that always come back as a number or None
+NUMBER_TYPES = ("float", "tofloat", "sum", "multiply", "divide", "difference")
+# Mappings that always come back as a string or None
+STRING_TYPES = ("join", "hash")
+
+
+def derive_schemas(mappings, stream, schema, key_properties, meta):
+    """
+    Derive the schemas of the target streams that are mapped from a source stream and the
+    streams nested inside of it.  Returns a dictionary of target stream to (schema, key_properties).
+    Entries that map to the same target stream are combined with `merge_schemas`.
+
+    Example:
+
+    derive_schemas(
+        {"users": [{"stream": "people", "properties": {"name": {"type": "record", "key": "first_name"}}}]},
+        "users",
+        {"type": "object", "properties": {"first_name": {"type": "string"}}},
+        [],
+        {},
+    )
+    Returns:
+    {
+        "people": (
+            {"type": "object", "properties": {"name": {"type": ["null", "string"]}}},
+            [],
+        )
+    }
+    """
+    derived = {}
+
+    for source, entries in mappings.items():
+        if source != stream and not source.startswith(stream + "."):
+            continue
+
+        levels = _levels(schema, source[len(stream) + 1:].split(".") if source != stream else [])
+
+        for entry in entries:
+            try:
+                derived.setdefault(entry["stream"], []).append(
+                    _derive_entry(entry, levels, key_properties if source == stream else [], meta)
+                )
+            except Exception:
+                # Leave out anything we can't make sense of, the records still go through
+                pass
+
+    return {target: merge_schemas(schemas) for target, schemas in derived.items()}
+
+
+def merge_schemas(schemas):
+    """
+    Combine the (schema, key_properties) of everything that is mapped to one target stream, so the
+    schema fits all of their records.  Properties of all of them are kept, and only the key
+    properties they have in common.
+    """
+    schema, key_properties = schemas[0]
+
+    for other, other_key_properties in schemas[1:]:
+        schema = _merge(schema, other)
+        key_properties = [key for key in key_properties if key in other_key_properties]
+
+    return schema, key_properties
+
+
+def _levels(schema, next_levels):
+    # Work out the schema of the record at every level from the source stream down to the
+    # nested stream.  Nested lists use the schema of their items.
+    levels = [schema]
+
+    for next_level in next_levels:
+        level = _property(levels[-1], next_level)
+
+        if "array" in _types(level):
+            level = level.get("items") or {}
+
+        levels.append(level)
+
+    return levels
+
+
+def _derive_entry(entry, levels, source_key_properties, meta):
+    schema = {"type": "object", "properties": {}}
+    key_properties = []
+
+    for target, mapping in entry["properties"].items():
+        try:
+            segments = parse_path(target)
+        except Exception:
+            continue
+
+        try:
+            value_schema = mapping_schema(mapping, levels, meta)
+        except Exception:
+            value_schema = {}
+
+        _set_schema(schema, segments, value_schema)
+
+        if (
+            len(segments) == 1
+            and segments[0][1] is None
+            and mapping
+            and mapping.get("type") == "record"
+            and mapping.get("key") in source_key_properties
+        ):
+            key_properties.append(target)
+
+    return schema, entry.get("key_properties", key_properties)
+
+
+def mapping_schema(mapping, levels, meta):
+    """
+    Return the JSON schema of the values a mapping can produce.  `levels` are the schemas of
+    the record and the records it is nested in, with the record itself last.
+    """
+    if not mapping:
+        return {"type": ["null"]}
+
+    mapping_type = mapping.get("type")
+
+    if mapping_type == "record":
+        return _nullable(_record_schema(mapping["key"], levels))
+    if mapping_type == "config":
+        return _nullable(_value_schema(nested_get(meta, mapping["key"])))
+    if mapping_type == "text":
+        return _nullable(_value_schema(mapping.get("val")))
+    if mapping_type in NUMBER_TYPES:
+        return {"type": ["null", "number"]}
+    if mapping_type in STRING_TYPES:
+        return {"type": ["null", "string"]}
+    if mapping_type == "substr":
+        return _slice_schema(mapping_schema(mapping["object"], levels, meta))
+    if mapping_type == "coalesce":
+        return _union([mapping_schema(obj, levels, meta) for obj in mapping["objects"]])
+    if mapping_type == "if":
+        return _union(
+            [
+                mapping_schema(mapping.get("then"), levels, meta),
+                mapping_schema(mapping.get("else"), levels, meta),
+            ]
+        )
+
+    # Anything goes
+    return {}
+
+
+def _record_schema(key, levels):
+    depth = len(levels) - 1
+    schema = levels[depth]
+
+    for segment in key.split("."):
+        if segment == "@parent":
+            depth -= 1
+            if depth < 0:
+                return {}
+            schema = levels[depth]
+        elif segment == "@root":
+            depth = 0
+            schema = levels[0]
+        elif segment == "@index":
+            schema = {"type": ["integer"]}
+        elif segment == "@item":
+            schema = levels[depth]
+        else:
+            schema = _property(schema, segment)
+
+        if not schema:
+            return {}
+
+    return copy.deepcopy(schema)
+
+
+def _property(schema, key):
+    return schema.get("properties", {}).get(key) or {}
+
+
+def _types(schema):
+    types = schema.get("type", [])
+    return [types] if isinstance(types, str) else list(types)
+
+
+def _nullable(schema):
+    if not schema or "type" not in schema:
+        return schema
+
+    types = _types(schema)
+    if "null" not in types:
+        types.insert(0, "null")
+
+    return {**schema, "type": types}
+
+
+def _value_schema(value):
+    if value is None:
+        return {"type": ["null"]}
+    if isinstance(value, bool):
+        return {"type": ["boolean"]}
+    if isinstance(value, int):
+        return {"type": ["integer"]}
+    if isinstance(value, float):
+        return {"type": ["number"]}
+    if isinstance(value, str):
+        return {"type": ["string"]}
+    if isinstance(value, dict):
+        return {"type": ["object"]}
+    if isinstance(value, list):
+        return {"type": ["array"]}
+
+    return {}
+
+
+def _union(schemas):
+    # Combine the schemas of the values a mapping could return
+    if not all(schemas):
+        return {}
+
+    types = []
+    for schema in schemas:
+        for schema_type in _types(schema):
+            if schema_type not in types:
+                types.append(schema_type)
+
+    rest = [{k: v for k, v in schema.items() if k != "type"} for schema in schemas]
+    if all(other == rest[0] for other in rest):
+        return {**rest[0], "type": types}
+
+    return {"anyOf": schemas}
+
+
+def _slice_schema(schema):
+    # `substr` slices strings into strings and lists into lists of the same items
+    if not schema or "type" not in schema:
+        return {}
+
+    types = ["null"] + [t for t in ("string", "array") if t in _types(schema)]
+
+    if "array" in types and "items" in schema:
+        return {"type": types, "items": schema["items"]}
+
+    return {"type": types}
+
+
+def _merge(schema, other):
+    # Combine two schemas, merging the properties of objects instead of offering either one
+    if schema == other:
+        return schema
+
+    if "properties" in schema and "properties" in other:
+        properties = dict(schema["properties"])
+
+        for key, value in other["properties"].items():
+            properties[key] = _merge(properties[key], value) if key in properties else value
+
+        merged = {**schema, **other, "properties": properties}
+        types = _types(schema) + [t for t in _types(other) if t not in _types(schema)]
+        if types:
+            merged["type"] = schema["type"] if types == _types(schema) else types
+
+        return merged
+
+    return _union([schema, other])
+
+
+def _set_schema(schema, segments, value_schema):
+    # Add the schema of a value at a dot-notation target, the same way `nested_set` adds values
+    for key, index in segments[:-1]:
+        properties = schema.setdefault("properties", {})
+
+        if index is None:
+            schema = properties.setdefault(key, {"type": ["null", "object"], "properties": {}})
+        else:
+            array = properties.setdefault(
+                key,
+                {"type": ["null", "array"], "items": {"type": ["null", "object"], "properties": {}}},
+            )
+            schema = array.setdefault("items", {"type": ["null", "object"], "properties": {}})
+
+    key, index = segments[-1]
+    properties = schema.setdefault("properties", {})
+
+    if index is None:
+        properties[key] = value_schema
+    else:
+        properties[key] = {"type": ["null", "array"], "items": _nullable(value_schema)}
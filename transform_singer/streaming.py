@@ -0,0 +1,201 @@
+import json
+import re
+from json.decoder import scanstring
+
+from transform_singer.routing import CONTEXT_KEYS, record_keys
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_decoder = json.JSONDecoder()
+
+
+class StreamedArray:
+    """
+    A JSON array inside of a line that is parsed one element at a time every time it's
+    iterated, so the whole list is never held in memory.  `len` is the number of elements,
+    counted by `skip`.  `end` is the index after the array once it has been gone through.
+    """
+
+    def __init__(self, line, start):
+        self.line = line
+        self.start = start
+        self.length = 0
+        self.end = None
+
+    def skip(self):
+        # Check the array and count its elements, returns the index after it
+        self.length = sum(1 for _ in self)
+        return self.end
+
+    def __iter__(self):
+        line = self.line
+        idx = _whitespace(line, self.start + 1)
+
+        if line[idx:idx + 1] == "]":
+            self.end = idx + 1
+            return
+
+        while True:
+            value, idx = _decoder.raw_decode(line, idx)
+            yield value
+
+            idx = _whitespace(line, idx)
+            if line[idx:idx + 1] == ",":
+                idx = _whitespace(line, idx + 1)
+            elif line[idx:idx + 1] == "]":
+                self.end = idx + 1
+                return
+            else:
+                raise ValueError(f"Expecting ',' delimiter: char {idx}")
+
+    def __len__(self):
+        return self.length
+
+
+def parse_large_record(line, levels, map_array=None):
+    """
+    Parse a RECORD message, leaving the arrays of the record under the keys in `levels` as
+    `StreamedArray`s.  Returns the message (with those keys left out of the record) and a
+    dictionary of key to array.  Raises ValueError for anything that isn't valid JSON.
+
+    Arrays are normally parsed twice, once to find where they end and again by whoever goes
+    through them.  `map_array(key, record, array)` can go through an array while the line is
+    being parsed instead, with the record parsed so far, and return what to keep for it in
+    place of the array.  When it returns None the array is skipped and kept as usual.
+
+    Example:
+
+    message, arrays = parse_large_record(
+        '{"type": "RECORD", "stream": "orders", "record": {"id": 1, "items": [{"sku": "a"}]}}',
+        {"items"},
+    )
+    message  # {"type": "RECORD", "stream": "orders", "record": {"id": 1}}
+    list(arrays["items"])  # [{"sku": "a"}]
+    """
+    arrays = {}
+
+    def record_value(record, key, idx):
+        if key in levels and line[idx:idx + 1] == "[":
+            array = StreamedArray(line, idx)
+            mapped = map_array(key, record, array) if map_array is not None else None
+
+            if mapped is not None:
+                arrays[key] = mapped
+                return mapped, array.end
+
+            arrays[key] = array
+            return array, array.skip()
+
+        arrays.pop(key, None)
+        return _decoder.raw_decode(line, idx)
+
+    def message_value(message, key, idx):
+        if key == "record" and line[idx:idx + 1] == "{":
+            arrays.clear()
+            record, end = _parse_object(line, idx, record_value)
+            for array_key in arrays:
+                del record[array_key]
+            return record, end
+
+        return _decoder.raw_decode(line, idx)
+
+    message, end = _parse_object(line, _whitespace(line, 0), message_value)
+
+    if _whitespace(line, end) != len(line):
+        raise ValueError(f"Extra data: char {end}")
+
+    return message, arrays
+
+
+def streamable_levels(mappings, routes):
+    """
+    Find the nested lists of each top-level stream that can be streamed: the ones the stream's
+    own mappings don't read, and that the nested mappings don't reach through @parent or @root.
+    Returns a dictionary of stream to the set of keys.
+    """
+    streamable = {}
+
+    for stream, next_levels in routes.items():
+        if "." in stream:
+            continue
+
+        used = set()
+        for key in record_keys(mappings.get(stream) or []):
+            used.add(_segments(key)[0])
+
+        for nested, entries in mappings.items():
+            if nested.startswith(stream + "."):
+                for key in record_keys(entries):
+                    segments = _segments(key)
+                    if "@parent" in segments or "@root" in segments:
+                        used.update(segments)
+
+        levels = {level for level in next_levels if level not in used}
+        if levels:
+            streamable[stream] = levels
+
+    return streamable
+
+
+def parent_keys(mappings, stream):
+    """
+    Return the keys of a top-level stream's records that the streams nested in it read through
+    @parent or @root, e.g. "id" for "@parent.@parent.id".  Every key on the way is included,
+    since the records in between can't be told apart by name.  Returns None when a whole record
+    is read, like "@parent".
+    """
+    keys = set()
+
+    for nested, entries in mappings.items():
+        if not nested.startswith(stream + "."):
+            continue
+
+        for key in record_keys(entries):
+            segments = _segments(key)
+            if "@parent" in segments or "@root" in segments:
+                if segments[-1] in CONTEXT_KEYS:
+                    return None
+
+                keys.update(segment for segment in segments if segment not in CONTEXT_KEYS)
+
+    return keys
+
+
+def _segments(key):
+    return [segment.split("[", 1)[0] for segment in key.split(".")]
+
+
+def _whitespace(line, idx):
+    return WHITESPACE.match(line, idx).end()
+
+
+def _parse_object(line, idx, parse_value):
+    # Parse the object at `idx` with `parse_value(obj, key, idx)` for its values
+    if line[idx:idx + 1] != "{":
+        raise ValueError(f"Expecting '{{': char {idx}")
+
+    obj = {}
+    idx = _whitespace(line, idx + 1)
+
+    if line[idx:idx + 1] == "}":
+        return obj, idx + 1
+
+    while True:
+        if line[idx:idx + 1] != '"':
+            raise ValueError(f"Expecting property name enclosed in double quotes: char {idx}")
+
+        key, idx = scanstring(line, idx + 1)
+        idx = _whitespace(line, idx)
+
+        if line[idx:idx + 1] != ":":
+            raise ValueError(f"Expecting ':' delimiter: char {idx}")
+
+        obj[key], idx = parse_value(obj, key, _whitespace(line, idx + 1))
+        idx = _whitespace(line, idx)
+
+        if line[idx:idx + 1] == ",":
+            idx = _whitespace(line, idx + 1)
+        elif line[idx:idx + 1] == "}":
+            return obj, idx + 1
+        else:
+            raise ValueError(f"Expecting ',' delimiter: char {idx}")
@@ -1,3 +1,8 @@
+import json
+from collections.abc import Mapping
+from functools import lru_cache
+
+
 def nested_set(record, target, value):
     """
     Using dot-notation set the value of a dictionary
@@ -75,89 +80,281 @@ def nested_set(record, target, value):
     }
     """
 
-    if "." in target:
-        next_level, extra_levels = target.split(".", 1)
+    return path_setter(target)(record, value)
+
+
+def nested_get(record: dict, target: str):
+    """
+    Using dot-notation get the value of a dictionary
+
+    Example:
+
+    obj = {
+        "foo": {
+            "bar": 4
+        }
+    }
 
-        if "[" in next_level:
-            next_level, index = next_level.split("[")
+    nested_get(obj, 'foo.bar')  # returns 4
+    nested_get(obj, 'foo.zaz')  # returns None
+    """
+
+    return path_getter(target)(record)
+
+def parse_path(target):
+    """
+    Parse a dot-notation target into a tuple of (key, index) segments.  The index is None for
+    plain keys, "" for appending to an array (`foo[]`) and an int for a spot in an array.
+
+    Example:
+
+    parse_path("foo.bar[2].baz[]")
+    Returns:
+    (("foo", None), ("bar", 2), ("baz", ""))
+    """
+    segments = []
+
+    for segment in target.split("."):
+        if "[" in segment:
+            key, index = segment.split("[")
             index = index[:-1]
+            segments.append((key, int(index) if index else ""))
+        else:
+            segments.append((segment, None))
+
+    return tuple(segments)
+
+
+@lru_cache(maxsize=4096)
+def path_getter(target):
+    """
+    Return a function that gets the value at a dot-notation target, see `nested_get`.
+    Array indexes aren't parsed when getting, so "foo[0]" is just a key.
+
+    Example:
+
+    get = path_getter("foo.bar")
+    get({"foo": {"bar": 4}})  # returns 4
+    """
+    keys = target.split(".")
+    last = keys.pop()
+
+    if not keys:
+        def get(record):
+            if not record:
+                return None
+
+            return record.get(last)
+    elif len(keys) == 1:
+        first = keys[0]
+
+        def get(record):
+            record = record.get(first, {})
+
+            if not record:
+                return None
+
+            return record.get(last)
+    else:
+        def get(record):
+            for key in keys:
+                record = record.get(key, {})
+
+            if not record:
+                return None
+
+            return record.get(last)
+
+    return get
+
+
+@lru_cache(maxsize=4096)
+def path_setter(target):
+    """
+    Return a function that sets the value at a dot-notation target and returns the record,
+    see `nested_set`.
+
+    Example:
+
+    set_value = path_setter("foo[].fiz")
+    set_value({}, "baz")  # returns {"foo": [{"fiz": "baz"}]}
+    """
+    segments = parse_path(target)
+    head = segments[:-1]
+    key, index = segments[-1]
+
+    if not head and index is None:
+        def set_value(record, value):
+            record[key] = value
+            return record
+
+        return set_value
+
+    def set_value(record, value):
+        top = record
+
+        for next_level, next_index in head:
+            if next_index is None:
+                if next_level not in record:
+                    record[next_level] = {}
+
+                record = record[next_level]
+                continue
 
             if next_level not in record:
                 record[next_level] = []
 
-            if not index:
-                new_dict = dict()
-                record[next_level].append(new_dict)
-                nested_set(new_dict, extra_levels, value)
+            items = record[next_level]
+
+            if next_index == "":
+                record = dict()
+                items.append(record)
             else:
                 # Add item to this spot in the array
-                index = int(index)
-                if index + 1 > len(record[next_level]):
-                    record[next_level] += (1 + index - len(record[next_level])) * [None]
+                if next_index + 1 > len(items):
+                    items += (1 + next_index - len(items)) * [None]
 
-                if not record[next_level][index]:
-                    record[next_level][index] = {}
+                if not items[next_index]:
+                    items[next_index] = {}
 
-                nested_set(record[next_level][index], extra_levels, value)
-        else:
-            if next_level not in record:
-                record[next_level] = {}
+                record = items[next_index]
 
-            record[next_level] = nested_set(record[next_level], extra_levels, value)
-    elif "[" in target:
-        target, index = target.split("[")
-        index = index[:-1]
+        if index is None:
+            record[key] = value
+            return top
 
-        if target not in record:
-            record[target] = []
+        if key not in record:
+            record[key] = []
 
-        if not index:
+        items = record[key]
+
+        if index == "":
             # Add item to the end of the array
-            record[target].append(value)
+            items.append(value)
         else:
             # Add item to this spot in the array
-            index = int(index)
-            if index > len(record[target]):
-                record[target] += (1 + index - len(record[target])) * [None]
-            record[target][index] = value
+            if index > len(items):
+                items += (1 + index - len(items)) * [None]
+            items[index] = value
+
+        return top
+
+    return set_value
+
+
+def replace_deep(data, a, b):
+    """
+    Recursively replace `a` with `b` in every string of `data`.  Dictionaries and lists are only
+    copied when something inside of them was replaced, otherwise `data` is returned as is.
+    """
+    if isinstance(data, str):
+        return data.replace(a, b)
+    elif isinstance(data, dict):
+        replaced = None
+
+        for k, v in data.items():
+            new = replace_deep(v, a, b)
+
+            if new is not v:
+                if replaced is None:
+                    replaced = dict(data)
+                replaced[k] = new
+
+        return data if replaced is None else replaced
+    elif isinstance(data, list):
+        replaced = None
+
+        for i, v in enumerate(data):
+            new = replace_deep(v, a, b)
+
+            if new is not v:
+                if replaced is None:
+                    replaced = list(data)
+                replaced[i] = new
+
+        return data if replaced is None else replaced
     else:
-        record[target] = value
+        # nothing to do?
+        return data
+
 
-    return record
+def mapping_paths(mappings):
+    """
+    Map the id of every mapping and condition in `config["mappings"]` to its path in the config.
 
+    Example:
 
-def nested_get(record: dict, target: str):
+    mapping_paths({"users": [{"stream": "people", "properties": {"name": name_mapping}}]})
+    Returns:
+    {id(name_mapping): 'mappings["users"][0].properties.name'}
     """
-    Using dot-notation get the value of a dictionary
+    paths = {}
+
+    for stream, entries in mappings.items():
+        _index_paths(paths, entries, f"mappings[{json.dumps(stream)}]")
+
+    return paths
+
+
+def _index_paths(paths, value, path):
+    if isinstance(value, dict):
+        if "type" in value or "operator" in value:
+            paths.setdefault(id(value), path)
+
+        for key, child in value.items():
+            if isinstance(key, str) and key.isidentifier():
+                _index_paths(paths, child, f"{path}.{key}")
+            else:
+                _index_paths(paths, child, f"{path}[{json.dumps(key)}]")
+    elif isinstance(value, list):
+        for i, child in enumerate(value):
+            _index_paths(paths, child, f"{path}[{i}]")
+
+
+class NestedRecord(Mapping):
+    """
+    Read-only view of a nested item that layers the "@" context keys (`@parent`, `@root`,
+    `@index`, `@item`) over the original item without copying it.
 
     Example:
 
-    obj = {
-        "foo": {
-            "bar": 4
-        }
-    }
+    parent = {"name": "Jared", "children": [{"name": "Mary"}]}
+    child = NestedRecord(parent["children"][0], {"@parent": parent, "@index": 0})
 
-    nested_get(obj, 'foo.bar')  # returns 4
-    nested_get(obj, 'foo.zaz')  # returns None
+    child["name"]  # returns "Mary"
+    nested_get(child, "@parent.name")  # returns "Jared"
     """
 
-    if "." in target:
-        next_level, extra_levels = target.split(".", 1)
-        return nested_get(record.get(next_level, {}), extra_levels)
+    __slots__ = ("item", "context")
 
-    if not record:
-        return None
+    def __init__(self, item, context):
+        self.item = item
+        self.context = context
 
-    return record.get(target)
+    def __getitem__(self, key):
+        if key in self.context:
+            return self.context[key]
 
-def replace_deep(data, a, b):
-    if isinstance(data, str):
-        return data.replace(a, b)
-    elif isinstance(data, dict):
-        return {k: replace_deep(v, a, b) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [replace_deep(v, a, b) for v in data]
-    else:
-        # nothing to do?
-        return data
\ No newline at end of file
+        return self.item[key]
+
+    def get(self, key, default=None):
+        if key in self.context:
+            return self.context[key]
+
+        return self.item.get(key, default)
+
+    def __contains__(self, key):
+        return key in self.context or key in self.item
+
+    def __iter__(self):
+        for key in self.item:
+            if key not in self.context:
+                yield key
+
+        yield from self.context
+
+    def __len__(self):
+        return len(self.context) + sum(1 for key in self.item if key not in self.context)
+
+    def __repr__(self):
+        return f"NestedRecord({self.item!r}, @keys={list(self.context)})"
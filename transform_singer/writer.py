@@ -0,0 +1,254 @@
+import json
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+import singer
+from transform_singer.codec import get_codec
+
+
+class SingerWriter:
+    """
+    Writes every message straight through singer-python, one line and one flush at a time.
+    """
+
+    def write_record(self, stream, record):
+        singer.write_record(stream, record)
+
+    def write_schema(self, stream, schema, key_properties):
+        singer.write_schema(stream, schema, key_properties)
+
+    def write_state(self, value):
+        singer.write_state(value)
+
+    def write_line(self, line):
+        print(line, flush=True)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BufferedWriter:
+    """
+    Serializes messages with one codec and writes them out in batches.
+
+    The buffer is flushed once it holds `batch_size` messages, when a message is written more
+    than `flush_interval` seconds after the last flush, and always right after a STATE message
+    so the state never gets ahead of the records before it.
+
+    Example:
+
+    writer = BufferedWriter(batch_size=500, flush_interval=1)
+    writer.write_record("users", {"id": 2})
+    writer.write_state({"bookmark": 2})  # Writes both lines out
+    """
+
+    def __init__(self, output=None, batch_size=1000, flush_interval=1.0, codec=None):
+        self.output = output or sys.stdout
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+        self.dumps = (codec or get_codec()).dumps
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def write_record(self, stream, record):
+        self.write_message({"type": "RECORD", "stream": stream, "record": record})
+
+    def write_schema(self, stream, schema, key_properties):
+        self.write_message(
+            {
+                "type": "SCHEMA",
+                "stream": stream,
+                "schema": schema,
+                "key_properties": key_properties,
+            }
+        )
+
+    def write_state(self, value):
+        self.write_message({"type": "STATE", "value": value})
+        self.flush()
+
+    def write_message(self, message):
+        self.write_line(self.dumps(message))
+
+    def write_record_line(self, stream, line):
+        # A RECORD message of `stream` that's already been serialized with the same codec
+        self.write_line(line)
+
+    def write_line(self, line):
+        self.buffer.append(line)
+
+        if (
+            len(self.buffer) >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.buffer.append("")
+            self.output.write("\n".join(self.buffer))
+            self.output.flush()
+            self.buffer = []
+
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+
+class ThreadedWriter(BufferedWriter):
+    """
+    A `BufferedWriter` that serializes and writes out its batches on a separate thread.
+
+    At most `queue_size` batches wait on the thread, after that `flush` blocks until the output
+    catches up.  Errors writing the output, e.g. a closed pipe, are raised by the next `flush`
+    or by `close`, which also waits for everything to be written.
+
+    Example:
+
+    writer = ThreadedWriter(batch_size=500)
+    writer.write_record("users", {"id": 2})
+    writer.close()
+    """
+
+    def __init__(self, output=None, batch_size=1000, flush_interval=1.0, codec=None, queue_size=8):
+        super().__init__(output, batch_size, flush_interval, codec)
+        self.queue = queue.Queue(queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._write_batches, name="writer", daemon=True)
+        self.thread.start()
+
+    def write_message(self, message):
+        # Serialized on the writer thread
+        self.buffer.append(message)
+
+        if (
+            len(self.buffer) >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+
+        if self.buffer:
+            self.queue.put(self.buffer)
+            self.buffer = []
+
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.thread.is_alive():
+            try:
+                self.flush()
+            finally:
+                self.queue.put(None)
+                self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def _write_batches(self):
+        dumps = self.dumps
+
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+
+            if self.error is not None:
+                # Keep taking batches so nothing waiting on the queue gets stuck
+                continue
+
+            try:
+                batch.append("")
+                self.output.write(
+                    "\n".join(item if isinstance(item, str) else dumps(item) for item in batch)
+                )
+                self.output.flush()
+            except BaseException as e:
+                self.error = e
+
+
+class CollectingWriter:
+    """
+    Serializes messages into a list of (stream, line) tuples instead of writing them out.
+    Lines that aren't records have a stream of None.
+    """
+
+    def __init__(self, codec=None):
+        self.dumps = (codec or get_codec()).dumps
+        self.lines = []
+
+    def write_record(self, stream, record):
+        self.lines.append(
+            (stream, self.dumps({"type": "RECORD", "stream": stream, "record": record}))
+        )
+
+    def write_schema(self, stream, schema, key_properties):
+        self.write_message(
+            {
+                "type": "SCHEMA",
+                "stream": stream,
+                "schema": schema,
+                "key_properties": key_properties,
+            }
+        )
+
+    def write_state(self, value):
+        self.write_message({"type": "STATE", "value": value})
+
+    def write_message(self, message):
+        self.write_line(self.dumps(message))
+
+    def write_record_line(self, stream, line):
+        self.lines.append((stream, line))
+
+    def write_line(self, line):
+        self.lines.append((None, line))
+
+    def collect(self):
+        # Return everything written so far and start over
+        lines = self.lines
+        self.lines = []
+        return lines
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SpoolWriter:
+    """
+    Serializes records into a temporary file, kept in memory up to `max_size` bytes, and hands
+    them back in order with `records`.  Holds the records mapped from a nested list until the
+    record it's in has been written, see `Processor.process_large_line`.
+    """
+
+    def __init__(self, codec=None, max_size=0):
+        self.dumps = (codec or get_codec()).dumps
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=max_size or 0, mode="w+", encoding="utf-8", newline="\n"
+        )
+
+    def write_record(self, stream, record):
+        line = self.dumps({"type": "RECORD", "stream": stream, "record": record})
+        # Serialized JSON never holds a raw tab or newline
+        self.file.write(f"{self.dumps(stream)}\t{line}\n")
+
+    def records(self):
+        # Yield (stream, serialized RECORD message) for everything written, once
+        with self.file:
+            self.file.seek(0)
+            for entry in self.file:
+                stream, line = entry.rstrip("\n").split("\t", 1)
+                yield json.loads(stream), line